@@ -0,0 +1,57 @@
+# benchmarks/locustfile.py
+"""WSGI 与 ASGI 吞吐量对比压测
+
+分别以两种方式启动服务（建议使用相同的 worker 数）：
+
+    # WSGI：同步视图
+    gunicorn blog.wsgi -w 4 -b 127.0.0.1:8000
+
+    # ASGI：异步视图
+    STATS_ASYNC_VIEWS=true STATS_ATOMIC_INCREMENT=true uvicorn blog.asgi:application --workers 4 --port 8000
+
+然后以相同参数运行 locust，对比两次的 RPS 与延迟分位数：
+
+    locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000 \\
+        --headless -u 2000 -r 200 -t 2m --csv benchmarks/results/wsgi
+    locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000 \\
+        --headless -u 2000 -r 200 -t 2m --csv benchmarks/results/asgi
+
+BENCH_ARTICLES 控制文章ID范围（默认1000，热点文章按Zipf分布访问）。
+"""
+import os
+import random
+import string
+
+from locust import FastHttpUser, between, task
+
+ARTICLES = int(os.getenv('BENCH_ARTICLES', '1000'))
+
+
+def pick_article():
+    # 近似Zipf分布：少数热门文章承担大部分流量
+    return min(int(random.paretovariate(1.2)), ARTICLES)
+
+
+class StatsUser(FastHttpUser):
+    wait_time = between(0, 0.05)
+
+    def on_start(self):
+        # 跟踪接口受CSRF保护：自带令牌，同时放在Cookie和请求头中
+        token = ''.join(random.choices(string.ascii_letters + string.digits, k=32))
+        self.csrf_headers = {'Cookie': f'csrftoken={token}', 'X-CSRFToken': token}
+
+    @task(10)
+    def track_read(self):
+        self.client.post(f"/track/{pick_article()}/", name="/track/[id]/", headers=self.csrf_headers)
+
+    @task(5)
+    def article_stats(self):
+        self.client.get(f"/stats/{pick_article()}/?distribution=none", name="/stats/[id]/")
+
+    @task(1)
+    def total_reads(self):
+        self.client.get("/stats/total-reads/")
+
+    @task(1)
+    def cache_stats(self):
+        self.client.get("/stats/cache-stats/")
@@ -0,0 +1,34 @@
+import os
+
+from celery import Celery
+from celery.signals import worker_init, worker_ready
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog.settings')
+
+app = Celery('blog')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+@worker_init.connect
+def configure_stats_worker(sender=None, **kwargs):
+    """只消费统计队列的 worker 使用独立的预取数（统计任务短小且量大，预取更多以减少往返）
+
+    在 worker_init 中修改 worker 实例：命令行默认值已在此之前写入 prefetch_multiplier，
+    修改 conf 不会生效；消费者在此之后才按该值设置预取数。
+    """
+    from django.conf import settings
+
+    if list(sender.app.amqp.queues.consume_from or {}) == [settings.STATS_CELERY_QUEUE]:
+        sender.prefetch_multiplier = settings.STATS_CELERY_PREFETCH_MULTIPLIER
+
+
+@worker_ready.connect
+def warm_stats_cache_on_start(sender=None, **kwargs):
+    """worker 启动后预热热点文章计数（STATS_WARM_ON_WORKER_START），多个 worker 同时启动只执行一次"""
+    from django.conf import settings
+
+    if settings.STATS_WARM_ON_WORKER_START:
+        from blog_stats.tasks import warm_stats_cache
+
+        warm_stats_cache.delay(exclusive=True)
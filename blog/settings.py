@@ -1,166 +1,355 @@
-"""
-Django settings for blog project.
-
-Generated by 'django-admin startproject' using Django 4.2.9.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/4.2/topics/settings/
-
-For the full list of settings and their values, see
-https://docs.djangoproject.com/en/4.2/ref/settings/
-"""
-import os
-from pathlib import Path
-
-from django.middleware.common import CommonMiddleware
-
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
-
-
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
-
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-edkkqz9=#s=%5lt)(=iicvuf_qiqf!p%d4vxz-lq@v8j)fj8x*'
-
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
-
-ALLOWED_HOSTS = []
-
-
-# Application definition
-
-INSTALLED_APPS = [
-    'django.contrib.admin',
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
-    'blog_stats.apps.BlogStatsConfig',
-    'blog',
-]
-
-MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-]
-
-ROOT_URLCONF = 'blog.urls'
-
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS':  [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
-
-WSGI_APPLICATION = 'blog.wsgi.application'
-
-
-# Database
-# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
-
-DB_ENGINE = os.getenv('DB_ENGINE', "mysql")
-DB_USERNAME = os.getenv('DB_USERNAME', "root")
-DB_PASS = os.getenv('DB_PASS', "root123")
-DB_HOST = os.getenv('DB_HOST', "localhost")
-DB_PORT = os.getenv('DB_PORT', "3306")
-DB_NAME = os.getenv('DB_NAME', "blog")
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.' + DB_ENGINE,
-        'NAME': DB_NAME,
-        'USER': DB_USERNAME,
-        'PASSWORD': DB_PASS,
-        'HOST': DB_HOST,
-        'PORT': DB_PORT,
-        'OPTIONS': {
-            'ssl': False,
-        }
-    },
-}
-
-
-# Password validation
-# https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
-
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
-    },
-]
-
-
-# Internationalization
-# https://docs.djangoproject.com/en/4.2/topics/i18n/
-
-LANGUAGE_CODE = 'zh-hans'
-
-TIME_ZONE = 'Asia/Shanghai'
-
-USE_I18N = True
-
-USE_L10N = True
-
-USE_TZ = False
-
-
-# Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/4.2/howto/static-files/
-
-STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
-STATIC_URL = '/static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-
-# Default primary key field type
-# https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
-
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-
-CELERY_BROKER_URL = 'redis://@localhost:6379/0'
-CELERY_RESULT_BACKEND = 'redis://@localhost:6379/0'
-CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True  # 新增关键配置
-CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
-CELERY_ACCEPT_CONTENT = ['json']
-CELERY_TIMEZONE = 'Asia/Shanghai'
-CELERY_ENABLE_UTC = False  # 与USE_TZ=False保持一致
-
-CACHES = {
-    "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": "redis://@localhost:6379",
-        "OPTIONS": {
-            "CLIENT_CLASS": "django_redis.client.DefaultClient",
-            "CONNECTION_POOL_KWARGS": {"max_connections": 1000, "encoding": 'utf-8'},  # 池的个数
-            "PASSWORD": "foobared"
-        }
-    }
-}
+"""
+Django settings for blog project.
+
+Generated by 'django-admin startproject' using Django 4.2.9.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/4.2/ref/settings/
+"""
+import os
+from pathlib import Path
+
+from django.middleware.common import CommonMiddleware
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'django-insecure-edkkqz9=#s=%5lt)(=iicvuf_qiqf!p%d4vxz-lq@v8j)fj8x*'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'blog_stats.apps.BlogStatsConfig',
+    'blog',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'blog.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS':  [os.path.join(BASE_DIR, 'templates')],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'blog.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+
+DB_ENGINE = os.getenv('DB_ENGINE', "mysql")
+DB_USERNAME = os.getenv('DB_USERNAME', "root")
+DB_PASS = os.getenv('DB_PASS', "root123")
+DB_HOST = os.getenv('DB_HOST', "localhost")
+DB_PORT = os.getenv('DB_PORT', "3306")
+DB_NAME = os.getenv('DB_NAME', "blog")
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.' + DB_ENGINE,
+        'NAME': DB_NAME,
+        'USER': DB_USERNAME,
+        'PASSWORD': DB_PASS,
+        'HOST': DB_HOST,
+        'PORT': DB_PORT,
+        'OPTIONS': {
+            'ssl': False,
+        }
+    },
+}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/4.2/topics/i18n/
+
+LANGUAGE_CODE = 'zh-hans'
+
+TIME_ZONE = 'Asia/Shanghai'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = False
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/4.2/howto/static-files/
+
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+CELERY_BROKER_URL = 'redis://@localhost:6379/0'
+CELERY_RESULT_BACKEND = 'redis://@localhost:6379/0'
+CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True  # 新增关键配置
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TIMEZONE = 'Asia/Shanghai'
+CELERY_ENABLE_UTC = False  # 与USE_TZ=False保持一致
+
+# 统计任务使用独立队列，由单独的 worker 消费（celery -A blog worker -Q stats），
+# 该 worker 的预取数由 STATS_CELERY_PREFETCH_MULTIPLIER 设置（见 blog/celery.py）
+STATS_CELERY_QUEUE = 'stats'
+STATS_CELERY_PREFETCH_MULTIPLIER = 16
+CELERY_TASK_ROUTES = {'blog_stats.tasks.*': {'queue': STATS_CELERY_QUEUE}}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://@localhost:6379",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "REDIS_CLIENT_CLASS": "blog_stats.redis_client.GuardedRedis",  # 经熔断器访问Redis
+            "CONNECTION_POOL_KWARGS": {"max_connections": 1000, "encoding": 'utf-8'},  # 池的个数
+            "PASSWORD": "foobared"
+        }
+    }
+}
+
+# django-redis 与统计服务共用 blog_stats.redis_client 中的连接池
+DJANGO_REDIS_CONNECTION_FACTORY = "blog_stats.redis_client.ConnectionFactory"
+
+# 阅读统计配置
+# 原子计数模式（默认）：使用Lua脚本在一次Redis往返内完成阅读计数；
+# 设为 false 使用逐项读改写的旧计数方式（已弃用，往返次数多且并发时会丢失计数）
+STATS_ATOMIC_INCREMENT = os.getenv('STATS_ATOMIC_INCREMENT', 'true').lower() == 'true'
+# 用户数统计模式：exact（逐用户计数）或 approximate（HyperLogLog近似去重，每篇文章约12KB）
+STATS_USER_COUNT_MODE = os.getenv('STATS_USER_COUNT_MODE', 'exact')
+# 写回落库：定时将Redis中的脏计数批量写入MySQL
+STATS_FLUSH_INTERVAL = int(os.getenv('STATS_FLUSH_INTERVAL', '10'))  # 秒
+STATS_FLUSH_BATCH_SIZE = int(os.getenv('STATS_FLUSH_BATCH_SIZE', '500'))
+
+CELERY_BEAT_SCHEDULE = {
+    'flush-dirty-stats': {
+        'task': 'blog_stats.tasks.flush_dirty_stats',
+        'schedule': STATS_FLUSH_INTERVAL,
+    },
+}
+
+# 中间件阅读合并缓冲：按条数或时间间隔（先到者为准）批量写入Redis，进程崩溃最多丢失 MAX_EVENTS 次阅读
+STATS_READ_BUFFER_ENABLED = os.getenv('STATS_READ_BUFFER_ENABLED', 'false').lower() == 'true'
+STATS_READ_BUFFER_MAX_EVENTS = int(os.getenv('STATS_READ_BUFFER_MAX_EVENTS', '100'))
+STATS_READ_BUFFER_FLUSH_INTERVAL_MS = int(os.getenv('STATS_READ_BUFFER_FLUSH_INTERVAL_MS', '200'))
+# 数据库降级写入微批：Redis不可用时按条数或时间间隔合并阅读，每批一个事务写入数据库，避免故障期间逐条写库
+STATS_DB_FALLBACK_BATCH_ENABLED = os.getenv('STATS_DB_FALLBACK_BATCH_ENABLED', 'false').lower() == 'true'
+STATS_DB_FALLBACK_BATCH_MAX_EVENTS = int(os.getenv('STATS_DB_FALLBACK_BATCH_MAX_EVENTS', '500'))
+STATS_DB_FALLBACK_BATCH_INTERVAL_MS = int(os.getenv('STATS_DB_FALLBACK_BATCH_INTERVAL_MS', '1000'))
+# 降级本地暂存：Redis不可用时阅读事件追加写入本地分段文件（优先于上面的数据库写入），Redis恢复后由后台线程重放。
+# 分段大小、目录总大小上限（超出后改为写数据库）、fsync 间隔（毫秒）、重放检查间隔（秒）及每批重放的阅读次数
+STATS_SPOOL_ENABLED = os.getenv('STATS_SPOOL_ENABLED', 'false').lower() == 'true'
+STATS_SPOOL_DIR = os.getenv('STATS_SPOOL_DIR', str(BASE_DIR / 'var' / 'spool'))
+STATS_SPOOL_SEGMENT_BYTES = 16 * 1024 * 1024
+STATS_SPOOL_MAX_BYTES = 512 * 1024 * 1024
+STATS_SPOOL_FSYNC_INTERVAL_MS = 100
+STATS_SPOOL_REPLAY_INTERVAL = 5.0
+STATS_SPOOL_REPLAY_BATCH_SIZE = 5000
+
+# 落库任务合并入队：启用后跟踪接口与中间件计数成功的阅读在窗口（毫秒）内合并后入队写入数据库（不必等待定时落库），
+# 每条任务消息最多包含的事件数，任务内每个事务写入的文章数
+STATS_TASK_BATCH_ENABLED = os.getenv('STATS_TASK_BATCH_ENABLED', 'false').lower() == 'true'
+STATS_TASK_BATCH_WINDOW_MS = 200
+STATS_TASK_BATCH_MAX_EVENTS = 500
+STATS_TASK_CHUNK_ARTICLES = 100
+
+# 批量上报接口单次请求允许的最大事件数，以及单条事件的最大阅读次数
+STATS_TRACK_BATCH_MAX_EVENTS = int(os.getenv('STATS_TRACK_BATCH_MAX_EVENTS', '1000'))
+STATS_TRACK_BATCH_MAX_COUNT = int(os.getenv('STATS_TRACK_BATCH_MAX_COUNT', '1000'))
+# 批量上报接口的生产者令牌（日志采集等服务端上报，请求头 Authorization: Bearer <令牌>，免CSRF校验），
+# 持有令牌或staff用户的请求可在事件中指定 user_id；为空时不启用令牌认证
+STATS_TRACK_PRODUCER_TOKEN = os.getenv('STATS_TRACK_PRODUCER_TOKEN', '')
+
+# 热门文章排行榜：小时桶/日桶过期时间（秒），以及最近24小时合并结果的缓存时间
+STATS_LEADERBOARD_HOUR_TTL = 25 * 3600
+STATS_LEADERBOARD_DAY_TTL = 8 * 24 * 3600
+STATS_LEADERBOARD_UNION_TTL = 60
+STATS_LEADERBOARD_MAX_K = 100
+
+# 阅读时间序列：分钟数据在Redis中保留的时间（秒）、由Redis回答的近期窗口（小时）、
+# 汇总任务的执行间隔（秒）和每次回溯的小时数，以及单次查询的最大点数
+STATS_SERIES_MINUTE_TTL = 48 * 3600
+STATS_SERIES_RECENT_HOURS = 24
+STATS_SERIES_COMPACT_INTERVAL = 600
+STATS_SERIES_COMPACT_LOOKBACK_HOURS = 3
+STATS_SERIES_MAX_POINTS = 2000
+
+CELERY_BEAT_SCHEDULE['compact-read-series'] = {
+    'task': 'blog_stats.tasks.compact_read_series',
+    'schedule': STATS_SERIES_COMPACT_INTERVAL,
+}
+
+# 文章统计接口中用户阅读分布的缺省返回方式（none/page/stream，缺省不返回，由客户端按需请求）、
+# 分页大小及流式读取的批大小
+STATS_DISTRIBUTION_DEFAULT = os.getenv('STATS_DISTRIBUTION_DEFAULT', 'none')
+STATS_DISTRIBUTION_PAGE_SIZE = 1000
+STATS_DISTRIBUTION_MAX_PAGE_SIZE = 10000
+STATS_DISTRIBUTION_CHUNK_SIZE = 2000
+
+# 用户阅读历史：Redis中每个用户缓存最近 SIZE 篇文章的阅读时间（0 表示不缓存，历史接口直接查询数据库），
+# 缓存 TTL 秒后过期；历史接口按 (last_read, article_id) 游标分页，每页缺省 PAGE_SIZE 条，最多 MAX_PAGE_SIZE 条
+STATS_USER_HISTORY_SIZE = int(os.getenv('STATS_USER_HISTORY_SIZE', '200'))
+STATS_USER_HISTORY_TTL = 7 * 24 * 3600
+STATS_USER_HISTORY_PAGE_SIZE = 20
+STATS_USER_HISTORY_MAX_PAGE_SIZE = 100
+
+# 全站计数对账任务的执行间隔（秒）；请求路径上缓存与汇总表都为空时只入队对账任务，
+# STATS_GLOBAL_RECONCILE_ENQUEUE_TTL 秒内最多入队一次
+STATS_GLOBAL_RECONCILE_INTERVAL = 3600
+STATS_GLOBAL_RECONCILE_ENQUEUE_TTL = 300
+
+# 阅读次数直方图未缓存时请求不查询数据库，只入队重建任务（每篇文章及全站 STATS_HISTOGRAM_REBUILD_ENQUEUE_TTL 秒内
+# 最多入队一次）；对账任务同时重建全部直方图
+STATS_HISTOGRAM_REBUILD_ENQUEUE_TTL = 300
+
+CELERY_BEAT_SCHEDULE['reconcile-global-stats'] = {
+    'task': 'blog_stats.tasks.reconcile_global_stats',
+    'schedule': STATS_GLOBAL_RECONCILE_INTERVAL,
+}
+
+# Redis与数据库的键空间对账：每批 SCAN 的键数、每秒最多扫描的键数、单次执行的最长时间（秒，超时后保存检查点，
+# 由下一次执行继续；应小于执行间隔）、检查点保留时间（秒）及执行间隔（秒）
+STATS_RECONCILE_BATCH_SIZE = 500
+STATS_RECONCILE_MAX_KEYS_PER_SECOND = int(os.getenv('STATS_RECONCILE_MAX_KEYS_PER_SECOND', '2000'))
+STATS_RECONCILE_MAX_SECONDS = 300
+STATS_RECONCILE_CHECKPOINT_TTL = 7 * 24 * 3600
+STATS_KEYSPACE_RECONCILE_INTERVAL = 1800
+
+CELERY_BEAT_SCHEDULE['reconcile-stats-keyspace'] = {
+    'task': 'blog_stats.tasks.reconcile_stats_keyspace',
+    'schedule': STATS_KEYSPACE_RECONCILE_INTERVAL,
+}
+
+# 缓存预热（manage.py warm_stats_cache）：预热的文章数（按总阅读量或最近更新时间排序的前N篇，0 表示全部）、
+# 每个管道的文章数、并发写入线程数、Redis已用内存达到 maxmemory 的该比例时停止（0 表示不检查）、
+# 预热后抽样检查命中率的文章数。启用 STATS_WARM_ON_WORKER_START 后 Celery worker 启动时自动预热一次，
+# STATS_WARM_LOCK_TTL（秒）内多个 worker 启动只预热一次
+STATS_WARM_LIMIT = int(os.getenv('STATS_WARM_LIMIT', '10000'))
+STATS_WARM_BATCH_SIZE = 1000
+STATS_WARM_CONCURRENCY = 4
+STATS_WARM_MAX_MEMORY_RATIO = 0.8
+STATS_WARM_SAMPLE_SIZE = 1000
+STATS_WARM_ON_WORKER_START = os.getenv('STATS_WARM_ON_WORKER_START', 'false').lower() == 'true'
+STATS_WARM_LOCK_TTL = 300
+
+# 保留策略：启用后计数键在落库前不过期（需要 flush_dirty_stats 定时运行），落库后按当天阅读量设置TTL
+# （最短 MIN_TTL，阅读量每翻一倍增加一个 MIN_TTL，最长 MAX_TTL，单位秒）；Redis已用内存超过
+# STATS_MEMORY_BUDGET_BYTES（0 表示不限制）时按最近访问时间从旧到新淘汰已落库的文章，每批 EVICT_BATCH_SIZE 篇
+STATS_RETENTION_ENABLED = os.getenv('STATS_RETENTION_ENABLED', 'false').lower() == 'true'
+STATS_RETENTION_MIN_TTL = 600
+STATS_RETENTION_MAX_TTL = 24 * 3600
+STATS_MEMORY_BUDGET_BYTES = int(os.getenv('STATS_MEMORY_BUDGET_BYTES', '0'))
+STATS_RETENTION_EVICT_BATCH_SIZE = 200
+STATS_RETENTION_EVICT_INTERVAL = 60
+
+CELERY_BEAT_SCHEDULE['enforce-stats-memory-budget'] = {
+    'task': 'blog_stats.tasks.enforce_stats_memory_budget',
+    'schedule': STATS_RETENTION_EVICT_INTERVAL,
+}
+
+# 批量统计接口单次请求允许的最大文章数
+STATS_BULK_MAX_IDS = 200
+
+# 进程内一级缓存：读路径在Redis之前增加容量受限的LRU缓存，TTL（秒）即允许的最大陈旧时间
+STATS_L1_CACHE_ENABLED = os.getenv('STATS_L1_CACHE_ENABLED', 'false').lower() == 'true'
+STATS_L1_CACHE_MAX_SIZE = 10000
+STATS_L1_CACHE_TTL = 1.0
+
+# 缓存击穿保护：重建锁的持有时间、无旧值时等待重建结果的最长时间及轮询间隔（毫秒）
+STATS_STAMPEDE_LOCK_TIMEOUT_MS = 5000
+STATS_STAMPEDE_LOCK_WAIT_MS = 500
+STATS_STAMPEDE_POLL_MS = 25
+# 回填元数据（旧值）的保留时间（秒），计数过期后在重建期间返回旧值
+STATS_STALE_TTL = 86400
+# 概率性提前刷新系数，越大越早刷新，0 表示关闭
+STATS_EARLY_REFRESH_BETA = 1.0
+
+# 异步视图：ASGI部署时启用，跟踪与统计接口改用 redis.asyncio 和Django异步ORM；
+# 不要关闭 STATS_ATOMIC_INCREMENT，非原子计数模式仍需在线程中执行
+STATS_ASYNC_VIEWS = os.getenv('STATS_ASYNC_VIEWS', 'false').lower() == 'true'
+
+# 中间件阅读计数派发方式：inline（响应前同步计数）或 background（有界队列 + 后台线程池，ASGI下为事件循环任务）
+STATS_TRACK_DISPATCH = os.getenv('STATS_TRACK_DISPATCH', 'inline')
+# 后台队列容量（ASGI下为未完成任务上限），队列满时丢弃事件
+STATS_TRACK_QUEUE_SIZE = 10000
+STATS_TRACK_WORKERS = 4
+
+# Redis客户端：读写/建连超时（秒）、健康检查间隔（秒）、连接错误时的重试次数及指数退避（秒）
+STATS_REDIS_SOCKET_TIMEOUT = 0.5
+STATS_REDIS_CONNECT_TIMEOUT = 0.5
+STATS_REDIS_HEALTH_CHECK_INTERVAL = 30
+STATS_REDIS_RETRIES = 2
+STATS_REDIS_RETRY_BACKOFF_BASE = 0.01
+STATS_REDIS_RETRY_BACKOFF_CAP = 0.1
+# 熔断器：连续失败次数阈值，打开后经过多少秒放行探测请求
+STATS_REDIS_BREAKER_FAILURES = 5
+STATS_REDIS_BREAKER_RESET_TIMEOUT = 5.0
+
+# 文章计数的Redis键布局：keys（每个计数、每个用户阅读次数各一个键）或 hash（每篇文章一个计数哈希和一个
+# 用户阅读次数哈希，键数量和内存占用显著减少）。切换到 hash 后执行 manage.py migrate_stats_layout 在线迁移旧键。
+# 哈希以 listpack 紧凑编码存储，读者较多的文章需要相应调大Redis的 hash-max-listpack-entries（默认128）
+STATS_KEY_LAYOUT = os.getenv('STATS_KEY_LAYOUT', 'keys')
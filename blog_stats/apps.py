@@ -1,5 +1,5 @@
-from django.apps import AppConfig
-
-
-class BlogStatsConfig(AppConfig):
-    name = 'blog_stats'
+from django.apps import AppConfig
+
+
+class BlogStatsConfig(AppConfig):
+    name = 'blog_stats'
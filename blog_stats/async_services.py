@@ -0,0 +1,253 @@
+# blog_stats/async_services.py
+"""StatsCacheService 的异步版本，供ASGI下的异步视图使用
+
+Redis 访问走 redis.asyncio 连接池，缓存未命中或Redis不可用时使用Django异步ORM。
+键名与取值编码和同步版本完全一致（cache.make_key 与 django-redis 的序列化），两者可混用。
+"""
+import asyncio
+import logging
+import random
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from redis import asyncio as redis_asyncio
+
+from . import local_cache, metrics, redis_client
+from .services import (
+    ACCESS_INDEX_KEY, DIRTY_ARTICLES_KEY, GLOBAL_STATS_FIELDS, REBUILD_LOCK_KEY, REBUILD_WAITERS_KEY,
+    RELEASE_LOCK_SCRIPT, STATS_CACHE_TIMEOUT, STATS_META_KEY, USER_COUNT_MODE_APPROXIMATE, StatsCacheService,
+    _approximate_script_call, _atomic_script_call, _encode, _extend_ttl_call, _global_stats_key, _histogram_key,
+    _leaderboard_key, _merge_migrated, _migrate_counters_call, _parse_counters, _queue_cache_counters,
+    _queue_fetch_counters, _retention_status, _stats_meta, histogram_label,
+)
+
+logger = logging.getLogger(__name__)
+
+# redis.asyncio 的连接绑定创建它的事件循环，因此按事件循环各建一个连接池
+_pools = weakref.WeakKeyDictionary()
+_scripts = {}
+
+
+def get_async_redis():
+    """获取当前事件循环的 redis.asyncio 客户端（共享连接池，超时与健康检查设置及熔断器同 redis_client）"""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = redis_asyncio.ConnectionPool.from_url(
+            settings.CACHES['default']['LOCATION'], **redis_client.connection_kwargs())
+    return redis_client.AsyncGuardedRedis(connection_pool=pool)
+
+
+def _get_async_script(source):
+    """获取异步Lua脚本对象（按进程缓存，调用时通过 client 参数指定连接）"""
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = get_async_redis().register_script(source)
+    return script
+
+
+async def _fetch_counters(article_ids, with_meta=False):
+    """services._fetch_counters 的异步版本"""
+    redis_conn = get_async_redis()
+    pipe = redis_conn.pipeline(transaction=False)
+    _queue_fetch_counters(pipe, article_ids, with_meta)
+    values, missing = _parse_counters(article_ids, await pipe.execute(), with_meta)
+    results = []
+    for article_id in missing:
+        script, keys, args = _migrate_counters_call(article_id)
+        results.append(await _get_async_script(script.script)(keys=keys, args=args, client=redis_conn))
+    return _merge_migrated(values, missing, results)
+
+
+async def _invalidate_local_cache(keys):
+    # 发布失效通知是阻塞调用，仅在启用L1时放到线程中执行
+    if local_cache.get_local_cache() is not None:
+        await sync_to_async(local_cache.invalidate)(keys)
+
+
+class AsyncStatsCacheService:
+    @staticmethod
+    async def increment_read(article_id, user_id):
+        """增加文章阅读次数，返回是否为新用户
+
+        原子/近似模式直接在事件循环中执行计数脚本；非原子模式包含多次读改写，仍在线程池中执行同步实现（不占用共享的同步线程）。
+        """
+        if StatsCacheService.get_user_count_mode() == USER_COUNT_MODE_APPROXIMATE:
+            mode, script_call = USER_COUNT_MODE_APPROXIMATE, _approximate_script_call
+        elif StatsCacheService.is_atomic_increment():
+            mode, script_call = 'atomic', _atomic_script_call
+        else:
+            return await sync_to_async(StatsCacheService.increment_read, thread_sensitive=False)(article_id, user_id)
+
+        with metrics.INCREMENT_READ_SECONDS.time(mode=mode):
+            try:
+                script, keys, args = script_call(article_id, user_id, 1)
+                result = await _get_async_script(script.script)(keys=keys, args=args, client=get_async_redis())
+                return bool(result[-1])
+            except Exception as e:
+                logger.error(f"Cache unavailable, using DB fallback: {str(e)}")
+                metrics.DB_FALLBACKS.inc(operation='increment_read')
+                # 降级到数据库处理
+                return await AsyncStatsCacheService.increment_read_db(article_id, user_id)
+
+    @staticmethod
+    async def increment_read_db(article_id, user_id, count=1):
+        """直接在数据库中增加阅读次数（缓存不可用时的降级方案），返回是否为新用户
+
+        异步ORM不支持事务，在线程池中执行同步实现（同样支持微批缓冲）。
+        """
+        return await sync_to_async(StatsCacheService.record_read_db, thread_sensitive=False)(article_id, user_id, count)
+
+    @staticmethod
+    async def get_stats_snapshot(article_id):
+        """一次往返读取文章计数及回填元数据：(total_reads, user_count, meta)，缺失项为None"""
+        total_reads_key = f"article:{article_id}:total_reads"
+        user_count_key = f"article:{article_id}:user_count"
+        l1 = local_cache.get_local_cache()
+        if l1 is not None:
+            total_reads, user_count = l1.get(total_reads_key), l1.get(user_count_key)
+            if total_reads is not local_cache.MISSING and user_count is not local_cache.MISSING:
+                return int(total_reads), int(user_count), None
+
+        total_reads, user_count, meta = (await _fetch_counters([article_id], with_meta=True))[article_id]
+        if l1 is not None:
+            if total_reads is not None:
+                l1.set(total_reads_key, total_reads)
+            if user_count is not None:
+                l1.set(user_count_key, user_count)
+        return total_reads, user_count, meta
+
+    @staticmethod
+    async def cache_stats(article_id, total_reads, user_count, delta=0.0):
+        """缓存文章统计数据及回填元数据"""
+        pipe = get_async_redis().pipeline(transaction=False)
+        _queue_cache_counters(pipe, article_id, total_reads, user_count)
+        pipe.set(cache.make_key(STATS_META_KEY.format(article_id=article_id)),
+                 _encode(_stats_meta(total_reads, user_count, delta)), ex=settings.STATS_STALE_TTL)
+        await pipe.execute()
+        await _invalidate_local_cache([f"article:{article_id}:total_reads", f"article:{article_id}:user_count"])
+
+    @staticmethod
+    async def extend_stats_ttl(article_id, meta):
+        """在过期前延长文章计数的TTL（与同步版本相同，只续期不覆盖）"""
+        script, keys, args = _extend_ttl_call(article_id)
+        extended = bool(await _get_async_script(script.script)(keys=keys, args=args, client=get_async_redis()))
+        if extended:
+            meta = dict(meta, expires_at=time.time() + STATS_CACHE_TIMEOUT)
+            await get_async_redis().set(cache.make_key(STATS_META_KEY.format(article_id=article_id)),
+                                        _encode(meta), ex=settings.STATS_STALE_TTL)
+        return extended
+
+    @staticmethod
+    async def acquire_rebuild_lock(name, count_waiter=True):
+        """尝试获取短期重建锁，成功返回锁令牌；失败返回None，并（可选）登记为等待者"""
+        redis_conn = get_async_redis()
+        token = f"{random.getrandbits(64):016x}"
+        if await redis_conn.set(cache.make_key(REBUILD_LOCK_KEY.format(name=name)), token,
+                                nx=True, px=settings.STATS_STAMPEDE_LOCK_TIMEOUT_MS):
+            return token
+        if count_waiter:
+            waiters_key = cache.make_key(REBUILD_WAITERS_KEY.format(name=name))
+            pipe = redis_conn.pipeline(transaction=False)
+            pipe.incr(waiters_key)
+            pipe.pexpire(waiters_key, settings.STATS_STAMPEDE_LOCK_TIMEOUT_MS)
+            await pipe.execute()
+        return None
+
+    @staticmethod
+    async def release_rebuild_lock(name, token):
+        """释放重建锁，返回锁持有期间登记的等待者数量"""
+        keys = [cache.make_key(REBUILD_LOCK_KEY.format(name=name)),
+                cache.make_key(REBUILD_WAITERS_KEY.format(name=name))]
+        return int(await _get_async_script(RELEASE_LOCK_SCRIPT)(keys=keys, args=[token], client=get_async_redis()))
+
+    @staticmethod
+    async def single_flight(kind, name, rebuild, peek, stale=None):
+        """单飞重建（rebuild、peek 为协程函数），返回值与 StatsCacheService.single_flight 相同"""
+        token = await AsyncStatsCacheService.acquire_rebuild_lock(name)
+        if token:
+            try:
+                value = await rebuild()
+            finally:
+                try:
+                    waiters = await AsyncStatsCacheService.release_rebuild_lock(name, token)
+                    metrics.STAMPEDE_STORM_SIZE.observe(waiters + 1, kind=kind)
+                except Exception as e:
+                    logger.error(f"Failed to release rebuild lock {name}: {str(e)}")
+            metrics.STAMPEDE_REBUILDS.inc(kind=kind, outcome='rebuilt')
+            return value, 'rebuilt'
+
+        if stale is not None:
+            metrics.STAMPEDE_REBUILDS.inc(kind=kind, outcome='stale')
+            return stale, 'stale'
+
+        value = None
+        with metrics.STAMPEDE_LOCK_WAIT_SECONDS.time(kind=kind):
+            deadline = time.monotonic() + settings.STATS_STAMPEDE_LOCK_WAIT_MS / 1000
+            while time.monotonic() < deadline:
+                await asyncio.sleep(settings.STATS_STAMPEDE_POLL_MS / 1000)
+                value = await peek()
+                if value is not None:
+                    break
+        outcome = 'waited' if value is not None else 'timeout'
+        metrics.STAMPEDE_REBUILDS.inc(kind=kind, outcome=outcome)
+        return value, outcome
+
+    @staticmethod
+    async def get_read_histogram(article_id=None):
+        """获取阅读次数直方图：{区间标签: 读者数}，未缓存时返回None"""
+        histogram = await get_async_redis().hgetall(_histogram_key(article_id))
+        if not histogram:
+            return None
+        return {
+            histogram_label(bucket): readers
+            for bucket, readers in sorted((int(bucket), int(readers)) for bucket, readers in histogram.items())
+            if readers > 0
+        }
+
+    @staticmethod
+    async def get_global_stats():
+        """一次MGET读取全站计数：{total_reads, total_users, active_users}，缺失的计数为None"""
+        values = await get_async_redis().mget([_global_stats_key(name) for name in GLOBAL_STATS_FIELDS])
+        return {
+            name: int(value) if value is not None else None
+            for name, value in zip(GLOBAL_STATS_FIELDS, values)
+        }
+
+    @staticmethod
+    async def set_global_stats(total_reads, total_users, active_users, overwrite=True):
+        """写入全站计数；overwrite=False 时只回填缺失的计数"""
+        values = {'total_reads': total_reads, 'total_users': total_users, 'active_users': active_users}
+        pipe = get_async_redis().pipeline(transaction=False)
+        for name, value in values.items():
+            pipe.set(_global_stats_key(name), value, nx=not overwrite)
+        await pipe.execute()
+
+    @staticmethod
+    async def get_retention_status():
+        """保留策略状态（与同步版本相同）"""
+        redis_conn = get_async_redis()
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.scard(cache.make_key(DIRTY_ARTICLES_KEY))
+        pipe.zcard(cache.make_key(ACCESS_INDEX_KEY))
+        pinned_articles, tracked_articles = await pipe.execute()
+        return _retention_status(await redis_conn.info('memory'), pinned_articles, tracked_articles)
+
+    @staticmethod
+    async def get_top_articles(k=10):
+        """获取热门文章：[(article_id, total_reads)]，优先读取全部时间排行榜"""
+        from .models import ArticleStats
+        try:
+            entries = await get_async_redis().zrevrange(_leaderboard_key('all'), 0, k - 1, withscores=True)
+            if entries:
+                return [(int(member), int(score)) for member, score in entries]
+        except Exception as e:
+            logger.error(f"Leaderboard unavailable, using DB fallback: {str(e)}")
+        try:
+            top_articles = ArticleStats.objects.filter(total_reads__gt=0).order_by('-total_reads')[:k]
+            return [(stats.article_id, stats.total_reads) async for stats in top_articles]
+        except Exception:
+            return []
@@ -0,0 +1,241 @@
+# blog_stats/async_views.py
+"""跟踪与统计视图的异步版本（STATS_ASYNC_VIEWS 启用时由 urls.py 注册）
+
+在ASGI下直接运行于事件循环中，Redis 访问使用 redis.asyncio，数据库降级使用Django异步ORM，
+请求处理期间不再占用线程。
+"""
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+
+from . import metrics, redis_client
+from .async_services import AsyncStatsCacheService, get_async_redis
+from .models import ArticleStats, GlobalStats, UserRead
+from .services import USER_COUNT_MODE_EXACT, StatsCacheService
+from .tasks import enqueue_global_reconcile, enqueue_histogram_rebuild, enqueue_stats_update
+from .views import ArticleStatsView, CacheStatsView, TotalReadsView, TrackArticleReadView
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTrackArticleReadView(TrackArticleReadView):
+    """跟踪文章阅读（异步）"""
+
+    async def post(self, request, article_id):
+        user_id = await sync_to_async(self.get_user_id)(request)
+
+        try:
+            await AsyncStatsCacheService.increment_read(article_id, user_id)
+            if settings.STATS_TASK_BATCH_ENABLED:
+                await sync_to_async(enqueue_stats_update, thread_sensitive=False)(article_id, user_id)
+            return JsonResponse({'status': 'success'})
+        except Exception as e:
+            logger.error(f"Tracking error: {str(e)}")
+            # 降级处理：直接更新数据库
+            metrics.DB_FALLBACKS.inc(operation='track')
+            await sync_to_async(self.update_directly)(article_id, user_id)
+            return JsonResponse({'status': 'degraded', 'message': str(e)}, status=500)
+
+
+class AsyncArticleStatsView(ArticleStatsView):
+    """获取文章统计数据（异步），查询参数与 ArticleStatsView 相同"""
+
+    async def get(self, request, article_id):
+        distribution_mode, limit, error = self.parse_distribution_params(request, article_id)
+        if error is not None:
+            return error
+
+        try:
+            payload = await self.get_stats(article_id)
+            if distribution_mode == 'stream':
+                return StreamingHttpResponse(
+                    self.stream_user_read_distribution(payload, article_id),
+                    content_type='application/json'
+                )
+            if distribution_mode == 'page':
+                distribution, next_cursor = await self.get_user_read_distribution(
+                    article_id, request.GET.get('cursor'), limit)
+                payload['user_read_distribution'] = distribution
+                payload['distribution_next_cursor'] = next_cursor
+            return JsonResponse(payload)
+        except Exception as e:
+            logger.error(f"Stats retrieval error: {str(e)}")
+            return JsonResponse({
+                'error': 'Internal server error',
+                'article_id': article_id
+            }, status=500)
+
+    async def get_stats(self, article_id):
+        """获取文章计数（优先读缓存，未命中时单飞重建，其余请求返回旧值）"""
+        total_reads, user_count, meta = await AsyncStatsCacheService.get_stats_snapshot(article_id)
+        user_count_mode = StatsCacheService.get_user_count_mode()
+
+        if total_reads is not None and user_count is not None:
+            metrics.CACHE_REQUESTS.inc(view='article_stats', result='hit')
+            source = 'cache'
+            if StatsCacheService.should_refresh_early(meta):
+                await self.refresh_early(article_id, meta)
+        else:
+            metrics.CACHE_REQUESTS.inc(view='article_stats', result='miss')
+            total_reads, user_count, source = await self.rebuild_stats(article_id, meta)
+
+        return {
+            'article_id': article_id,
+            'total_reads': total_reads,
+            'user_count': user_count,
+            'user_count_mode': user_count_mode,
+            'read_histogram': await self.get_read_histogram(article_id, user_count_mode, source),
+            'source': source
+        }
+
+    async def refresh_early(self, article_id, meta):
+        """在计数过期前由单个请求续期，避免热点键同时过期"""
+        token = await AsyncStatsCacheService.acquire_rebuild_lock(f"article:{article_id}:stats", count_waiter=False)
+        if token is None:
+            return
+        try:
+            if await AsyncStatsCacheService.extend_stats_ttl(article_id, meta):
+                metrics.STAMPEDE_REBUILDS.inc(kind='article_stats', outcome='early_refresh')
+        finally:
+            await AsyncStatsCacheService.release_rebuild_lock(f"article:{article_id}:stats", token)
+
+    async def rebuild_stats(self, article_id, meta):
+        """缓存未命中：单飞查询数据库并回填，返回 (total_reads, user_count, source)"""
+        async def rebuild():
+            started = time.perf_counter()
+            stats = await ArticleStats.objects.filter(article_id=article_id).afirst()
+            if stats is None:
+                return 0, 0, 'default'
+            # 回填缓存
+            await AsyncStatsCacheService.cache_stats(article_id, stats.total_reads, stats.user_count,
+                                                     delta=time.perf_counter() - started)
+            return stats.total_reads, stats.user_count, 'database'
+
+        async def peek():
+            total_reads, user_count, _ = await AsyncStatsCacheService.get_stats_snapshot(article_id)
+            if total_reads is None or user_count is None:
+                return None
+            return total_reads, user_count, 'cache'
+
+        stale = (meta['total_reads'], meta['user_count'], 'stale') if meta else None
+        result, outcome = await AsyncStatsCacheService.single_flight(
+            'article_stats', f"article:{article_id}:stats", rebuild, peek, stale=stale)
+        if outcome == 'timeout':
+            # 等待超时：直接读取数据库，不回填
+            stats = await ArticleStats.objects.filter(article_id=article_id).afirst()
+            if stats is None:
+                return 0, 0, 'default'
+            return stats.total_reads, stats.user_count, 'database'
+        return result
+
+    async def get_read_histogram(self, article_id, user_count_mode, source):
+        """获取文章阅读次数直方图（仅精确模式维护），未缓存时返回None并入队重建"""
+        if user_count_mode != USER_COUNT_MODE_EXACT or source == 'default':
+            return None
+        histogram = await AsyncStatsCacheService.get_read_histogram(article_id)
+        if histogram is None:
+            await sync_to_async(enqueue_histogram_rebuild)(article_id)
+        return histogram
+
+    async def get_user_read_distribution(self, article_id, cursor=None, limit=1000):
+        """按 user_id 游标分页获取用户阅读次数分布，返回 (分布, 下一页游标)"""
+        user_reads = UserRead.objects.filter(article_id=article_id).order_by('user_id')
+        if cursor:
+            user_reads = user_reads.filter(user_id__gt=cursor)
+        page = [row async for row in user_reads.values_list('user_id', 'read_count')[:limit + 1]]
+        next_cursor = page[limit - 1][0] if len(page) > limit else None
+        return dict(page[:limit]), next_cursor
+
+    async def stream_user_read_distribution(self, payload, article_id):
+        """以JSON形式流式输出统计数据及完整的用户阅读次数分布"""
+        chunk_size = settings.STATS_DISTRIBUTION_CHUNK_SIZE
+        user_reads = UserRead.objects.filter(article_id=article_id).order_by('user_id').values_list(
+            'user_id', 'read_count')
+
+        yield json.dumps(payload)[:-1] + ', "user_read_distribution": {'
+        separator = ''
+        buffer = []
+        async for user_id, read_count in user_reads.aiterator(chunk_size=chunk_size):
+            buffer.append(f"{separator}{json.dumps(user_id)}: {read_count}")
+            separator = ', '
+            if len(buffer) >= chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+        yield ''.join(buffer) + '}}'
+
+
+class AsyncCacheStatsView(CacheStatsView):
+    """获取缓存统计信息（异步）"""
+
+    async def get(self, request):
+        try:
+            hit_rate = StatsCacheService.get_cache_hit_rate()
+            redis_conn = get_async_redis()
+            keys = await redis_conn.info('keyspace')
+
+            # 获取热门文章数量
+            top_articles = await AsyncStatsCacheService.get_top_articles()
+            top_articles_count = len(top_articles) if top_articles else 0
+
+            return JsonResponse({
+                'hit_rate': f"{hit_rate:.2f}%",
+                'redis_stats': keys,
+                'total_keys': await redis_conn.dbsize(),
+                'top_articles_count': top_articles_count,
+                'redis_client': redis_client.get_status(),
+                'retention': await AsyncStatsCacheService.get_retention_status(),
+            })
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+class AsyncTotalReadsView(TotalReadsView):
+    """获取所有文章的总阅读量（异步）"""
+
+    async def get(self, request):
+        try:
+            stats = await AsyncStatsCacheService.get_global_stats()
+            source = 'cache'
+
+            if None not in stats.values():
+                metrics.CACHE_REQUESTS.inc(view='total_reads', result='hit')
+            else:
+                metrics.CACHE_REQUESTS.inc(view='total_reads', result='miss')
+                # 缓存未命中，读取汇总表；汇总表为空时按缓存中已有的计数返回，并入队对账任务
+                source = 'database'
+                global_stats = await GlobalStats.objects.filter(pk=1).afirst()
+                if global_stats is None:
+                    stats = {name: value or 0 for name, value in stats.items()}
+                    source = 'stale'
+                    await sync_to_async(enqueue_global_reconcile)()
+                else:
+                    stats = {
+                        'total_reads': global_stats.total_reads,
+                        'total_users': global_stats.total_users,
+                        'active_users': global_stats.active_users,
+                    }
+                    # 将结果回填到缓存（不覆盖已存在的计数）
+                    await AsyncStatsCacheService.set_global_stats(overwrite=False, **stats)
+
+            user_count_mode = StatsCacheService.get_user_count_mode()
+            read_histogram = None
+            if user_count_mode == USER_COUNT_MODE_EXACT:
+                read_histogram = await AsyncStatsCacheService.get_read_histogram()
+                if read_histogram is None:
+                    await sync_to_async(enqueue_histogram_rebuild)()
+
+            return JsonResponse({
+                'total_reads': stats['total_reads'],
+                'total_users': stats['total_users'],
+                'user_read_distribution_count': stats['active_users'],  # 新增字段
+                'user_count_mode': user_count_mode,
+                'read_histogram': read_histogram,
+                'source': source
+            })
+        except Exception as e:
+            logger.error(f"Total reads retrieval error: {str(e)}")
+            return JsonResponse({'error': 'Internal server error'}, status=500)
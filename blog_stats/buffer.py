@@ -0,0 +1,172 @@
+# blog_stats/buffer.py
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from . import metrics
+from .services import StatsCacheService
+
+logger = logging.getLogger(__name__)
+
+
+class ReadBuffer:
+    """进程内阅读计数合并缓冲区
+
+    按 (article_id, user_id) 在内存中累加阅读次数，达到 max_events 条或距上次刷新超过
+    flush_interval_ms 毫秒时（先到者为准），通过一次Redis管道写入合并后的增量。
+    进程崩溃时最多丢失 max_events 次阅读。
+    """
+
+    def __init__(self, max_events=100, flush_interval_ms=200):
+        self.max_events = max_events
+        self.flush_interval = flush_interval_ms / 1000
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._flusher = None
+        self._pid = None
+
+    def add(self, article_id, user_id, count=1):
+        """记录一次阅读，必要时立即刷新"""
+        self._ensure_flusher()
+        with self._lock:
+            self._counts[(article_id, user_id)] += count
+            self._pending += count
+            should_flush = (self._pending >= self.max_events or
+                            time.monotonic() - self._last_flush >= self.flush_interval)
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """将缓冲区中的合并增量写入存储，返回写入的阅读次数"""
+        with self._lock:
+            deltas, self._counts = self._counts, defaultdict(int)
+            pending, self._pending = self._pending, 0
+            self._last_flush = time.monotonic()
+        if not deltas:
+            return 0
+        self.write(deltas, pending)
+        return pending
+
+    def write(self, deltas, pending):
+        """通过一次Redis管道写入合并后的增量，Redis不可用时批量降级写入（本地暂存或一个数据库事务）"""
+        try:
+            StatsCacheService.increment_reads_bulk(deltas)
+        except Exception as e:
+            logger.error(f"Cache unavailable, flushing {pending} buffered reads to fallback: {str(e)}")
+            metrics.DB_FALLBACKS.inc(operation='read_buffer')
+            try:
+                StatsCacheService.record_reads_db_bulk(deltas)
+            except Exception as db_error:
+                logger.critical(f"Dropped {pending} buffered reads: {str(db_error)}")
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _ensure_flusher(self):
+        """按进程启动后台定时刷新线程（兼容 fork 后的 worker 进程）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._flusher = threading.Thread(target=self._run, name='stats-read-buffer', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Read buffer flush failed: {str(e)}")
+
+
+class DbFallbackBuffer(ReadBuffer):
+    """数据库降级写入的微批缓冲区
+
+    Redis不可用时所有阅读都落到数据库，逐条写入会压垮数据库；启用后按条数或时间间隔合并，
+    每批在一个事务内写入。进程崩溃时最多丢失 max_events 次阅读。
+    """
+
+    def write(self, deltas, pending):
+        try:
+            StatsCacheService.increment_reads_db_bulk(deltas)
+        except Exception as e:
+            logger.critical(f"Dropped {pending} buffered reads: {str(e)}")
+
+
+class StatsTaskBatcher(ReadBuffer):
+    """落库任务的合并入队：窗口内的事件按 (article_id, user_id) 合并，每 max_events 个事件一条任务消息"""
+
+    def write(self, deltas, pending):
+        from .tasks import async_update_stats_batch
+
+        events = [[article_id, user_id, count] for (article_id, user_id), count in deltas.items()]
+        for start in range(0, len(events), self.max_events):
+            chunk = events[start:start + self.max_events]
+            try:
+                async_update_stats_batch.delay(events=chunk)
+            except Exception as e:
+                logger.error(f"Failed to enqueue stats update for {len(chunk)} events: {str(e)}")
+
+
+_read_buffer = None
+_read_buffer_lock = threading.Lock()
+
+
+def get_read_buffer():
+    """获取当前进程的阅读缓冲区"""
+    global _read_buffer
+    if _read_buffer is None:
+        with _read_buffer_lock:
+            if _read_buffer is None:
+                _read_buffer = ReadBuffer(
+                    max_events=settings.STATS_READ_BUFFER_MAX_EVENTS,
+                    flush_interval_ms=settings.STATS_READ_BUFFER_FLUSH_INTERVAL_MS,
+                )
+                # worker 退出时刷新剩余的阅读计数
+                atexit.register(_read_buffer.flush)
+    return _read_buffer
+
+
+_db_fallback_buffer = None
+
+
+def get_db_fallback_buffer():
+    """获取当前进程的数据库降级写入缓冲区"""
+    global _db_fallback_buffer
+    if _db_fallback_buffer is None:
+        with _read_buffer_lock:
+            if _db_fallback_buffer is None:
+                _db_fallback_buffer = DbFallbackBuffer(
+                    max_events=settings.STATS_DB_FALLBACK_BATCH_MAX_EVENTS,
+                    flush_interval_ms=settings.STATS_DB_FALLBACK_BATCH_INTERVAL_MS,
+                )
+                atexit.register(_db_fallback_buffer.flush)
+    return _db_fallback_buffer
+
+
+_task_batcher = None
+
+
+def get_task_batcher():
+    """获取当前进程的落库任务合并入队器"""
+    global _task_batcher
+    if _task_batcher is None:
+        with _read_buffer_lock:
+            if _task_batcher is None:
+                _task_batcher = StatsTaskBatcher(
+                    max_events=settings.STATS_TASK_BATCH_MAX_EVENTS,
+                    flush_interval_ms=settings.STATS_TASK_BATCH_WINDOW_MS,
+                )
+                atexit.register(_task_batcher.flush)
+    return _task_batcher
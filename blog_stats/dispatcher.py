@@ -0,0 +1,146 @@
+# blog_stats/dispatcher.py
+"""请求路径之外的阅读计数派发
+
+同步（WSGI）下将事件放入有界队列，由后台线程池执行；异步（ASGI）下在当前事件循环中创建任务，
+并发任务数同样受上限约束。队列已满时丢弃事件，页面响应从不等待统计写入。
+"""
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundDispatcher:
+    """有界队列 + 工作线程池"""
+
+    executor = 'thread'
+
+    def __init__(self, max_size=10000, workers=4):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._pid = None
+        metrics.TRACK_QUEUE_DEPTH.set_function(self._queue.qsize, executor=self.executor)
+
+    def submit(self, func, *args):
+        """将 func(*args) 放入队列，队列已满时丢弃并返回False"""
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait((func, args, time.monotonic()))
+        except queue.Full:
+            metrics.TRACK_EVENTS_DROPPED.inc(executor=self.executor)
+            return False
+        return True
+
+    def drain(self, timeout=5.0):
+        """等待队列中的事件处理完毕（进程退出或测试时使用），返回是否已清空"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def _ensure_workers(self):
+        """按进程启动工作线程（兼容 fork 后的 worker 进程）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for index in range(self.workers):
+                threading.Thread(target=self._run, name=f'stats-track-{index}', daemon=True).start()
+
+    def _run(self):
+        while True:
+            func, args, enqueued_at = self._queue.get()
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error(f"Background tracking failed: {str(e)}")
+            finally:
+                metrics.TRACK_DRAIN_SECONDS.observe(time.monotonic() - enqueued_at, executor=self.executor)
+                self._queue.task_done()
+
+
+class AsyncTaskDispatcher:
+    """在当前事件循环中以任务执行协程，限制未完成任务数"""
+
+    executor = 'asyncio'
+
+    def __init__(self, max_pending=10000):
+        self.max_pending = max_pending
+        self._tasks = set()
+        metrics.TRACK_QUEUE_DEPTH.set_function(lambda: len(self._tasks), executor=self.executor)
+
+    def submit(self, coroutine_function, *args):
+        """创建任务执行 coroutine_function(*args)，未完成任务已达上限时丢弃并返回False"""
+        if len(self._tasks) >= self.max_pending:
+            metrics.TRACK_EVENTS_DROPPED.inc(executor=self.executor)
+            return False
+        task = asyncio.get_running_loop().create_task(self._run(coroutine_function, args, time.monotonic()))
+        # 事件循环只持有任务的弱引用，需自行保存直到完成
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def drain(self):
+        """等待当前事件循环中已提交的任务完成"""
+        loop = asyncio.get_running_loop()
+        tasks = [task for task in self._tasks if task.get_loop() is loop]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @property
+    def depth(self):
+        return len(self._tasks)
+
+    async def _run(self, coroutine_function, args, enqueued_at):
+        try:
+            await coroutine_function(*args)
+        except Exception as e:
+            logger.error(f"Background tracking failed: {str(e)}")
+        finally:
+            metrics.TRACK_DRAIN_SECONDS.observe(time.monotonic() - enqueued_at, executor=self.executor)
+
+
+_background_dispatcher = None
+_async_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_background_dispatcher():
+    """获取当前进程的后台线程池派发器"""
+    global _background_dispatcher
+    if _background_dispatcher is None:
+        with _dispatcher_lock:
+            if _background_dispatcher is None:
+                _background_dispatcher = BackgroundDispatcher(
+                    max_size=settings.STATS_TRACK_QUEUE_SIZE,
+                    workers=settings.STATS_TRACK_WORKERS,
+                )
+                # worker 退出前尽量处理完队列中的事件
+                atexit.register(_background_dispatcher.drain)
+    return _background_dispatcher
+
+
+def get_async_dispatcher():
+    """获取当前进程的异步任务派发器"""
+    global _async_dispatcher
+    if _async_dispatcher is None:
+        with _dispatcher_lock:
+            if _async_dispatcher is None:
+                _async_dispatcher = AsyncTaskDispatcher(max_pending=settings.STATS_TRACK_QUEUE_SIZE)
+    return _async_dispatcher
@@ -0,0 +1,127 @@
+# blog_stats/local_cache.py
+"""进程内一级缓存（L1）：容量受限的LRU + 短TTL，位于Redis（L2）之前，仅用于读路径
+
+回填或重置计数时通过Redis发布/订阅通知所有进程失效对应的键。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import metrics
+from .redis_client import get_pubsub_connection, get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "stats:l1:invalidate"
+
+MISSING = object()
+
+
+class LocalTTLCache:
+    """线程安全的LRU缓存，条目在 ttl 秒后过期"""
+
+    def __init__(self, max_size=10000, ttl=1.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._data.move_to_end(key)
+                metrics.L1_CACHE_REQUESTS.inc(result='hit')
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+        metrics.L1_CACHE_REQUESTS.inc(result='miss')
+        return MISSING
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                metrics.L1_CACHE_EVICTIONS.inc(reason='size')
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    metrics.L1_CACHE_EVICTIONS.inc(reason='invalidation')
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_local_cache = None
+_subscriber_pid = None
+_lock = threading.Lock()
+
+
+def get_local_cache():
+    """获取当前进程的L1缓存，未启用时返回None"""
+    global _local_cache
+    if not getattr(settings, 'STATS_L1_CACHE_ENABLED', False):
+        return None
+    if _local_cache is None:
+        with _lock:
+            if _local_cache is None:
+                _local_cache = LocalTTLCache(
+                    max_size=settings.STATS_L1_CACHE_MAX_SIZE,
+                    ttl=settings.STATS_L1_CACHE_TTL,
+                )
+    _ensure_subscriber()
+    return _local_cache
+
+
+def invalidate(keys):
+    """失效本进程的L1条目并通知其他进程"""
+    keys = list(keys)
+    if not keys or not getattr(settings, 'STATS_L1_CACHE_ENABLED', False):
+        return
+    if _local_cache is not None:
+        _local_cache.delete_many(keys)
+    try:
+        get_redis_connection().publish(INVALIDATION_CHANNEL, json.dumps(keys))
+    except Exception as e:
+        logger.error(f"Failed to publish L1 invalidation: {str(e)}")
+
+
+def _ensure_subscriber():
+    """按进程启动失效通知订阅线程（兼容 fork 后的 worker 进程）"""
+    global _subscriber_pid
+    if _subscriber_pid == os.getpid():
+        return
+    with _lock:
+        if _subscriber_pid == os.getpid():
+            return
+        _subscriber_pid = os.getpid()
+        threading.Thread(target=_listen, name='stats-l1-invalidation', daemon=True).start()
+
+
+def _listen():
+    while True:
+        try:
+            pubsub = get_pubsub_connection().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            for message in pubsub.listen():
+                if _local_cache is not None and message.get('type') == 'message':
+                    _local_cache.delete_many(json.loads(message['data']))
+        except Exception as e:
+            logger.error(f"L1 invalidation subscriber failed: {str(e)}")
+        # 订阅中断期间可能错过失效通知，清空L1后重连
+        if _local_cache is not None:
+            _local_cache.clear()
+        time.sleep(1)
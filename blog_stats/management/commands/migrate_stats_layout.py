@@ -0,0 +1,68 @@
+# blog_stats/management/commands/migrate_stats_layout.py
+"""将文章计数从 keys 布局在线迁移到 hash 布局
+
+先设置 STATS_KEY_LAYOUT=hash 并重启服务，再执行本命令。迁移期间读写路径会就地合并遇到的旧键，
+本命令用 SCAN 分批找出其余旧键，每篇文章的合并与删除在一个Lua脚本内原子完成，可重复执行。
+"""
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_stats.redis_client import get_redis_connection
+from blog_stats.services import STATS_LAYOUT_HASH, StatsCacheService
+
+COUNTER_KEY_RE = re.compile(r'^article:(\d+):(?:total_reads|user_count)$')
+USER_KEY_RE = re.compile(r'^article:(\d+):user:(.+)$')
+
+
+class Command(BaseCommand):
+    help = "Migrate article counters and per-user read counts from per-key layout to per-article hashes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Keys per SCAN batch")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the keys that would be migrated")
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'STATS_KEY_LAYOUT', None) != STATS_LAYOUT_HASH:
+            raise CommandError("Set STATS_KEY_LAYOUT=hash (and restart the app servers) before migrating")
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        articles = self.migrate('article:*:total_reads', COUNTER_KEY_RE, batch_size, dry_run, self.migrate_counters)
+        articles += self.migrate('article:*:user_count', COUNTER_KEY_RE, batch_size, dry_run, self.migrate_counters)
+        user_keys = self.migrate('article:*:user:*', USER_KEY_RE, batch_size, dry_run, self.migrate_user_reads)
+
+        if dry_run:
+            self.stdout.write(f"Found {articles} counter keys and {user_keys} per-user read keys to migrate")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Migrated counters of {articles} articles and {user_keys} per-user read counters"))
+
+    def migrate(self, pattern, key_re, batch_size, dry_run, migrate_batch):
+        """SCAN 匹配 pattern 的旧键，每 batch_size 个键迁移一次，返回迁移数量"""
+        prefix = cache.make_key('')
+        redis_conn = get_redis_connection()
+        total = 0
+        batch = []
+        for key in redis_conn.scan_iter(match=f"{prefix}{pattern}", count=batch_size):
+            match = key_re.match(key.decode()[len(prefix):])
+            if match:
+                batch.append(match.groups())
+            if len(batch) >= batch_size:
+                total += len(batch) if dry_run else migrate_batch(batch)
+                batch = []
+                self.stdout.write(f"{pattern}: {total}")
+        if batch:
+            total += len(batch) if dry_run else migrate_batch(batch)
+        return total
+
+    def migrate_counters(self, batch):
+        return StatsCacheService.migrate_counters([int(article_id) for article_id, in batch])
+
+    def migrate_user_reads(self, batch):
+        user_ids_by_article = {}
+        for article_id, user_id in batch:
+            user_ids_by_article.setdefault(int(article_id), []).append(user_id)
+        return StatsCacheService.migrate_user_reads(user_ids_by_article)
@@ -0,0 +1,45 @@
+# blog_stats/management/commands/reconcile_stats.py
+"""对账Redis与数据库中的文章计数及用户阅读次数
+
+用 SCAN 分批遍历缓存中的计数，与数据库逐批比较，双方都校正为较大值。每批完成后保存检查点，
+中断后再次执行从检查点继续（--restart 从头开始）；--rate 限制每秒扫描的键数，避免影响线上流量。
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog_stats.tasks import reconcile_stats_keyspace
+
+
+class Command(BaseCommand):
+    help = "Reconcile cached article counters and per-user read counts with the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.STATS_RECONCILE_BATCH_SIZE,
+                            help="Keys per SCAN batch")
+        parser.add_argument('--rate', type=int, default=settings.STATS_RECONCILE_MAX_KEYS_PER_SECOND,
+                            help="Maximum keys scanned per second (0 for unlimited)")
+        parser.add_argument('--max-seconds', type=float, default=0,
+                            help="Stop after this many seconds and keep the checkpoint (0 for no limit)")
+        parser.add_argument('--restart', action='store_true', help="Ignore the saved checkpoint and start over")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the differences")
+
+    def handle(self, *args, **options):
+        report = reconcile_stats_keyspace(
+            batch_size=options['batch_size'],
+            max_keys_per_second=options['rate'],
+            max_seconds=options['max_seconds'],
+            restart=options['restart'],
+            dry_run=options['dry_run'],
+        )
+        if report['resumed']:
+            self.stdout.write("Resumed from the saved checkpoint")
+        self.stdout.write(
+            f"Scanned {report['keys']} keys: {report['articles']} articles, {report['user_reads']} per-user read counts")
+        verb = "Would correct" if options['dry_run'] else "Corrected"
+        summary = (f"{verb} {report['db_articles']} article rows and {report['db_user_reads']} user read rows "
+                   f"in the database, {report['cache_articles']} articles and {report['cache_user_reads']} "
+                   f"per-user read counts in the cache")
+        if report['complete']:
+            self.stdout.write(self.style.SUCCESS(summary))
+        else:
+            self.stdout.write(self.style.WARNING(f"{summary}; stopped at cursor {report['cursor']}, run again to resume"))
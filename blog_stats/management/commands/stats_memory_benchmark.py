@@ -0,0 +1,88 @@
+# blog_stats/management/commands/stats_memory_benchmark.py
+"""比较 keys 与 hash 两种计数键布局的Redis内存占用
+
+按两种布局分别写入同样规模的合成数据（N篇文章，每篇M个读者），统计键数量、INFO 中 used_memory 的增量
+以及单篇文章各键的 MEMORY USAGE，结束后删除合成数据。合成键使用独立前缀，不影响线上计数。
+"""
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from blog_stats.redis_client import get_redis_connection, pipeline
+
+BENCHMARK_PREFIX = "stats:benchmark"
+
+
+class Command(BaseCommand):
+    help = "Compare Redis memory usage of the per-key and per-article hash counter layouts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=1000)
+        parser.add_argument('--users', type=int, default=50, help="Readers per article")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Commands per pipeline")
+
+    def handle(self, *args, **options):
+        redis_conn = get_redis_connection()
+        results = {}
+        for layout in ('keys', 'hash'):
+            prefix = cache.make_key(f"{BENCHMARK_PREFIX}:{layout}")
+            self.cleanup(redis_conn, prefix)
+            before = redis_conn.info('memory')['used_memory']
+            keys = self.populate(layout, prefix, options['articles'], options['users'], options['batch_size'])
+            used = redis_conn.info('memory')['used_memory'] - before
+            sample = sum(redis_conn.memory_usage(key) or 0
+                         for key in self.article_keys(layout, prefix, 0, options['users']))
+            results[layout] = (keys, used, sample)
+            self.cleanup(redis_conn, prefix)
+
+        self.stdout.write(f"{'layout':<8}{'keys':>12}{'used_memory':>16}{'per article':>14}")
+        for layout, (keys, used, sample) in results.items():
+            self.stdout.write(f"{layout:<8}{keys:>12}{used:>16}{sample:>14}")
+        keys_used, hash_used = results['keys'][1], results['hash'][1]
+        if keys_used > 0:
+            self.stdout.write(self.style.SUCCESS(f"hash layout uses {hash_used / keys_used:.1%} of keys layout memory"))
+
+    def article_keys(self, layout, prefix, article_id, users):
+        if layout == 'hash':
+            return [f"{prefix}:article:{article_id}:counters", f"{prefix}:article:{article_id}:user_reads"]
+        return [
+            f"{prefix}:article:{article_id}:total_reads",
+            f"{prefix}:article:{article_id}:user_count",
+            *[f"{prefix}:article:{article_id}:user:user{user}" for user in range(users)],
+        ]
+
+    def populate(self, layout, prefix, articles, users, batch_size):
+        """写入合成数据，返回写入的键数量"""
+        keys = 0
+        # 每篇文章最多写入 users + 2 个键
+        articles_per_batch = max(batch_size // (users + 2), 1)
+        for start in range(0, articles, articles_per_batch):
+            with pipeline() as pipe:
+                for article_id in range(start, min(start + articles_per_batch, articles)):
+                    user_reads = {f"user{user}": user % 7 + 1 for user in range(users)}
+                    total_reads = sum(user_reads.values())
+                    if layout == 'hash':
+                        counters_key, user_reads_key = self.article_keys(layout, prefix, article_id, users)
+                        pipe.hset(counters_key, mapping={'total_reads': total_reads, 'user_count': users})
+                        pipe.expire(counters_key, 3600)
+                        pipe.hset(user_reads_key, mapping=user_reads)
+                        pipe.expire(user_reads_key, 3600)
+                        keys += 2
+                    else:
+                        total_reads_key, user_count_key, *user_keys = self.article_keys(
+                            layout, prefix, article_id, users)
+                        pipe.set(total_reads_key, total_reads, ex=3600)
+                        pipe.set(user_count_key, users, ex=3600)
+                        for user_key, reads in zip(user_keys, user_reads.values()):
+                            pipe.set(user_key, reads, ex=3600)
+                        keys += 2 + users
+        return keys
+
+    def cleanup(self, redis_conn, prefix):
+        batch = []
+        for key in redis_conn.scan_iter(match=f"{prefix}:*", count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                redis_conn.delete(*batch)
+                batch = []
+        if batch:
+            redis_conn.delete(*batch)
@@ -0,0 +1,38 @@
+# blog_stats/management/commands/stats_spool.py
+"""查看或手动重放本地阅读事件暂存（STATS_SPOOL_DIR）
+
+默认列出各分段的大小与已重放偏移；--replay 立即重放（包括已退出进程遗留的分段），
+--to-db 跳过Redis直接写入数据库，适用于Redis长时间不可用的情况。
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_stats.services import StatsCacheService
+from blog_stats.spool import ReadSpool
+
+
+class Command(BaseCommand):
+    help = "Inspect or replay the local spool of read events written during cache outages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=settings.STATS_SPOOL_DIR, help="Spool directory")
+        parser.add_argument('--replay', action='store_true', help="Replay all replayable segments now")
+        parser.add_argument('--to-db', action='store_true', help="Replay into the database instead of Redis")
+        parser.add_argument('--batch-size', type=int, default=settings.STATS_SPOOL_REPLAY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        spool = ReadSpool(options['dir'])
+        segments = spool.segments()
+        for name, size, offset in segments:
+            self.stdout.write(f"{name}  {size} bytes  replayed to {offset}")
+        self.stdout.write(f"{len(segments)} segments, {spool.size} bytes pending")
+
+        if not options['replay']:
+            return
+        apply = StatsCacheService.increment_reads_db_bulk if options['to_db'] else StatsCacheService.increment_reads_bulk
+        try:
+            replayed = spool.replay(apply, options['batch_size'])
+        except Exception as e:
+            raise CommandError(f"Replay stopped, completed batches are recorded in the offsets: {str(e)}")
+        target = 'database' if options['to_db'] else 'Redis'
+        self.stdout.write(self.style.SUCCESS(f"Replayed {replayed} reads into {target}"))
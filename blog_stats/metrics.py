@@ -0,0 +1,233 @@
+# blog_stats/metrics.py
+"""进程内指标：计数器与延迟直方图在内存中聚合，通过 /metrics 以Prometheus文本格式导出"""
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape_label_value(value):
+    """按Prometheus文本格式转义标签值中的反斜杠、双引号和换行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in labels)
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """单调递增计数器"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def total(self, **labels):
+        """汇总所有包含指定标签的取值"""
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(value for key, value in self._values.items() if wanted <= set(key))
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge:
+    """可增可减的瞬时值；也可注册取值函数，在导出时采样"""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def set_function(self, function, **labels):
+        """导出时调用 function() 取值（如队列长度）"""
+        with self._lock:
+            self._functions[tuple(sorted(labels.items()))] = function
+
+    def value(self, **labels):
+        key = tuple(sorted(labels.items()))
+        function = self._functions.get(key)
+        return function() if function is not None else self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            functions = dict(self._functions)
+        values.update({key: function() for key, function in functions.items()})
+        return [(self.name, key, value) for key, value in sorted(values.items())]
+
+    def reset(self):
+        # 取值函数由长期存在的对象注册，重置时保留
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """累积分桶直方图"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, upper in enumerate(self.buckets):
+                if value <= upper:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """记录代码块耗时（秒）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        entry = self._values.get(tuple(sorted(labels.items())))
+        return entry[2] if entry else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for upper, bucket_count in zip(self.buckets, counts):
+                    samples.append((f'{self.name}_bucket', key + (('le', repr(upper)),), bucket_count))
+                samples.append((f'{self.name}_bucket', key + (('le', '+Inf'),), count))
+                samples.append((f'{self.name}_sum', key, total))
+                samples.append((f'{self.name}_count', key, count))
+        return samples
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """以Prometheus文本格式导出全部指标"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        for metric in self._metrics:
+            metric.reset()
+
+
+registry = Registry()
+
+CACHE_REQUESTS = registry.register(Counter(
+    'blog_stats_cache_requests_total', 'Stats cache lookups by view and result (hit/miss).'))
+INCREMENT_READ_SECONDS = registry.register(Histogram(
+    'blog_stats_increment_read_seconds', 'Latency of StatsCacheService.increment_read by counting mode.'))
+VIEW_SECONDS = registry.register(Histogram(
+    'blog_stats_view_seconds', 'Latency of stats views by view name.'))
+DB_FALLBACKS = registry.register(Counter(
+    'blog_stats_db_fallbacks_total', 'Writes that fell back to the database because the cache was unavailable.'))
+TASK_SECONDS = registry.register(Histogram(
+    'blog_stats_task_seconds', 'Duration of Celery flush and maintenance tasks.', buckets=DEFAULT_BUCKETS + (30.0, 60.0)))
+TASK_ROWS = registry.register(Counter(
+    'blog_stats_task_rows_total', 'Rows written by Celery flush and maintenance tasks by table.'))
+
+L1_CACHE_REQUESTS = registry.register(Counter(
+    'blog_stats_l1_cache_requests_total', 'In-process L1 stats cache lookups by result (hit/miss).'))
+L1_CACHE_EVICTIONS = registry.register(Counter(
+    'blog_stats_l1_cache_evictions_total', 'In-process L1 stats cache evictions by reason (size/invalidation).'))
+
+STAMPEDE_REBUILDS = registry.register(Counter(
+    'blog_stats_stampede_rebuilds_total', 'Cache rebuild attempts under single-flight by kind and outcome (rebuilt/stale/waited/timeout/early_refresh).'))
+STAMPEDE_STORM_SIZE = registry.register(Histogram(
+    'blog_stats_stampede_storm_size', 'Concurrent misses per rebuild (lock holder plus waiters) by kind.',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)))
+STAMPEDE_LOCK_WAIT_SECONDS = registry.register(Histogram(
+    'blog_stats_stampede_lock_wait_seconds', 'Time spent waiting for another worker to rebuild a cache entry by kind.'))
+
+TRACK_QUEUE_DEPTH = registry.register(Gauge(
+    'blog_stats_track_queue_depth', 'Read events waiting in the background tracking queue by executor (thread/asyncio).'))
+TRACK_EVENTS_DROPPED = registry.register(Counter(
+    'blog_stats_track_events_dropped_total', 'Read events dropped because the background tracking queue was full.'))
+TRACK_DRAIN_SECONDS = registry.register(Histogram(
+    'blog_stats_track_drain_seconds', 'Time from enqueueing a read event to recording it by executor.'))
+
+REDIS_POOL_CONNECTIONS = registry.register(Gauge(
+    'blog_stats_redis_pool_connections', 'Shared Redis connection pool connections by state (in_use/idle/max).'))
+REDIS_BREAKER_STATE = registry.register(Gauge(
+    'blog_stats_redis_circuit_breaker_state', 'Redis circuit breaker state (0=closed, 1=half_open, 2=open).'))
+REDIS_BREAKER_TRANSITIONS = registry.register(Counter(
+    'blog_stats_redis_circuit_breaker_transitions_total', 'Redis circuit breaker state transitions by new state.'))
+REDIS_BREAKER_REJECTIONS = registry.register(Counter(
+    'blog_stats_redis_circuit_breaker_rejections_total', 'Redis calls rejected without being sent because the breaker was open.'))
+
+
+SPOOL_EVENTS = registry.register(Counter(
+    'blog_stats_spool_events_total', 'Read events written to the local spool during cache outages by result (spooled/overflow).'))
+SPOOL_BYTES = registry.register(Gauge(
+    'blog_stats_spool_bytes', 'Bytes of spooled read events waiting to be replayed.'))
+SPOOL_REPLAYED = registry.register(Counter(
+    'blog_stats_spool_replayed_total', 'Spooled read events replayed after the cache recovered.'))
+SPOOL_CORRUPT_RECORDS = registry.register(Counter(
+    'blog_stats_spool_corrupt_records_total', 'Spooled records skipped on replay because they were truncated or failed the checksum.'))
+RETENTION_EVICTIONS = registry.register(Counter(
+    'blog_stats_retention_evictions_total', 'Articles considered for memory-budget eviction by result (evicted/skipped_dirty).'))
+
+
+def cache_hit_rate(view=None):
+    """根据进程内计数器计算缓存命中率（百分比）"""
+    labels = {'view': view} if view else {}
+    hits = CACHE_REQUESTS.total(result='hit', **labels)
+    misses = CACHE_REQUESTS.total(result='miss', **labels)
+    total = hits + misses
+    if total == 0:
+        return 0.0
+    return (hits / total) * 100
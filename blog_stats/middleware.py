@@ -1,36 +1,102 @@
-# blog_stats/middleware.py
-from django.utils.deprecation import MiddlewareMixin
-from .services import StatsCacheService
-import re
-
-
-class TrackArticleReadMiddleware(MiddlewareMixin):
-    def __init__(self, get_response):
-        self.get_response = get_response
-        super().__init__(get_response)
-    def __call__(self, request):
-        response = self.get_response(request)
-
-        # 检查是否是文章页面且响应成功
-        if (response.status_code == 200 and
-                hasattr(request, 'resolver_match') and
-                request.resolver_match and
-                re.match(r'^/blog/article/\d+/', request.path)):
-            article_id = request.resolver_match.kwargs.get('article_id')
-            if article_id and not getattr(request, '_read_tracked', False):
-                user_id = self.get_user_id(request)
-                try:
-                    StatsCacheService.increment_read(article_id, user_id)
-                    request._read_tracked = True
-                except Exception as e:
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Failed to track read for article {article_id}: {str(e)}")
-
-        return response
-
-    def get_user_id(self, request):
-        """获取用户标识"""
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            return str(request.user.id)
-        return request.session.session_key or request.META.get('REMOTE_ADDR', 'anonymous')
+# blog_stats/middleware.py
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+from .async_services import AsyncStatsCacheService
+from .buffer import get_read_buffer
+from .dispatcher import get_async_dispatcher, get_background_dispatcher
+from .services import StatsCacheService
+from .tasks import enqueue_stats_update
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# 阅读计数派发方式：inline 在返回响应前同步计数；background 放入后台队列，响应不等待计数
+TRACK_DISPATCH_INLINE = 'inline'
+TRACK_DISPATCH_BACKGROUND = 'background'
+
+
+class TrackArticleReadMiddleware(MiddlewareMixin):
+    def __init__(self, get_response):
+        self.get_response = get_response
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        # ASGI 下 get_response 为协程函数
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+
+        article_id = self.get_article_id(request, response)
+        if article_id:
+            user_id = self.get_user_id(request)
+            try:
+                if self.is_background():
+                    tracked = get_background_dispatcher().submit(self.record_read, article_id, user_id)
+                else:
+                    self.record_read(article_id, user_id)
+                    tracked = True
+                if tracked:
+                    request._read_tracked = True
+            except Exception as e:
+                logger.error(f"Failed to track read for article {article_id}: {str(e)}")
+
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+
+        article_id = self.get_article_id(request, response)
+        if article_id:
+            user_id = await sync_to_async(self.get_user_id)(request)
+            try:
+                if self.is_background():
+                    tracked = get_async_dispatcher().submit(self.arecord_read, article_id, user_id)
+                else:
+                    await self.arecord_read(article_id, user_id)
+                    tracked = True
+                if tracked:
+                    request._read_tracked = True
+            except Exception as e:
+                logger.error(f"Failed to track read for article {article_id}: {str(e)}")
+
+        return response
+
+    def get_article_id(self, request, response):
+        """文章页面且响应成功、尚未计数时返回文章ID"""
+        # 检查是否是文章页面且响应成功
+        if (response.status_code == 200 and
+                hasattr(request, 'resolver_match') and
+                request.resolver_match and
+                re.match(r'^/blog/article/\d+/', request.path)):
+            article_id = request.resolver_match.kwargs.get('article_id')
+            if article_id and not getattr(request, '_read_tracked', False):
+                return article_id
+        return None
+
+    def is_background(self):
+        return getattr(settings, 'STATS_TRACK_DISPATCH', TRACK_DISPATCH_INLINE) == TRACK_DISPATCH_BACKGROUND
+
+    def record_read(self, article_id, user_id):
+        """记录一次阅读：启用合并缓冲时写入缓冲区，否则直接计数；随后加入落库任务的合并窗口"""
+        if getattr(settings, 'STATS_READ_BUFFER_ENABLED', False):
+            get_read_buffer().add(article_id, user_id)
+        else:
+            StatsCacheService.increment_read(article_id, user_id)
+        enqueue_stats_update(article_id, user_id)
+
+    async def arecord_read(self, article_id, user_id):
+        """record_read 的异步版本"""
+        if getattr(settings, 'STATS_READ_BUFFER_ENABLED', False):
+            await sync_to_async(get_read_buffer().add)(article_id, user_id)
+        else:
+            await AsyncStatsCacheService.increment_read(article_id, user_id)
+        if getattr(settings, 'STATS_TASK_BATCH_ENABLED', False):
+            await sync_to_async(enqueue_stats_update, thread_sensitive=False)(article_id, user_id)
+
+    def get_user_id(self, request):
+        """获取用户标识"""
+        if hasattr(request, 'user') and request.user.is_authenticated:
+            return str(request.user.id)
+        return request.session.session_key or request.META.get('REMOTE_ADDR', 'anonymous')
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_stats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('article_id', models.BigIntegerField(verbose_name='文章ID')),
+                ('granularity', models.CharField(choices=[('hour', '小时'), ('day', '天')], max_length=8, verbose_name='粒度')),
+                ('bucket_start', models.DateTimeField(verbose_name='时间桶起点')),
+                ('reads', models.PositiveIntegerField(default=0, verbose_name='阅读次数')),
+            ],
+            options={
+                'unique_together': {('article_id', 'granularity', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.9 on 2026-10-18 11:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_stats', '0002_readrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GlobalStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_reads', models.PositiveBigIntegerField(default=0, verbose_name='总阅读量')),
+                ('total_users', models.PositiveIntegerField(default=0, verbose_name='读者数量')),
+                ('active_users', models.PositiveIntegerField(default=0, verbose_name='有阅读记录的读者数量')),
+                ('last_updated', models.DateTimeField(default=django.utils.timezone.now, verbose_name='最后更新时间')),
+                ('last_reconciled', models.DateTimeField(blank=True, null=True, verbose_name='最后对账时间')),
+            ],
+        ),
+    ]
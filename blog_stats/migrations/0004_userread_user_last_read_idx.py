@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_stats', '0003_globalstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userread',
+            index=models.Index(fields=['user_id', 'last_read', 'article'], name='userread_user_last_read_idx'),
+        ),
+    ]
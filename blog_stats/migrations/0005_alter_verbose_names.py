@@ -0,0 +1,55 @@
+# Generated by Django 4.2.9 on 2026-10-18 12:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog_stats', '0004_userread_user_last_read_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='articlestats',
+            name='article_id',
+            field=models.BigIntegerField(primary_key=True, serialize=False, verbose_name='文章ID'),
+        ),
+        migrations.AlterField(
+            model_name='articlestats',
+            name='last_updated',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='最后更新时间'),
+        ),
+        migrations.AlterField(
+            model_name='articlestats',
+            name='total_reads',
+            field=models.PositiveIntegerField(default=0, verbose_name='总阅读量'),
+        ),
+        migrations.AlterField(
+            model_name='articlestats',
+            name='user_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='用户数量'),
+        ),
+        migrations.AlterField(
+            model_name='userread',
+            name='article',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='blog_stats.articlestats', verbose_name='所属文章'),
+        ),
+        migrations.AlterField(
+            model_name='userread',
+            name='last_read',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='最后阅读时间'),
+        ),
+        migrations.AlterField(
+            model_name='userread',
+            name='read_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='阅读次数'),
+        ),
+        migrations.AlterField(
+            model_name='userread',
+            name='user_id',
+            field=models.CharField(max_length=128, verbose_name='用户ID'),
+        ),
+    ]
@@ -1,44 +1,99 @@
-from django.db import models
-from django.utils import timezone
-
-
-class ArticleStats(models.Model):
-    article_id = models.BigIntegerField(
-        primary_key=True,
-        verbose_name="文章ID"
-    )
-    total_reads = models.PositiveIntegerField(
-        default=0,
-        verbose_name="总阅读量"
-    )
-    user_count = models.PositiveIntegerField(
-        default=0,
-        verbose_name="用户数量"
-    )
-    last_updated = models.DateTimeField(
-        default=timezone.now,
-        verbose_name="最后更新时间"
-    )
-
-
-class UserRead(models.Model):
-    article = models.ForeignKey(
-        ArticleStats,
-        on_delete=models.CASCADE,
-        verbose_name="所属文章"
-    )
-    user_id = models.CharField(
-        max_length=128,
-        verbose_name="用户ID"
-    )
-    read_count = models.PositiveIntegerField(
-        default=1,
-        verbose_name="阅读次数"
-    )
-    last_read = models.DateTimeField(
-        default=timezone.now,
-        verbose_name="最后阅读时间"
-    )
-
-    class Meta:
-        unique_together = ('article', 'user_id')
+from django.db import models
+from django.utils import timezone
+
+
+class ArticleStats(models.Model):
+    article_id = models.BigIntegerField(
+        primary_key=True,
+        verbose_name="文章ID"
+    )
+    total_reads = models.PositiveIntegerField(
+        default=0,
+        verbose_name="总阅读量"
+    )
+    user_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="用户数量"
+    )
+    last_updated = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="最后更新时间"
+    )
+
+
+class UserRead(models.Model):
+    article = models.ForeignKey(
+        ArticleStats,
+        on_delete=models.CASCADE,
+        verbose_name="所属文章"
+    )
+    user_id = models.CharField(
+        max_length=128,
+        verbose_name="用户ID"
+    )
+    read_count = models.PositiveIntegerField(
+        default=1,
+        verbose_name="阅读次数"
+    )
+    last_read = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="最后阅读时间"
+    )
+
+    class Meta:
+        unique_together = ('article', 'user_id')
+        indexes = [
+            # 用户阅读历史按 (last_read, article) 倒序做游标分页，article 保证同一时刻的记录顺序确定
+            models.Index(fields=['user_id', 'last_read', 'article'], name='userread_user_last_read_idx'),
+        ]
+
+
+class GlobalStats(models.Model):
+    """全站汇总计数（单行，主键固定为1）"""
+    total_reads = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name="总阅读量"
+    )
+    total_users = models.PositiveIntegerField(
+        default=0,
+        verbose_name="读者数量"
+    )
+    active_users = models.PositiveIntegerField(
+        default=0,
+        verbose_name="有阅读记录的读者数量"
+    )
+    last_updated = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="最后更新时间"
+    )
+    last_reconciled = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name="最后对账时间"
+    )
+
+
+class ReadRollup(models.Model):
+    GRANULARITY_CHOICES = (
+        ('hour', '小时'),
+        ('day', '天'),
+    )
+
+    article_id = models.BigIntegerField(
+        verbose_name="文章ID"
+    )
+    granularity = models.CharField(
+        max_length=8,
+        choices=GRANULARITY_CHOICES,
+        verbose_name="粒度"
+    )
+    bucket_start = models.DateTimeField(
+        verbose_name="时间桶起点"
+    )
+    reads = models.PositiveIntegerField(
+        default=0,
+        verbose_name="阅读次数"
+    )
+
+    class Meta:
+        unique_together = ('article_id', 'granularity', 'bucket_start')
@@ -0,0 +1,277 @@
+# blog_stats/redis_client.py
+"""进程内共享的Redis客户端
+
+所有Redis访问（django-redis 缓存、统计服务、视图）共用同一个连接池，连接设置了读写/建连超时、
+健康检查间隔和指数退避重试。熔断器在连续出现连接错误后快速失败（抛出 CircuitOpenError），
+调用方据此立即降级到数据库，而不是每个请求都等待超时。
+异步客户端（AsyncGuardedRedis）按事件循环使用各自的连接池，但与同步客户端共用同一个熔断器。
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import redis
+from django.conf import settings
+from django_redis.pool import ConnectionFactory as DjangoRedisConnectionFactory
+from redis import asyncio as redis_asyncio
+from redis.asyncio.client import Pipeline as AsyncPipeline
+from redis.backoff import ExponentialBackoff
+from redis.client import Pipeline
+from redis.exceptions import ConnectionError, TimeoutError
+from redis.retry import Retry
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(ConnectionError):
+    """熔断器处于打开状态，请求未发送到Redis"""
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开；reset_timeout 秒后半开，放行一个探测请求，成功则关闭"""
+
+    CLOSED = 'closed'
+    HALF_OPEN = 'half_open'
+    OPEN = 'open'
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold=5, reset_timeout=5.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow_request(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def release_probe(self):
+        """探测请求未得出结论（调用被中断）时放弃本次探测，下一个请求重新探测"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state != self.OPEN:
+                    self._transition(self.OPEN)
+
+    def _transition(self, state):
+        logger.warning(f"Redis circuit breaker {self._state} -> {state}")
+        self._state = state
+        metrics.REDIS_BREAKER_TRANSITIONS.inc(state=state)
+
+
+def _admit():
+    """经熔断器放行一次Redis调用，返回熔断器；打开时抛出 CircuitOpenError"""
+    breaker = get_circuit_breaker()
+    if not breaker.allow_request():
+        metrics.REDIS_BREAKER_REJECTIONS.inc()
+        raise CircuitOpenError("Redis circuit breaker is open")
+    return breaker
+
+
+def _record_error(breaker, error):
+    """仅连接/超时错误计为失败；其他错误（如 NoScriptError、ResponseError）说明Redis已响应，
+    同样结束半开探测；调用被中断（BaseException）时只放弃本次探测"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        breaker.record_failure()
+    elif isinstance(error, Exception):
+        breaker.record_success()
+    else:
+        breaker.release_probe()
+
+
+def _guarded(func, *args, **kwargs):
+    """经熔断器执行一次Redis调用"""
+    breaker = _admit()
+    try:
+        result = func(*args, **kwargs)
+    except BaseException as e:
+        _record_error(breaker, e)
+        raise
+    breaker.record_success()
+    return result
+
+
+async def _guarded_async(func, *args, **kwargs):
+    """_guarded 的异步版本，与同步客户端共用同一个熔断器"""
+    breaker = _admit()
+    try:
+        result = await func(*args, **kwargs)
+    except BaseException as e:
+        _record_error(breaker, e)
+        raise
+    breaker.record_success()
+    return result
+
+
+class GuardedPipeline(Pipeline):
+    def execute(self, raise_on_error=True):
+        return _guarded(super().execute, raise_on_error)
+
+
+class GuardedRedis(redis.Redis):
+    """受熔断器保护的客户端（也用作 django-redis 的 REDIS_CLIENT_CLASS）"""
+
+    def execute_command(self, *args, **options):
+        return _guarded(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class AsyncGuardedPipeline(AsyncPipeline):
+    async def execute(self, raise_on_error=True):
+        return await _guarded_async(super().execute, raise_on_error)
+
+
+class AsyncGuardedRedis(redis_asyncio.Redis):
+    """受熔断器保护的 redis.asyncio 客户端（异步服务与视图使用）"""
+
+    async def execute_command(self, *args, **options):
+        return await _guarded_async(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return AsyncGuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class ConnectionFactory(DjangoRedisConnectionFactory):
+    """让 django-redis 缓存使用共享连接池（DJANGO_REDIS_CONNECTION_FACTORY）"""
+
+    def get_connection_pool(self, params):
+        if params.get('url') == settings.CACHES['default']['LOCATION']:
+            return get_connection_pool()
+        return super().get_connection_pool(params)
+
+
+_pool = None
+_pubsub_pool = None
+_breaker = None
+_lock = threading.Lock()
+
+
+def connection_kwargs():
+    """连接参数：CACHES['default'] 中的连接池参数加上超时和健康检查设置"""
+    options = settings.CACHES['default'].get('OPTIONS', {})
+    kwargs = dict(options.get('CONNECTION_POOL_KWARGS', {}))
+    if options.get('PASSWORD'):
+        kwargs.setdefault('password', options['PASSWORD'])
+    kwargs.update(
+        socket_timeout=settings.STATS_REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.STATS_REDIS_CONNECT_TIMEOUT,
+        health_check_interval=settings.STATS_REDIS_HEALTH_CHECK_INTERVAL,
+    )
+    return kwargs
+
+
+def get_connection_pool():
+    """获取进程内共享的连接池"""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                retry = Retry(
+                    ExponentialBackoff(cap=settings.STATS_REDIS_RETRY_BACKOFF_CAP,
+                                       base=settings.STATS_REDIS_RETRY_BACKOFF_BASE),
+                    settings.STATS_REDIS_RETRIES,
+                )
+                _pool = redis.ConnectionPool.from_url(
+                    settings.CACHES['default']['LOCATION'],
+                    retry=retry,
+                    retry_on_error=[ConnectionError, TimeoutError],
+                    **connection_kwargs()
+                )
+                metrics.REDIS_POOL_CONNECTIONS.set_function(
+                    lambda: len(_pool._in_use_connections), state='in_use')
+                metrics.REDIS_POOL_CONNECTIONS.set_function(
+                    lambda: len(_pool._available_connections), state='idle')
+                metrics.REDIS_POOL_CONNECTIONS.set_function(lambda: _pool.max_connections, state='max')
+    return _pool
+
+
+def get_circuit_breaker():
+    global _breaker
+    if _breaker is None:
+        with _lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    failure_threshold=settings.STATS_REDIS_BREAKER_FAILURES,
+                    reset_timeout=settings.STATS_REDIS_BREAKER_RESET_TIMEOUT,
+                )
+                metrics.REDIS_BREAKER_STATE.set_function(lambda: CircuitBreaker.STATE_VALUES[_breaker.state])
+    return _breaker
+
+
+def get_redis_connection(alias="default"):
+    """获取共享连接池上的Redis客户端（alias 参数与 django_redis 保持兼容，仅支持 default）"""
+    return GuardedRedis(connection_pool=get_connection_pool())
+
+
+def get_pubsub_connection():
+    """发布/订阅专用客户端：订阅连接长期阻塞读取，不设置读超时，也不占用共享连接池"""
+    global _pubsub_pool
+    if _pubsub_pool is None:
+        with _lock:
+            if _pubsub_pool is None:
+                kwargs = connection_kwargs()
+                kwargs['socket_timeout'] = None
+                _pubsub_pool = redis.ConnectionPool.from_url(settings.CACHES['default']['LOCATION'], **kwargs)
+    return redis.Redis(connection_pool=_pubsub_pool)
+
+
+@contextmanager
+def pipeline(transaction=False):
+    """管道辅助：with 块内排队的命令在正常退出时一次执行，结果保存在 pipe.results
+
+        with pipeline() as pipe:
+            pipe.incr(key)
+            pipe.expire(key, 60)
+        count, _ = pipe.results
+    """
+    pipe = get_redis_connection().pipeline(transaction=transaction)
+    try:
+        yield pipe
+        pipe.results = pipe.execute()
+    finally:
+        pipe.reset()
+
+
+def get_status():
+    """连接池占用与熔断器状态"""
+    pool = get_connection_pool()
+    return {
+        'pool': {
+            'in_use': len(pool._in_use_connections),
+            'idle': len(pool._available_connections),
+            'max': pool.max_connections,
+        },
+        'circuit_breaker': get_circuit_breaker().state,
+    }
@@ -1,130 +1,1764 @@
-# blog_stats/services.py
-from django.core.cache import cache
-# from django_redis import get_redis_connection
-import logging
-
-logger = logging.getLogger(__name__)
-
-
-class StatsCacheService:
-    @staticmethod
-    def increment_read(article_id, user_id):
-        """增加文章阅读次数"""
-        try:
-            # 使用Django cache接口而不是直接操作Redis
-            # 增加总阅读量
-            total_reads_key = f"article:{article_id}:total_reads"
-            total_reads = cache.get(total_reads_key)
-            if total_reads is None:
-                total_reads = 0
-            cache.set(total_reads_key, total_reads + 1, timeout=3600)
-
-            # 记录用户阅读
-            user_key = f"article:{article_id}:user:{user_id}"
-            user_read_count = cache.get(user_key)
-            user_existed = user_read_count is not None
-
-            if user_read_count is None:
-                user_read_count = 0
-            cache.set(user_key, user_read_count + 1, timeout=3600)
-
-            # 如果是新用户，增加用户数
-            user_count_key = f"article:{article_id}:user_count"
-            user_count = cache.get(user_count_key)
-            if user_count is None:
-                user_count = 0
-
-            if not user_existed:
-                cache.set(user_count_key, user_count + 1, timeout=3600)
-
-        except Exception as e:
-            logger.error(f"Cache unavailable, using DB fallback: {str(e)}")
-            # 降级到数据库处理
-            from .models import ArticleStats, UserRead
-
-            article_stats, _ = ArticleStats.objects.get_or_create(
-                article_id=article_id,
-                defaults={'total_reads': 0, 'user_count': 0}
-            )
-
-            article_stats.total_reads += 1
-
-            # 检查是否为新用户
-            user_read, created = UserRead.objects.get_or_create(
-                article_id=article_id,
-                user_id=user_id,
-                defaults={'read_count': 0}
-            )
-
-            if created:
-                article_stats.user_count += 1
-
-            user_read.read_count += 1
-            user_read.save()
-            article_stats.save()
-
-    @staticmethod
-    def get_total_reads(article_id):
-        """获取文章总阅读量"""
-        key = f"article:{article_id}:total_reads"
-        value = cache.get(key)
-        return int(value) if value is not None else None
-
-    @staticmethod
-    def get_user_count(article_id):
-        """获取文章用户数"""
-        key = f"article:{article_id}:user_count"
-        value = cache.get(key)
-        return int(value) if value is not None else None
-
-    @staticmethod
-    def cache_stats(article_id, total_reads, user_count):
-        """缓存文章统计数据"""
-        cache.set(f"article:{article_id}:total_reads", total_reads, timeout=3600)
-        cache.set(f"article:{article_id}:user_count", user_count, timeout=3600)
-
-    @staticmethod
-    def get_cache_hit_rate():
-        """获取缓存命中率"""
-        try:
-            hits = cache.get("cache:hits") or 0
-            misses = cache.get("cache:misses") or 0
-            hits = int(hits)
-            misses = int(misses)
-            total = hits + misses
-            if total == 0:
-                return 0.0
-            return (hits / total) * 100
-        except Exception:
-            return 0.0
-
-    @staticmethod
-    def get_total_reads_all_articles():
-        """获取所有文章总阅读量"""
-        key = "total_reads_all_articles"
-        value = cache.get(key)
-        return int(value) if value is not None else None
-
-    @staticmethod
-    def cache_total_reads_all_articles(total_reads):
-        """缓存所有文章总阅读量"""
-        cache.set("total_reads_all_articles", total_reads, timeout=3600)
-
-    @staticmethod
-    def get_top_articles():
-        """获取热门文章"""
-        from .models import ArticleStats
-        try:
-            # 获取阅读量大于0的文章，按阅读量排序，取前10篇
-            top_articles = ArticleStats.objects.filter(total_reads__gt=0).order_by('-total_reads')[:10]
-            return list(top_articles)
-        except Exception:
-            return []
-
-    @staticmethod
-    def get_user_read_count(article_id, user_id):
-        """获取特定用户对文章的阅读次数"""
-        key = f"article:{article_id}:user:{user_id}"
-        value = cache.get(key)
-        return int(value) if value is not None else None
-
+# blog_stats/services.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+import math
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+import logging
+
+from . import local_cache, metrics
+from .redis_client import get_redis_connection, pipeline
+
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_TIMEOUT = 3600
+
+# 用户数统计模式：exact 为逐用户精确计数，approximate 为基于HyperLogLog的近似计数
+USER_COUNT_MODE_EXACT = 'exact'
+USER_COUNT_MODE_APPROXIMATE = 'approximate'
+
+# 待落库（脏）文章集合及每篇文章尚未落库的增量哈希，落库前不设置过期时间。
+# 增量哈希的字段：total_reads、user_count（缓存判定的新用户数）及每个用户的 user:{user_id}。
+# 落库时先将增量转入 flushing 哈希，数据库事务提交后再删除；落库失败时 flushing 保留，下次落库时合并。
+# 数据库只按增量累加（F() 表达式），计数键过期后从0重新计数也不会把数据库中的计数改小。
+DIRTY_ARTICLES_KEY = "stats:dirty_articles"
+PENDING_KEY = "article:{article_id}:pending"
+FLUSHING_KEY = "article:{article_id}:flushing"
+PENDING_USER_PREFIX = 'user:'
+
+# 热门文章排行榜：全量榜与读数同步，小时榜/日榜按时间分桶并自动过期
+LEADERBOARD_KEY = "stats:top:{window}"
+LEADERBOARD_WINDOWS = ('hour', 'day', '24h', 'all')
+
+# 阅读时间序列：每篇文章每小时一个哈希（字段为分钟），并记录每小时有阅读的文章供汇总任务使用
+SERIES_MINUTE_KEY = "article:{article_id}:series:{hour}"
+SERIES_ACTIVE_KEY = "stats:series:active:{hour}"
+SERIES_STEPS = ('minute', 'hour', 'day')
+
+# 全站计数：总阅读量、去重读者数、有阅读记录的读者数，以及全站读者集合（精确模式为SET，近似模式为HyperLogLog）
+GLOBAL_STATS_KEY = "stats:global:{name}"
+GLOBAL_STATS_FIELDS = ('total_reads', 'total_users', 'active_users')
+
+# 文章计数键布局：keys 为每个计数、每个用户阅读次数各一个键；hash 为每篇文章一个计数哈希（字段为
+# total_reads、user_count）和一个 user_id -> 阅读次数的哈希，小哈希以 listpack 编码存储，内存和键数量更少
+STATS_LAYOUT_KEYS = 'keys'
+STATS_LAYOUT_HASH = 'hash'
+ARTICLE_COUNTERS_KEY = "article:{article_id}:counters"
+USER_READS_KEY = "article:{article_id}:user_reads"
+COUNTER_FIELDS = ('total_reads', 'user_count')
+
+# 用户阅读历史：每个用户一个有序集合（成员为文章ID，分数为最近阅读时间的微秒时间戳），只保留最近
+# STATS_USER_HISTORY_SIZE 篇。complete 标记表示集合已与数据库合并、可以直接作为完整的最近历史返回；
+# 集合过期或被淘汰后由新的阅读重新创建时删除该标记，下次查询先从数据库回填。
+USER_HISTORY_KEY = "user:{user_id}:history"
+USER_HISTORY_COMPLETE_KEY = "user:{user_id}:history:complete"
+
+# 记录一次阅读到用户阅读历史，size 为 0 时不记录
+RECORD_HISTORY_LUA = """
+local function record_history(history_key, complete_key, article_id, read_time, size, ttl)
+    size = tonumber(size)
+    if size <= 0 then
+        return
+    end
+    if redis.call('EXISTS', history_key) == 0 then
+        redis.call('DEL', complete_key)
+    end
+    redis.call('ZADD', history_key, read_time, article_id)
+    redis.call('ZREMRANGEBYRANK', history_key, 0, -size - 1)
+    redis.call('EXPIRE', history_key, ttl)
+    redis.call('EXPIRE', complete_key, ttl)
+end
+"""
+
+# KEYS: history, complete  ARGV: article_id, read_time, size, ttl
+RECORD_HISTORY_SCRIPT = RECORD_HISTORY_LUA + """
+record_history(KEYS[1], KEYS[2], ARGV[1], ARGV[2], ARGV[3], ARGV[4])
+"""
+
+# 用数据库中的最近阅读记录回填用户阅读历史（同一文章保留较新的时间），设置 complete 标记，返回合并后的历史
+# KEYS: history, complete  ARGV: size, ttl, read_time_1, article_id_1, ...
+BACKFILL_HISTORY_SCRIPT = """
+for i = 3, #ARGV, 2 do
+    local current = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[i + 1]))
+    if not current or current < tonumber(ARGV[i]) then
+        redis.call('ZADD', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+end
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[1]) - 1)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('SET', KEYS[2], 1, 'EX', ARGV[2])
+return redis.call('ZREVRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+"""
+
+# 两种计数模式共用的脚本片段：更新总阅读量和用户数，标记待落库，更新排行榜、分钟时间序列和全站计数
+# KEYS: total_reads, user_count, dirty_articles, top_all, top_hour, top_day, series_minute, series_active,
+#       global_total_reads, global_total_users, global_active_users, global_readers,
+#       legacy_total_reads, legacy_user_count, access_index, user_history, user_history_complete, pending, ...
+# ARGV: timeout, count, article_id, user_id, hour_ttl, day_ttl, minute, series_ttl,
+#       total_reads_field, user_count_field, access_time, read_time, history_size, history_ttl, ...
+# 字段参数为空串时计数为独立的键（keys 布局）；否则为计数哈希中的字段（hash 布局），
+# 此时若旧布局的计数键仍存在，先合并到哈希再删除，迁移期间计数不会丢失或重复。
+# timeout 为0时（启用保留策略）计数键在落库前不过期，access_time 非空时记录文章的最近访问时间
+RECORD_READ_LUA = RECORD_HISTORY_LUA + """
+local count = tonumber(ARGV[2])
+local function retain(key)
+    if ARGV[1] == '0' then
+        redis.call('PERSIST', key)
+    else
+        redis.call('EXPIRE', key, ARGV[1])
+    end
+end
+local function counter_incr(key, field, amount)
+    if field == '' then
+        return redis.call('INCRBY', key, amount)
+    end
+    return redis.call('HINCRBY', key, field, amount)
+end
+local function counter_get(key, field)
+    if field == '' then
+        return redis.call('GET', key)
+    end
+    return redis.call('HGET', key, field)
+end
+local function merge_legacy_counters()
+    if ARGV[9] == '' or redis.call('EXISTS', KEYS[13], KEYS[14]) == 0 then
+        return
+    end
+    redis.call('HINCRBY', KEYS[1], ARGV[9], tonumber(redis.call('GET', KEYS[13]) or '0') or 0)
+    redis.call('HINCRBY', KEYS[2], ARGV[10], tonumber(redis.call('GET', KEYS[14]) or '0') or 0)
+    redis.call('DEL', KEYS[13], KEYS[14])
+end
+local function record_read(is_new_user, is_new_reader)
+    merge_legacy_counters()
+    local total_reads = counter_incr(KEYS[1], ARGV[9], count)
+    local user_count
+    if is_new_user == 1 then
+        user_count = counter_incr(KEYS[2], ARGV[10], 1)
+    else
+        user_count = tonumber(counter_get(KEYS[2], ARGV[10]) or '0') or 0
+    end
+    retain(KEYS[1])
+    retain(KEYS[2])
+    redis.call('SADD', KEYS[3], ARGV[3])
+    redis.call('HINCRBY', KEYS[18], 'total_reads', count)
+    if is_new_user == 1 then
+        redis.call('HINCRBY', KEYS[18], 'user_count', 1)
+    end
+    if ARGV[11] ~= '' then
+        redis.call('ZADD', KEYS[15], ARGV[11], ARGV[3])
+    end
+    record_history(KEYS[16], KEYS[17], ARGV[3], ARGV[12], ARGV[13], ARGV[14])
+    redis.call('ZINCRBY', KEYS[4], count, ARGV[3])
+    redis.call('ZINCRBY', KEYS[5], count, ARGV[3])
+    redis.call('EXPIRE', KEYS[5], ARGV[5])
+    redis.call('ZINCRBY', KEYS[6], count, ARGV[3])
+    redis.call('EXPIRE', KEYS[6], ARGV[6])
+    redis.call('HINCRBY', KEYS[7], ARGV[7], count)
+    redis.call('EXPIRE', KEYS[7], ARGV[8])
+    redis.call('SADD', KEYS[8], ARGV[3])
+    redis.call('EXPIRE', KEYS[8], ARGV[8])
+    redis.call('INCRBY', KEYS[9], count)
+    if is_new_reader == 1 then
+        redis.call('INCR', KEYS[10])
+        redis.call('INCR', KEYS[11])
+    end
+    return total_reads, user_count
+end
+"""
+
+# 旧布局计数键迁移到计数哈希（累加后删除旧键），旧键均不存在时返回nil
+# KEYS: legacy_total_reads, legacy_user_count, counters  ARGV: timeout
+MIGRATE_COUNTERS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1], KEYS[2]) == 0 then
+    return nil
+end
+local total_reads = redis.call('HINCRBY', KEYS[3], 'total_reads', tonumber(redis.call('GET', KEYS[1]) or '0') or 0)
+local user_count = redis.call('HINCRBY', KEYS[3], 'user_count', tonumber(redis.call('GET', KEYS[2]) or '0') or 0)
+redis.call('DEL', KEYS[1], KEYS[2])
+redis.call('EXPIRE', KEYS[3], ARGV[1])
+return {total_reads, user_count}
+"""
+
+# 旧布局的用户阅读次数键迁移到文章的用户阅读次数哈希，返回迁移的键数
+# KEYS: user_reads, legacy_user_1, legacy_user_2, ...  ARGV: timeout, user_id_1, user_id_2, ...
+MIGRATE_USER_READS_SCRIPT = """
+local migrated = 0
+for i = 2, #KEYS do
+    local reads = tonumber(redis.call('GET', KEYS[i]) or '0') or 0
+    if reads > 0 then
+        redis.call('HINCRBY', KEYS[1], ARGV[i], reads)
+        migrated = migrated + 1
+    end
+    redis.call('DEL', KEYS[i])
+end
+if migrated > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return migrated
+"""
+
+# 键空间对账：SCAN 游标的检查点，以及从键名中识别文章计数、用户阅读次数（两种布局）的正则
+# （keys 布局的两个计数键过期时间相同，只按 total_reads 识别文章，避免同一文章被对账两次）
+RECONCILE_CHECKPOINT_KEY = "stats:reconcile:checkpoint"
+RECONCILE_SCAN_PATTERN = "article:*"
+COUNTER_KEY_RE = re.compile(r'^article:(\d+):(?:total_reads|counters)$')
+USER_READ_KEY_RE = re.compile(r'^article:(\d+):user:(.+)$')
+USER_READS_HASH_RE = re.compile(r'^article:(\d+):user_reads$')
+
+# 将计数提高到不低于给定的数据库值加上尚未落库的增量（键或字段不存在时不创建），返回增加的值；
+# 与并发计数原子执行，不会覆盖新增的阅读
+# KEYS: key, pending  ARGV: field（keys 布局为空串）, minimum, pending_field
+RAISE_COUNTER_SCRIPT = """
+local current
+if ARGV[1] == '' then
+    current = redis.call('GET', KEYS[1])
+else
+    current = redis.call('HGET', KEYS[1], ARGV[1])
+end
+current = tonumber(current)
+if not current then
+    return 0
+end
+local delta = tonumber(ARGV[2]) + (tonumber(redis.call('HGET', KEYS[2], ARGV[3])) or 0) - current
+if delta <= 0 then
+    return 0
+end
+if ARGV[1] == '' then
+    redis.call('INCRBY', KEYS[1], delta)
+else
+    redis.call('HINCRBY', KEYS[1], ARGV[1], delta)
+end
+return delta
+"""
+
+# 缓存预热：只写入缓存中不存在的计数，不覆盖重启后已开始累加的计数；hash 布局下旧布局计数键尚未迁移时跳过，
+# 避免迁移时重复累加。返回写入的计数个数
+# KEYS: total_reads, user_count, legacy_total_reads, legacy_user_count
+# ARGV: total_reads_field, user_count_field（keys 布局为空串）, total_reads, user_count, timeout
+WARM_COUNTERS_SCRIPT = """
+local loaded = 0
+if ARGV[1] == '' then
+    if redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[5], 'NX') then
+        loaded = loaded + 1
+    end
+    if redis.call('SET', KEYS[2], ARGV[4], 'EX', ARGV[5], 'NX') then
+        loaded = loaded + 1
+    end
+else
+    if redis.call('EXISTS', KEYS[3], KEYS[4]) > 0 then
+        return 0
+    end
+    loaded = redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[3]) + redis.call('HSETNX', KEYS[2], ARGV[2], ARGV[4])
+    if loaded > 0 then
+        redis.call('EXPIRE', KEYS[1], ARGV[5])
+    end
+end
+return loaded
+"""
+
+# 将文章的增量转入 flushing 哈希（与上次未完成落库的增量合并）并返回，增量哈希随之删除
+# KEYS: pending, flushing
+TAKE_PENDING_SCRIPT = """
+local values = redis.call('HGETALL', KEYS[1])
+for i = 1, #values, 2 do
+    redis.call('HINCRBY', KEYS[2], values[i], values[i + 1])
+end
+redis.call('DEL', KEYS[1])
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# 从增量中扣除已由其他途径写入数据库的阅读（结果可以为负，下次落库时抵消），字段为0时删除；
+# 仍有增量时标记文章待落库
+# KEYS: pending, dirty_articles  ARGV: article_id, field_1, amount_1, ...
+OFFSET_PENDING_SCRIPT = """
+for i = 2, #ARGV, 2 do
+    if redis.call('HINCRBY', KEYS[1], ARGV[i], -tonumber(ARGV[i + 1])) == 0 then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('SADD', KEYS[2], ARGV[1])
+end
+"""
+
+# 总榜按阅读增量累加，排行榜丢失或文章被淘汰后从0重新累加；用数据库中的总阅读量加上尚未落库的增量
+# 校正分数（只提高不降低，不覆盖并发累加的阅读）
+# KEYS: top_all, pending  ARGV: article_id, total_reads
+SEED_LEADERBOARD_SCRIPT = """
+local total = tonumber(ARGV[2]) + (tonumber(redis.call('HGET', KEYS[2], 'total_reads')) or 0)
+local current = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]))
+if not current or current < total then
+    redis.call('ZADD', KEYS[1], total, ARGV[1])
+end
+"""
+
+# 保留策略：按最近访问时间排序的文章索引（淘汰时从最早访问的文章开始）
+ACCESS_INDEX_KEY = "stats:retention:access"
+
+# 落库后解除固定：文章未再次变脏时，按当天阅读量设置TTL，阅读量每翻一倍TTL增加一个 min_ttl，不超过 max_ttl。
+# 返回设置的TTL，文章已再次变脏（保持固定）时返回-1
+# KEYS: dirty_articles, top_day, key_1, key_2, ...  ARGV: article_id, min_ttl, max_ttl
+RELEASE_FLUSHED_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1 then
+    return -1
+end
+local reads = tonumber(redis.call('ZSCORE', KEYS[2], ARGV[1]) or '0') or 0
+local ttl = tonumber(ARGV[2])
+while reads >= 1 do
+    reads = math.floor(reads / 2)
+    ttl = ttl + tonumber(ARGV[2])
+end
+ttl = math.min(ttl, tonumber(ARGV[3]))
+for i = 3, #KEYS do
+    redis.call('EXPIRE', KEYS[i], ttl)
+end
+return ttl
+"""
+
+# 淘汰一篇文章的缓存键；文章有尚未落库的计数时跳过并返回0
+# KEYS: dirty_articles, access_index, key_1, key_2, ...  ARGV: article_id
+EVICT_ARTICLE_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 1 then
+    return 0
+end
+redis.call('DEL', unpack(KEYS, 3))
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 1
+"""
+
+# 续期仍设置了过期时间的键（落库前固定的键不续期，以免解除固定），任一键不存在时返回0
+# KEYS: key_1, key_2, ...  ARGV: timeout
+EXTEND_TTL_SCRIPT = """
+for i = 1, #KEYS do
+    local ttl = redis.call('TTL', KEYS[i])
+    if ttl == -2 then
+        return 0
+    end
+    if ttl ~= -1 then
+        redis.call('EXPIRE', KEYS[i], ARGV[1])
+    end
+end
+return 1
+"""
+
+# 阅读次数直方图：按 floor(log2(阅读次数)) 分桶（1、2-3、4-7……），用户阅读次数跨越桶边界时增量更新
+READ_HISTOGRAM_KEY = "article:{article_id}:read_histogram"
+GLOBAL_READ_HISTOGRAM_KEY = "stats:global:read_histogram"
+
+# 统计回填元数据：记录回填时的计数、预计过期时间及重建耗时，用于过期后返回旧值和提前刷新
+STATS_META_KEY = "article:{article_id}:stats:meta"
+
+# 单飞重建锁及等待者计数（等待者数量即一次缓存击穿的并发规模）
+REBUILD_LOCK_KEY = "stats:lock:{name}"
+REBUILD_WAITERS_KEY = "stats:lock:{name}:waiters"
+
+# 仅释放自己持有的锁，同时取出并清除等待者计数
+RELEASE_LOCK_SCRIPT = """
+local waiters = tonumber(redis.call('GET', KEYS[2]) or '0')
+redis.call('DEL', KEYS[2])
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+return waiters
+"""
+
+# 原子阅读计数：一次往返完成总阅读量、用户阅读次数和用户数的更新
+# KEYS: ..., user（hash 布局为用户阅读次数哈希）, read_histogram, global_read_histogram, legacy_user
+# ARGV: ..., user_field（hash 布局为 user_id，keys 布局为空串）
+INCREMENT_READ_SCRIPT = RECORD_READ_LUA + """
+local function histogram_bucket(reads)
+    local bucket = 0
+    while reads >= 2 do
+        reads = math.floor(reads / 2)
+        bucket = bucket + 1
+    end
+    return bucket
+end
+
+local user_reads = counter_incr(KEYS[19], ARGV[15], count)
+if ARGV[15] ~= '' and user_reads == count then
+    -- hash 布局下首次写入该字段：合并旧布局的用户阅读次数键，该用户已计入用户数
+    local legacy_reads = tonumber(redis.call('GET', KEYS[22]) or '0') or 0
+    if legacy_reads > 0 then
+        user_reads = redis.call('HINCRBY', KEYS[19], ARGV[15], legacy_reads)
+        redis.call('DEL', KEYS[22])
+    end
+end
+retain(KEYS[19])
+redis.call('HINCRBY', KEYS[18], 'user:' .. ARGV[4], count)
+local is_new_user = 0
+if user_reads == count then
+    is_new_user = 1
+end
+local is_new_reader = redis.call('SADD', KEYS[12], ARGV[4])
+local old_reads = user_reads - count
+local new_bucket = histogram_bucket(user_reads)
+if old_reads <= 0 or histogram_bucket(old_reads) ~= new_bucket then
+    for i = 20, 21 do
+        if old_reads > 0 then
+            redis.call('HINCRBY', KEYS[i], histogram_bucket(old_reads), -1)
+        end
+        redis.call('HINCRBY', KEYS[i], new_bucket, 1)
+    end
+end
+local total_reads, user_count = record_read(is_new_user, is_new_reader)
+return {total_reads, user_reads, user_count, is_new_user}
+"""
+
+# 近似阅读计数：每篇文章一个HyperLogLog（约12KB），PFADD返回1时视为新用户
+# KEYS: ..., readers(HLL)
+INCREMENT_READ_APPROXIMATE_SCRIPT = RECORD_READ_LUA + """
+local is_new_user = redis.call('PFADD', KEYS[19], ARGV[4])
+retain(KEYS[19])
+local is_new_reader = redis.call('PFADD', KEYS[12], ARGV[4])
+local total_reads, user_count = record_read(is_new_user, is_new_reader)
+return {total_reads, user_count, is_new_user}
+"""
+
+_scripts = {}
+
+
+def _get_script(source):
+    """获取已注册的Lua脚本（按进程缓存）"""
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = get_redis_connection("default").register_script(source)
+    return script
+
+
+def _leaderboard_key(window, moment=None):
+    """排行榜键名，小时榜/日榜按 moment 所在的时间桶命名"""
+    moment = moment or timezone.now()
+    if window == 'hour':
+        window = f"hour:{moment:%Y%m%d%H}"
+    elif window == 'day':
+        window = f"day:{moment:%Y%m%d}"
+    elif window == '24h':
+        window = f"24h:{moment:%Y%m%d%H}"
+    return cache.make_key(LEADERBOARD_KEY.format(window=window))
+
+
+SERIES_STEP_DELTAS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+
+def floor_time(moment, step):
+    """将时间向下取整到 step 所在的时间桶起点"""
+    moment = moment.replace(second=0, microsecond=0)
+    if step in ('hour', 'day'):
+        moment = moment.replace(minute=0)
+    if step == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def history_score(moment):
+    """阅读时间在用户阅读历史中的分数：距1970-01-01的微秒数（整数运算，与数据库中的 last_read 精确对应）"""
+    if timezone.is_aware(moment):
+        moment = timezone.make_naive(moment, dt_timezone.utc)
+    delta = moment - datetime(1970, 1, 1)
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def history_time(score):
+    """history_score 的逆运算"""
+    moment = datetime(1970, 1, 1) + timedelta(microseconds=int(score))
+    if settings.USE_TZ:
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def histogram_bucket(reads):
+    """阅读次数所在的直方图桶序号：floor(log2(reads))"""
+    return max(int(reads), 1).bit_length() - 1
+
+
+def histogram_label(bucket):
+    """直方图桶的区间标签，如 1、2-3、4-7"""
+    lower, upper = 2 ** bucket, 2 ** (bucket + 1) - 1
+    return str(lower) if lower == upper else f"{lower}-{upper}"
+
+
+def _histogram_key(article_id=None):
+    """文章（article_id 为 None 时为全站）阅读次数直方图键名"""
+    if article_id is None:
+        return cache.make_key(GLOBAL_READ_HISTOGRAM_KEY)
+    return cache.make_key(READ_HISTOGRAM_KEY.format(article_id=article_id))
+
+
+def _global_stats_key(name):
+    """全站计数键名"""
+    return cache.make_key(GLOBAL_STATS_KEY.format(name=name))
+
+
+def _series_minute_key(article_id, moment):
+    """文章在 moment 所在小时的分钟计数哈希键名"""
+    return cache.make_key(SERIES_MINUTE_KEY.format(article_id=article_id, hour=f"{moment:%Y%m%d%H}"))
+
+
+def _series_active_key(moment):
+    """moment 所在小时内有阅读的文章集合键名"""
+    return cache.make_key(SERIES_ACTIVE_KEY.format(hour=f"{moment:%Y%m%d%H}"))
+
+
+def _user_history_keys(user_id):
+    """用户阅读历史的键名：(有序集合, complete 标记)"""
+    return (cache.make_key(USER_HISTORY_KEY.format(user_id=user_id)),
+            cache.make_key(USER_HISTORY_COMPLETE_KEY.format(user_id=user_id)))
+
+
+def _pending_key(article_id):
+    """文章尚未落库的增量哈希键名"""
+    return cache.make_key(PENDING_KEY.format(article_id=article_id))
+
+
+def _parse_deltas(values):
+    """解析增量哈希：(total_reads, user_count, {user_id: 阅读次数})"""
+    values = {field.decode(): int(value) for field, value in values.items()}
+    user_reads = {field[len(PENDING_USER_PREFIX):]: value for field, value in values.items()
+                  if field.startswith(PENDING_USER_PREFIX)}
+    return values.get('total_reads', 0), values.get('user_count', 0), user_reads
+
+
+def _use_retention():
+    """是否启用保留策略（脏计数落库前不过期，按访问频率设置TTL，超出内存预算时淘汰冷门文章）"""
+    return getattr(settings, 'STATS_RETENTION_ENABLED', False)
+
+
+def _use_hash_layout():
+    """是否使用 hash 键布局"""
+    return getattr(settings, 'STATS_KEY_LAYOUT', STATS_LAYOUT_KEYS) == STATS_LAYOUT_HASH
+
+
+def _legacy_counter_key(article_id, name):
+    """keys 布局的计数键名（name 为 total_reads 或 user_count）"""
+    return cache.make_key(f"article:{article_id}:{name}")
+
+
+def _legacy_user_key(article_id, user_id):
+    """keys 布局的用户阅读次数键名"""
+    return cache.make_key(f"article:{article_id}:user:{user_id}")
+
+
+def _counter_location(article_id, name):
+    """文章计数的存储位置：(键名, 哈希字段)，keys 布局的字段为None"""
+    if _use_hash_layout():
+        return cache.make_key(ARTICLE_COUNTERS_KEY.format(article_id=article_id)), name
+    return _legacy_counter_key(article_id, name), None
+
+
+def _user_read_location(article_id, user_id):
+    """用户阅读次数的存储位置：(键名, 哈希字段)，keys 布局的字段为None"""
+    if _use_hash_layout():
+        return cache.make_key(USER_READS_KEY.format(article_id=article_id)), str(user_id)
+    return _legacy_user_key(article_id, user_id), None
+
+
+def _queue_get(pipe, location):
+    """在管道中排队读取 location 处的值（GET 或 HGET）"""
+    key, field = location
+    if field is None:
+        pipe.get(key)
+    else:
+        pipe.hget(key, field)
+
+
+def _queue_cache_counters(pipe, article_id, total_reads, user_count):
+    """在管道中排队写入文章计数并设置过期时间（同步与异步管道均可）"""
+    if _use_hash_layout():
+        key = cache.make_key(ARTICLE_COUNTERS_KEY.format(article_id=article_id))
+        pipe.hset(key, mapping={'total_reads': total_reads, 'user_count': user_count})
+        pipe.expire(key, STATS_CACHE_TIMEOUT)
+    else:
+        for name, value in zip(COUNTER_FIELDS, (total_reads, user_count)):
+            pipe.set(_legacy_counter_key(article_id, name), value, ex=STATS_CACHE_TIMEOUT)
+
+
+def _counter_keys(article_id):
+    """文章计数所在的键（hash 布局为一个哈希，keys 布局为两个计数键）"""
+    if _use_hash_layout():
+        return [cache.make_key(ARTICLE_COUNTERS_KEY.format(article_id=article_id))]
+    return [_legacy_counter_key(article_id, name) for name in COUNTER_FIELDS]
+
+
+def _sum_reads(values):
+    """合并同一用户在新旧布局中的阅读次数，均不存在时返回None"""
+    values = [int(value) for value in values if value is not None]
+    return sum(values) if values else None
+
+
+def _record_read_call(article_id, user_id, count):
+    """计数脚本公共的 keys 和 args"""
+    now = timezone.now()
+    (total_reads_key, total_reads_field), (user_count_key, user_count_field) = (
+        _counter_location(article_id, name) for name in COUNTER_FIELDS)
+    keys = [
+        total_reads_key,
+        user_count_key,
+        cache.make_key(DIRTY_ARTICLES_KEY),
+        _leaderboard_key('all'),
+        _leaderboard_key('hour', now),
+        _leaderboard_key('day', now),
+        _series_minute_key(article_id, now),
+        _series_active_key(now),
+        *[_global_stats_key(name) for name in GLOBAL_STATS_FIELDS],
+        _global_stats_key('readers'),
+        *[_legacy_counter_key(article_id, name) for name in COUNTER_FIELDS],
+        cache.make_key(ACCESS_INDEX_KEY),
+        *_user_history_keys(user_id),
+        _pending_key(article_id),
+    ]
+    retention = _use_retention()
+    args = [
+        0 if retention else STATS_CACHE_TIMEOUT, count, article_id, user_id,
+        settings.STATS_LEADERBOARD_HOUR_TTL, settings.STATS_LEADERBOARD_DAY_TTL,
+        now.minute, settings.STATS_SERIES_MINUTE_TTL,
+        total_reads_field or '', user_count_field or '',
+        int(now.timestamp()) if retention else '',
+        history_score(now), settings.STATS_USER_HISTORY_SIZE, settings.STATS_USER_HISTORY_TTL,
+    ]
+    return keys, args
+
+
+def _atomic_script_call(article_id, user_id, count):
+    """精确模式计数脚本调用参数：(script, keys, args)"""
+    keys, args = _record_read_call(article_id, user_id, count)
+    user_key, user_field = _user_read_location(article_id, user_id)
+    keys += [
+        user_key,
+        cache.make_key(READ_HISTOGRAM_KEY.format(article_id=article_id)),
+        cache.make_key(GLOBAL_READ_HISTOGRAM_KEY),
+        _legacy_user_key(article_id, user_id),
+    ]
+    args.append(user_field or '')
+    return _get_script(INCREMENT_READ_SCRIPT), keys, args
+
+
+def _approximate_script_call(article_id, user_id, count):
+    """近似模式计数脚本调用参数：(script, keys, args)"""
+    keys, args = _record_read_call(article_id, user_id, count)
+    keys.append(cache.make_key(f"article:{article_id}:readers"))
+    return _get_script(INCREMENT_READ_APPROXIMATE_SCRIPT), keys, args
+
+
+def _migrate_counters_call(article_id):
+    """旧布局计数键迁移脚本调用参数：(script, keys, args)"""
+    keys = [
+        *[_legacy_counter_key(article_id, name) for name in COUNTER_FIELDS],
+        cache.make_key(ARTICLE_COUNTERS_KEY.format(article_id=article_id)),
+    ]
+    return _get_script(MIGRATE_COUNTERS_SCRIPT), keys, [STATS_CACHE_TIMEOUT]
+
+
+def _retention_status(memory_info, pinned_articles, tracked_articles):
+    """根据 INFO memory 及固定/索引中的文章数生成保留策略状态（同步与异步版本共用）"""
+    used_memory = memory_info.get('used_memory', 0)
+    budget = settings.STATS_MEMORY_BUDGET_BYTES
+    return {
+        'enabled': _use_retention(),
+        'used_memory': used_memory,
+        'maxmemory': memory_info.get('maxmemory', 0),
+        'budget_bytes': budget,
+        'budget_usage': f"{used_memory / budget * 100:.2f}%" if budget else None,
+        'pinned_articles': pinned_articles,
+        'tracked_articles': tracked_articles,
+    }
+
+
+def _extend_ttl_call(article_id):
+    """计数续期脚本调用参数：(script, keys, args)"""
+    return _get_script(EXTEND_TTL_SCRIPT), _counter_keys(article_id), [STATS_CACHE_TIMEOUT]
+
+
+def _article_cache_keys(article_id):
+    """文章的计数及按用户维护的缓存键（不含 keys 布局下逐用户的键），用于解除固定与淘汰"""
+    keys = [
+        *_counter_keys(article_id),
+        cache.make_key(f"article:{article_id}:readers"),
+        cache.make_key(READ_HISTOGRAM_KEY.format(article_id=article_id)),
+    ]
+    if _use_hash_layout():
+        keys.append(cache.make_key(USER_READS_KEY.format(article_id=article_id)))
+    return keys
+
+
+def _encode(value):
+    """按 django-redis 的编码规则编码：整数原样存储，其余序列化，与 cache.get/set 读写的值兼容"""
+    return cache.client.encode(value)
+
+
+def _decode(value):
+    return cache.client.decode(value) if value is not None else None
+
+
+def _queue_fetch_counters(pipe, article_ids, with_meta=False):
+    """在管道中排队读取多篇文章的计数（及回填元数据）"""
+    for article_id in article_ids:
+        for name in COUNTER_FIELDS:
+            _queue_get(pipe, _counter_location(article_id, name))
+        if with_meta:
+            pipe.get(cache.make_key(STATS_META_KEY.format(article_id=article_id)))
+
+
+def _parse_counters(article_ids, results, with_meta=False):
+    """解析 _queue_fetch_counters 的结果：({article_id: [total_reads, user_count(, meta)]}, 待就地迁移的文章ID)"""
+    step = len(COUNTER_FIELDS) + int(with_meta)
+    values = {
+        article_id: [_decode(value) for value in results[index * step:(index + 1) * step]]
+        for index, article_id in enumerate(article_ids)
+    }
+    missing = []
+    if _use_hash_layout():
+        missing = [article_id for article_id, (total_reads, user_count, *_) in values.items()
+                   if total_reads is None or user_count is None]
+    return values, missing
+
+
+def _merge_migrated(values, missing, results):
+    """合并就地迁移脚本的结果，并将计数转换为整数"""
+    for article_id, migrated in zip(missing, results):
+        if migrated:
+            values[article_id][:2] = migrated
+    for counters in values.values():
+        counters[:2] = [int(value) if value is not None else None for value in counters[:2]]
+    return values
+
+
+def _fetch_counters(article_ids, with_meta=False):
+    """一次往返读取多篇文章的计数：{article_id: [total_reads, user_count(, meta)]}，缺失项为None
+
+    hash 布局下计数哈希缺失而旧布局计数键仍存在时（尚未迁移），就地迁移后返回迁移结果。
+    """
+    with pipeline() as pipe:
+        _queue_fetch_counters(pipe, article_ids, with_meta)
+    values, missing = _parse_counters(article_ids, pipe.results, with_meta)
+    results = []
+    if missing:
+        with pipeline() as pipe:
+            for article_id in missing:
+                script, keys, args = _migrate_counters_call(article_id)
+                script(keys=keys, args=args, client=pipe)
+        results = pipe.results
+    return _merge_migrated(values, missing, results)
+
+
+def _cached_counter(article_id, name):
+    """读取文章计数：启用L1时先查进程内缓存（以逻辑键名缓存，与键布局无关），未命中再读Redis"""
+    index = COUNTER_FIELDS.index(name)
+    l1 = local_cache.get_local_cache()
+    if l1 is None:
+        return _fetch_counters([article_id])[article_id][index]
+    key = f"article:{article_id}:{name}"
+    value = l1.get(key)
+    if value is local_cache.MISSING:
+        value = _fetch_counters([article_id])[article_id][index]
+        if value is not None:
+            l1.set(key, value)
+    return value
+
+
+def _increment_or_create(model, lookup, increments, fields):
+    """以 F() 表达式原子累加 lookup 定位的行，行不存在时插入；返回是否插入了新行
+
+    并发请求同时插入时，唯一约束冲突的一方回滚到保存点后改为累加。
+    """
+    from django.db import IntegrityError, transaction
+
+    updates = {name: F(name) + value for name, value in increments.items()}
+    if model.objects.filter(**lookup).update(**updates, **fields):
+        return False
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **increments, **fields)
+        return True
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**updates, **fields)
+        return False
+
+
+def _stats_meta(total_reads, user_count, delta):
+    return {
+        'total_reads': total_reads,
+        'user_count': user_count,
+        'expires_at': time.time() + STATS_CACHE_TIMEOUT,
+        'delta': delta,
+    }
+
+
+class StatsCacheService:
+    @staticmethod
+    def is_atomic_increment():
+        """是否启用原子计数模式（hash 布局的计数及保留策略只能由脚本维护，此时总是使用原子计数）"""
+        return getattr(settings, 'STATS_ATOMIC_INCREMENT', True) or _use_hash_layout() or _use_retention()
+
+    @staticmethod
+    def get_user_count_mode():
+        """获取用户数统计模式"""
+        return getattr(settings, 'STATS_USER_COUNT_MODE', USER_COUNT_MODE_EXACT)
+
+    @staticmethod
+    def increment_read(article_id, user_id):
+        """增加文章阅读次数，返回是否为新用户（降级写入进入数据库微批缓冲时返回None）"""
+        if StatsCacheService.get_user_count_mode() == USER_COUNT_MODE_APPROXIMATE:
+            mode = USER_COUNT_MODE_APPROXIMATE
+        else:
+            mode = 'atomic' if StatsCacheService.is_atomic_increment() else 'legacy'
+        with metrics.INCREMENT_READ_SECONDS.time(mode=mode):
+            try:
+                if mode == USER_COUNT_MODE_APPROXIMATE:
+                    return StatsCacheService.increment_read_approximate(article_id, user_id)
+
+                if mode == 'atomic':
+                    return StatsCacheService.increment_read_atomic(article_id, user_id)
+
+                # 使用Django cache接口而不是直接操作Redis
+                # 增加总阅读量
+                total_reads_key = f"article:{article_id}:total_reads"
+                total_reads = cache.get(total_reads_key)
+                if total_reads is None:
+                    total_reads = 0
+                cache.set(total_reads_key, total_reads + 1, timeout=3600)
+
+                # 记录用户阅读
+                user_key = f"article:{article_id}:user:{user_id}"
+                user_read_count = cache.get(user_key)
+                user_existed = user_read_count is not None
+
+                if user_read_count is None:
+                    user_read_count = 0
+                cache.set(user_key, user_read_count + 1, timeout=3600)
+
+                # 如果是新用户，增加用户数
+                user_count_key = f"article:{article_id}:user_count"
+                user_count = cache.get(user_count_key)
+                if user_count is None:
+                    user_count = 0
+
+                if not user_existed:
+                    cache.set(user_count_key, user_count + 1, timeout=3600)
+
+                StatsCacheService.mark_dirty(article_id, user_id, new_user=not user_existed)
+                StatsCacheService.update_read_histogram(article_id, user_read_count, user_read_count + 1)
+                StatsCacheService.update_read_indexes(article_id, user_id)
+                return not user_existed
+
+            except Exception as e:
+                logger.error(f"Cache unavailable, using DB fallback: {str(e)}")
+                metrics.DB_FALLBACKS.inc(operation='increment_read')
+                # 降级到数据库处理
+                return StatsCacheService.record_read_db(article_id, user_id)
+
+    @staticmethod
+    def increment_read_db(article_id, user_id, count=1):
+        """直接在数据库中增加阅读次数（缓存不可用时的降级方案），返回是否为新用户
+
+        在一个事务内以 F() 表达式累加，不会丢失并发更新；老用户只需两条UPDATE。
+        """
+        from django.db import transaction
+        from .models import ArticleStats, UserRead
+
+        now = timezone.now()
+        with transaction.atomic():
+            # 先累加文章行（用户阅读记录的外键引用文章行）
+            _increment_or_create(ArticleStats, {'article_id': article_id}, {'total_reads': count},
+                                 {'last_updated': now})
+            created = _increment_or_create(UserRead, {'article_id': article_id, 'user_id': user_id},
+                                           {'read_count': count}, {'last_read': now})
+            if created:
+                ArticleStats.objects.filter(article_id=article_id).update(user_count=F('user_count') + 1)
+        return created
+
+    @staticmethod
+    def record_read_db(article_id, user_id, count=1):
+        """缓存不可用时的降级写入
+
+        启用 STATS_SPOOL_ENABLED 时追加到本地暂存文件，Redis恢复后重放（暂存已满时继续按下述方式写数据库）；
+        启用 STATS_DB_FALLBACK_BATCH_ENABLED 时放入进程内合并缓冲区，按批写入数据库。
+        以上两种情况返回None，否则立即写入数据库，返回是否为新用户。
+        """
+        if getattr(settings, 'STATS_SPOOL_ENABLED', False):
+            from .spool import get_read_spool
+            if get_read_spool().append(article_id, user_id, count):
+                return None
+        if getattr(settings, 'STATS_DB_FALLBACK_BATCH_ENABLED', False):
+            from .buffer import get_db_fallback_buffer
+            get_db_fallback_buffer().add(article_id, user_id, count)
+            return None
+        return StatsCacheService.increment_read_db(article_id, user_id, count)
+
+    @staticmethod
+    def record_reads_db_bulk(deltas):
+        """缓存不可用时的批量降级写入：启用 STATS_SPOOL_ENABLED 时追加到本地暂存文件，否则一个事务写入数据库"""
+        if getattr(settings, 'STATS_SPOOL_ENABLED', False):
+            from .spool import get_read_spool
+            spool = get_read_spool()
+            deltas = {pair: count for pair, count in deltas.items() if not spool.append(*pair, count)}
+        if deltas:
+            StatsCacheService.increment_reads_db_bulk(deltas)
+
+    @staticmethod
+    def increment_reads_db_bulk(deltas, last_read_times=None):
+        """在一个事务内批量累加数据库中的阅读次数（缓存不可用时的批量降级方案，也用于增量落库）
+
+        deltas: {(article_id, user_id): count}，返回新用户的 (article_id, user_id) 集合。
+        先以忽略冲突的方式插入缺失的行（阅读次数为0），再锁定这些行并以 F() 表达式累加，
+        阅读次数仍为0的行即本事务插入的新用户，并发的批量写入不会重复计数新用户。
+        last_read_times: {(article_id, user_id): datetime}，未给出的按当前时间更新 last_read。
+        """
+        from django.db import transaction
+        from django.db.models import Case, Value, When
+        from .models import ArticleStats, UserRead
+
+        if not deltas:
+            return set()
+        now = timezone.now()
+        article_ids = {article_id for article_id, _ in deltas}
+        user_ids = {user_id for _, user_id in deltas}
+
+        with transaction.atomic():
+            ArticleStats.objects.bulk_create(
+                [ArticleStats(article_id=article_id) for article_id in article_ids],
+                ignore_conflicts=True
+            )
+            UserRead.objects.bulk_create(
+                [UserRead(article_id=article_id, user_id=user_id, read_count=0) for article_id, user_id in deltas],
+                ignore_conflicts=True
+            )
+
+            rows = {
+                (article_id, user_id): (pk, read_count)
+                for pk, article_id, user_id, read_count in UserRead.objects.select_for_update().filter(
+                    article_id__in=article_ids, user_id__in=user_ids
+                ).values_list('pk', 'article_id', 'user_id', 'read_count')
+                if (article_id, user_id) in deltas
+            }
+            new_pairs = {pair for pair, (_, read_count) in rows.items() if read_count == 0}
+
+            last_read_times = {pair: moment for pair, moment in (last_read_times or {}).items()
+                               if moment is not None and pair in rows}
+            UserRead.objects.filter(pk__in=[pk for pk, _ in rows.values()]).update(
+                read_count=F('read_count') + Case(
+                    *[When(pk=pk, then=Value(deltas[pair])) for pair, (pk, _) in rows.items()]
+                ),
+                last_read=Case(
+                    *[When(pk=rows[pair][0], then=Value(moment)) for pair, moment in last_read_times.items()],
+                    default=Value(now),
+                ),
+            )
+
+            reads_by_article = {}
+            new_users_by_article = {}
+            for (article_id, user_id), count in deltas.items():
+                reads_by_article[article_id] = reads_by_article.get(article_id, 0) + count
+                if (article_id, user_id) in new_pairs:
+                    new_users_by_article[article_id] = new_users_by_article.get(article_id, 0) + 1
+            ArticleStats.objects.filter(article_id__in=article_ids).update(
+                total_reads=F('total_reads') + Case(
+                    *[When(article_id=article_id, then=Value(reads)) for article_id, reads in reads_by_article.items()]
+                ),
+                user_count=F('user_count') + Case(
+                    *[When(article_id=article_id, then=Value(new_users_by_article.get(article_id, 0)))
+                      for article_id in article_ids]
+                ),
+                last_updated=now,
+            )
+        return new_pairs
+
+    @staticmethod
+    def increment_articles_db_bulk(deltas):
+        """在一个事务内以 F() 表达式累加文章计数（不含逐用户阅读次数，近似模式落库使用）
+
+        deltas: {article_id: (阅读次数, 新用户数)}
+        """
+        from django.db import transaction
+        from django.db.models import Case, Value, When
+        from .models import ArticleStats
+
+        if not deltas:
+            return
+        with transaction.atomic():
+            ArticleStats.objects.bulk_create(
+                [ArticleStats(article_id=article_id) for article_id in deltas],
+                ignore_conflicts=True
+            )
+            ArticleStats.objects.filter(article_id__in=deltas).update(
+                total_reads=F('total_reads') + Case(
+                    *[When(article_id=article_id, then=Value(reads)) for article_id, (reads, _) in deltas.items()]
+                ),
+                user_count=F('user_count') + Case(
+                    *[When(article_id=article_id, then=Value(users)) for article_id, (_, users) in deltas.items()]
+                ),
+                last_updated=timezone.now(),
+            )
+
+    @staticmethod
+    def increment_read_atomic(article_id, user_id, count=1):
+        """原子增加文章阅读次数（单次Redis往返），返回是否为新用户"""
+        script, keys, args = _atomic_script_call(article_id, user_id, count)
+        return bool(script(keys=keys, args=args)[-1])
+
+    @staticmethod
+    def increment_read_approximate(article_id, user_id, count=1):
+        """近似模式增加阅读次数（HyperLogLog去重，不保存逐用户阅读次数），返回是否为新用户"""
+        script, keys, args = _approximate_script_call(article_id, user_id, count)
+        return bool(script(keys=keys, args=args)[-1])
+
+    @staticmethod
+    def increment_reads_bulk(deltas):
+        """通过一次管道批量累加阅读次数
+
+        deltas: {(article_id, user_id): count}，返回 {(article_id, user_id): 是否为新用户}
+        """
+        if not deltas:
+            return {}
+        if StatsCacheService.get_user_count_mode() == USER_COUNT_MODE_APPROXIMATE:
+            script_call = _approximate_script_call
+        else:
+            script_call = _atomic_script_call
+
+        with pipeline() as pipe:
+            for (article_id, user_id), count in deltas.items():
+                script, keys, args = script_call(article_id, user_id, count)
+                script(keys=keys, args=args, client=pipe)
+        return {pair: bool(result[-1]) for pair, result in zip(deltas, pipe.results)}
+
+    @staticmethod
+    def mark_dirty(article_id, user_id, count=1, new_user=False):
+        """标记文章待落库并记录阅读增量（非脚本计数路径使用）"""
+        pending_key = _pending_key(article_id)
+        with pipeline() as pipe:
+            pipe.hincrby(pending_key, 'total_reads', count)
+            pipe.hincrby(pending_key, f"{PENDING_USER_PREFIX}{user_id}", count)
+            if new_user:
+                pipe.hincrby(pending_key, 'user_count', 1)
+            pipe.sadd(cache.make_key(DIRTY_ARTICLES_KEY), article_id)
+
+    @staticmethod
+    def pop_dirty_articles(batch_size):
+        """弹出一批待落库的文章ID"""
+        members = get_redis_connection("default").spop(cache.make_key(DIRTY_ARTICLES_KEY), batch_size)
+        return [int(member) for member in members or []]
+
+    @staticmethod
+    def restore_dirty_articles(article_ids):
+        """落库失败时将文章ID放回待落库集合（flushing 中的增量保留，下次落库时合并）"""
+        if not article_ids:
+            return
+        get_redis_connection("default").sadd(cache.make_key(DIRTY_ARTICLES_KEY), *article_ids)
+
+    @staticmethod
+    def get_flush_snapshot(article_ids):
+        """取出一批文章尚未落库的增量：{article_id: (total_reads, user_count, {user_id: read_count})}
+
+        增量转入 flushing 哈希，落库成功后调用 complete_flush 删除。
+        """
+        script = _get_script(TAKE_PENDING_SCRIPT)
+        with pipeline() as pipe:
+            for article_id in article_ids:
+                script(keys=[_pending_key(article_id), cache.make_key(FLUSHING_KEY.format(article_id=article_id))],
+                       client=pipe)
+        snapshot = {}
+        for article_id, values in zip(article_ids, pipe.results):
+            snapshot[article_id] = _parse_deltas(dict(zip(values[::2], values[1::2])))
+        return snapshot
+
+    @staticmethod
+    def complete_flush(article_ids):
+        """增量已写入数据库：删除 flushing 哈希"""
+        if article_ids:
+            get_redis_connection("default").delete(
+                *[cache.make_key(FLUSHING_KEY.format(article_id=article_id)) for article_id in article_ids])
+
+    @staticmethod
+    def get_reconcile_snapshot(article_ids, pairs):
+        """在一个 MULTI/EXEC 事务内读取文章计数、用户阅读次数及尚未落库的增量，三者互相一致
+
+        返回 (stats, user_reads, pending)：stats 为 {article_id: (total_reads, user_count)}（未完整缓存的不返回，
+        不做旧布局计数的就地迁移）；user_reads 为 {(article_id, user_id): read_count}（未缓存或近似模式为None）；
+        pending 为 {article_id: (total_reads, user_count, {user_id: read_count})}，包含 article_ids 及 pairs 涉及的
+        全部文章，正在落库的文章（存在 flushing 哈希，数据库是否已包含这部分增量无法确定）为None。
+        """
+        article_ids = list(dict.fromkeys(article_ids))
+        pairs = list(dict.fromkeys(pairs))
+        pending_ids = sorted(set(article_ids) | {article_id for article_id, _ in pairs})
+        exact = StatsCacheService.get_user_count_mode() == USER_COUNT_MODE_EXACT
+        hash_layout = _use_hash_layout()
+        with pipeline(transaction=True) as pipe:
+            _queue_fetch_counters(pipe, article_ids)
+            if exact:
+                for article_id, user_id in pairs:
+                    _queue_get(pipe, _user_read_location(article_id, user_id))
+                    if hash_layout:
+                        pipe.get(_legacy_user_key(article_id, user_id))
+            for article_id in pending_ids:
+                pipe.hgetall(_pending_key(article_id))
+                pipe.exists(cache.make_key(FLUSHING_KEY.format(article_id=article_id)))
+        results = pipe.results
+
+        end = len(article_ids) * len(COUNTER_FIELDS)
+        values, _ = _parse_counters(article_ids, results[:end])
+        stats = {
+            article_id: (total_reads, user_count)
+            for article_id, (total_reads, user_count) in _merge_migrated(values, [], []).items()
+            if total_reads is not None and user_count is not None
+        }
+        user_reads = dict.fromkeys(pairs)
+        if exact:
+            step = 2 if hash_layout else 1
+            user_reads = {pair: _sum_reads(results[end + index * step:end + (index + 1) * step])
+                          for index, pair in enumerate(pairs)}
+            end += len(pairs) * step
+        results = results[end:]
+        pending = {
+            article_id: None if flushing else _parse_deltas(values)
+            for article_id, values, flushing in zip(pending_ids, results[::2], results[1::2])
+        }
+        return stats, user_reads, pending
+
+    @staticmethod
+    def offset_pending(user_reads_by_article, new_users_by_article=None):
+        """从增量中扣除已直接写入数据库的阅读，避免下次落库重复累加
+
+        user_reads_by_article: {article_id: {user_id: 阅读次数}}；new_users_by_article: {article_id: 新用户数}。
+        """
+        script = _get_script(OFFSET_PENDING_SCRIPT)
+        exact = StatsCacheService.get_user_count_mode() == USER_COUNT_MODE_EXACT
+        with pipeline() as pipe:
+            for article_id, users in user_reads_by_article.items():
+                args = [article_id, 'total_reads', sum(users.values()),
+                        'user_count', (new_users_by_article or {}).get(article_id, 0)]
+                if exact:
+                    for user_id, count in users.items():
+                        args += [f"{PENDING_USER_PREFIX}{user_id}", count]
+                script(keys=[_pending_key(article_id), cache.make_key(DIRTY_ARTICLES_KEY)], args=args, client=pipe)
+
+    @staticmethod
+    def get_approximate_user_count(article_id):
+        """获取HyperLogLog估算的用户数"""
+        return get_redis_connection("default").pfcount(cache.make_key(f"article:{article_id}:readers"))
+
+    @staticmethod
+    def get_total_reads(article_id):
+        """获取文章总阅读量"""
+        return _cached_counter(article_id, 'total_reads')
+
+    @staticmethod
+    def get_user_count(article_id):
+        """获取文章用户数"""
+        return _cached_counter(article_id, 'user_count')
+
+    @staticmethod
+    def cache_stats(article_id, total_reads, user_count, delta=0.0):
+        """缓存文章统计数据，同时写入更长期保留的回填元数据（delta 为本次重建耗时，秒）"""
+        with pipeline() as pipe:
+            _queue_cache_counters(pipe, article_id, total_reads, user_count)
+            pipe.set(cache.make_key(STATS_META_KEY.format(article_id=article_id)),
+                     _encode(_stats_meta(total_reads, user_count, delta)), ex=settings.STATS_STALE_TTL)
+        local_cache.invalidate([f"article:{article_id}:total_reads", f"article:{article_id}:user_count"])
+
+    @staticmethod
+    def get_stats_snapshot(article_id):
+        """一次往返读取文章计数及回填元数据：(total_reads, user_count, meta)，缺失项为None
+
+        启用L1且两个计数均在进程内缓存中时直接返回，此时不读取元数据（不做提前刷新判断）。
+        """
+        total_reads_key = f"article:{article_id}:total_reads"
+        user_count_key = f"article:{article_id}:user_count"
+        l1 = local_cache.get_local_cache()
+        if l1 is not None:
+            total_reads, user_count = l1.get(total_reads_key), l1.get(user_count_key)
+            if total_reads is not local_cache.MISSING and user_count is not local_cache.MISSING:
+                return int(total_reads), int(user_count), None
+
+        total_reads, user_count, meta = _fetch_counters([article_id], with_meta=True)[article_id]
+        if l1 is not None:
+            if total_reads is not None:
+                l1.set(total_reads_key, total_reads)
+            if user_count is not None:
+                l1.set(user_count_key, user_count)
+        return total_reads, user_count, meta
+
+    @staticmethod
+    def should_refresh_early(meta):
+        """概率性提前刷新（XFetch）：越接近过期、重建越慢，越可能提前刷新"""
+        if not meta:
+            return False
+        beta = settings.STATS_EARLY_REFRESH_BETA
+        # random() 可能返回0，log(0) 无定义
+        jitter = -math.log(1.0 - random.random())
+        return time.time() + meta['delta'] * beta * jitter >= meta['expires_at']
+
+    @staticmethod
+    def extend_stats_ttl(article_id, meta):
+        """在过期前延长文章计数的TTL
+
+        Redis中的计数可能包含尚未落库的增量，比数据库更新，因此提前刷新只续期而不用数据库结果覆盖。
+        """
+        script, keys, args = _extend_ttl_call(article_id)
+        extended = bool(script(keys=keys, args=args))
+        if extended:
+            meta = dict(meta, expires_at=time.time() + STATS_CACHE_TIMEOUT)
+            get_redis_connection().set(cache.make_key(STATS_META_KEY.format(article_id=article_id)),
+                                       _encode(meta), ex=settings.STATS_STALE_TTL)
+        return extended
+
+    @staticmethod
+    def acquire_rebuild_lock(name, count_waiter=True):
+        """尝试获取短期重建锁，成功返回锁令牌；失败返回None，并（可选）登记为等待者"""
+        redis_conn = get_redis_connection("default")
+        token = f"{random.getrandbits(64):016x}"
+        if redis_conn.set(cache.make_key(REBUILD_LOCK_KEY.format(name=name)), token,
+                          nx=True, px=settings.STATS_STAMPEDE_LOCK_TIMEOUT_MS):
+            return token
+        if count_waiter:
+            waiters_key = cache.make_key(REBUILD_WAITERS_KEY.format(name=name))
+            with pipeline() as pipe:
+                pipe.incr(waiters_key)
+                pipe.pexpire(waiters_key, settings.STATS_STAMPEDE_LOCK_TIMEOUT_MS)
+        return None
+
+    @staticmethod
+    def release_rebuild_lock(name, token):
+        """释放重建锁，返回锁持有期间登记的等待者数量"""
+        keys = [cache.make_key(REBUILD_LOCK_KEY.format(name=name)),
+                cache.make_key(REBUILD_WAITERS_KEY.format(name=name))]
+        return int(_get_script(RELEASE_LOCK_SCRIPT)(keys=keys, args=[token]))
+
+    @staticmethod
+    def single_flight(kind, name, rebuild, peek, stale=None):
+        """单飞重建：只有拿到锁的进程执行 rebuild()，其余进程返回旧值或等待重建结果
+
+        返回 (value, outcome)，outcome 为：
+        rebuilt - 本进程完成重建；stale - 其他进程正在重建，返回旧值 stale；
+        waited - 无旧值，轮询 peek() 等到了重建结果；timeout - 等待超时，value 为None，由调用方降级。
+        """
+        token = StatsCacheService.acquire_rebuild_lock(name)
+        if token:
+            try:
+                value = rebuild()
+            finally:
+                try:
+                    waiters = StatsCacheService.release_rebuild_lock(name, token)
+                    metrics.STAMPEDE_STORM_SIZE.observe(waiters + 1, kind=kind)
+                except Exception as e:
+                    logger.error(f"Failed to release rebuild lock {name}: {str(e)}")
+            metrics.STAMPEDE_REBUILDS.inc(kind=kind, outcome='rebuilt')
+            return value, 'rebuilt'
+
+        if stale is not None:
+            metrics.STAMPEDE_REBUILDS.inc(kind=kind, outcome='stale')
+            return stale, 'stale'
+
+        value = None
+        with metrics.STAMPEDE_LOCK_WAIT_SECONDS.time(kind=kind):
+            deadline = time.monotonic() + settings.STATS_STAMPEDE_LOCK_WAIT_MS / 1000
+            while time.monotonic() < deadline:
+                time.sleep(settings.STATS_STAMPEDE_POLL_MS / 1000)
+                value = peek()
+                if value is not None:
+                    break
+        outcome = 'waited' if value is not None else 'timeout'
+        metrics.STAMPEDE_REBUILDS.inc(kind=kind, outcome=outcome)
+        return value, outcome
+
+    @staticmethod
+    def get_stats_many(article_ids):
+        """一次往返获取多篇文章的统计数据：{article_id: (total_reads, user_count)}，未完整缓存的文章不返回"""
+        return {
+            article_id: (total_reads, user_count)
+            for article_id, (total_reads, user_count) in _fetch_counters(list(dict.fromkeys(article_ids))).items()
+            if total_reads is not None and user_count is not None
+        }
+
+    @staticmethod
+    def cache_stats_many(stats):
+        """通过一次管道回填多篇文章的统计数据：stats 为 {article_id: (total_reads, user_count)}"""
+        if stats:
+            with pipeline() as pipe:
+                for article_id, (total_reads, user_count) in stats.items():
+                    _queue_cache_counters(pipe, article_id, total_reads, user_count)
+                    pipe.set(cache.make_key(STATS_META_KEY.format(article_id=article_id)),
+                             _encode(_stats_meta(total_reads, user_count, 0.0)), ex=settings.STATS_STALE_TTL)
+            local_cache.invalidate([f"article:{article_id}:{name}" for article_id in stats for name in COUNTER_FIELDS])
+
+    @staticmethod
+    def warm_stats_many(stats):
+        """预热：通过一次管道写入缓存中尚不存在的文章计数及回填元数据并校正总榜分数，返回 (写入的文章数, 写入的键数)
+
+        stats 为 {article_id: (total_reads, user_count)}，已缓存的计数保持不变。hash 布局的计数字段按键计。
+        """
+        if not stats:
+            return 0, 0
+        script = _get_script(WARM_COUNTERS_SCRIPT)
+        seed_script = _get_script(SEED_LEADERBOARD_SCRIPT)
+        leaderboard_key = _leaderboard_key('all')
+        with pipeline() as pipe:
+            for article_id, (total_reads, user_count) in stats.items():
+                (total_reads_key, total_reads_field), (user_count_key, user_count_field) = (
+                    _counter_location(article_id, name) for name in COUNTER_FIELDS)
+                keys = [total_reads_key, user_count_key,
+                        *[_legacy_counter_key(article_id, name) for name in COUNTER_FIELDS]]
+                args = [total_reads_field or '', user_count_field or '', total_reads, user_count, STATS_CACHE_TIMEOUT]
+                script(keys=keys, args=args, client=pipe)
+                pipe.set(cache.make_key(STATS_META_KEY.format(article_id=article_id)),
+                         _encode(_stats_meta(total_reads, user_count, 0.0)), ex=settings.STATS_STALE_TTL, nx=True)
+                seed_script(keys=[leaderboard_key, _pending_key(article_id)], args=[article_id, total_reads],
+                            client=pipe)
+        counters, metas = pipe.results[::3], pipe.results[1::3]
+        return sum(1 for loaded in counters if loaded), sum(counters) + sum(1 for meta in metas if meta)
+
+    @staticmethod
+    def get_memory_usage():
+        """Redis内存占用：(used_memory, maxmemory)，未设置 maxmemory 时后者为0"""
+        info = get_redis_connection().info('memory')
+        return info['used_memory'], info.get('maxmemory', 0)
+
+    @staticmethod
+    def get_cache_hit_rate():
+        """获取缓存命中率（基于进程内指标计数器）"""
+        return metrics.cache_hit_rate()
+
+    @staticmethod
+    def get_total_reads_all_articles():
+        """获取所有文章总阅读量"""
+        return StatsCacheService.get_global_stats()['total_reads']
+
+    @staticmethod
+    def cache_total_reads_all_articles(total_reads):
+        """缓存所有文章总阅读量"""
+        get_redis_connection("default").set(_global_stats_key('total_reads'), total_reads)
+
+    @staticmethod
+    def update_read_histogram(article_id, old_reads, new_reads):
+        """用户阅读次数从 old_reads 变为 new_reads 时更新文章及全站直方图（非脚本计数路径使用）"""
+        new_bucket = histogram_bucket(new_reads)
+        if old_reads > 0 and histogram_bucket(old_reads) == new_bucket:
+            return
+        with pipeline() as pipe:
+            for key in (_histogram_key(article_id), _histogram_key()):
+                if old_reads > 0:
+                    pipe.hincrby(key, histogram_bucket(old_reads), -1)
+                pipe.hincrby(key, new_bucket, 1)
+
+    @staticmethod
+    def get_read_histogram(article_id=None):
+        """获取文章（article_id 为 None 时为全站）的阅读次数直方图：{区间标签: 读者数}，未缓存时返回None"""
+        histogram = get_redis_connection("default").hgetall(_histogram_key(article_id))
+        if not histogram:
+            return None
+        return {
+            histogram_label(bucket): readers
+            for bucket, readers in sorted((int(bucket), int(readers)) for bucket, readers in histogram.items())
+            if readers > 0
+        }
+
+    @staticmethod
+    def cache_read_histogram(histogram, article_id=None):
+        """以桶序号为字段覆盖写入直方图：histogram 为 {桶序号: 读者数}"""
+        key = _histogram_key(article_id)
+        with pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if histogram:
+                pipe.hset(key, mapping=histogram)
+
+    @staticmethod
+    def load_read_histogram(article_id=None):
+        """从数据库按阅读次数分组计算直方图并回填缓存，返回 {区间标签: 读者数}"""
+        from django.db.models import Count
+        from .models import UserRead
+
+        user_reads = UserRead.objects.filter(read_count__gt=0)
+        if article_id is not None:
+            user_reads = user_reads.filter(article_id=article_id)
+        histogram = {}
+        for item in user_reads.values('read_count').annotate(readers=Count('id')).order_by():
+            bucket = histogram_bucket(item['read_count'])
+            histogram[bucket] = histogram.get(bucket, 0) + item['readers']
+        StatsCacheService.cache_read_histogram(histogram, article_id)
+        return {histogram_label(bucket): readers for bucket, readers in sorted(histogram.items())}
+
+    @staticmethod
+    def get_global_stats():
+        """一次MGET读取全站计数：{total_reads, total_users, active_users}，缺失的计数为None"""
+        values = get_redis_connection("default").mget([_global_stats_key(name) for name in GLOBAL_STATS_FIELDS])
+        return {
+            name: int(value) if value is not None else None
+            for name, value in zip(GLOBAL_STATS_FIELDS, values)
+        }
+
+    @staticmethod
+    def set_global_stats(total_reads, total_users, active_users, overwrite=True):
+        """写入全站计数；overwrite=False 时只回填缺失的计数"""
+        values = {'total_reads': total_reads, 'total_users': total_users, 'active_users': active_users}
+        with pipeline() as pipe:
+            for name, value in values.items():
+                pipe.set(_global_stats_key(name), value, nx=not overwrite)
+
+    @staticmethod
+    def get_approximate_global_readers():
+        """获取全站读者HyperLogLog的估算值（近似模式）"""
+        return get_redis_connection("default").pfcount(_global_stats_key('readers'))
+
+    @staticmethod
+    def get_top_articles(k=10):
+        """获取热门文章：[(article_id, total_reads)]，优先读取排行榜"""
+        from .models import ArticleStats
+        try:
+            top_articles = StatsCacheService.get_leaderboard('all', k)
+            if top_articles:
+                return top_articles
+        except Exception as e:
+            logger.error(f"Leaderboard unavailable, using DB fallback: {str(e)}")
+        try:
+            # 获取阅读量大于0的文章，按阅读量排序，取前k篇
+            top_articles = ArticleStats.objects.filter(total_reads__gt=0).order_by('-total_reads')[:k]
+            return [(stats.article_id, stats.total_reads) for stats in top_articles]
+        except Exception:
+            return []
+
+    @staticmethod
+    def update_read_indexes(article_id, user_id, count=1):
+        """更新排行榜、分钟时间序列和全站计数（非脚本计数路径使用）"""
+        now = timezone.now()
+        hour_key = _leaderboard_key('hour', now)
+        day_key = _leaderboard_key('day', now)
+        series_key = _series_minute_key(article_id, now)
+        active_key = _series_active_key(now)
+        with pipeline() as pipe:
+            pipe.sadd(_global_stats_key('readers'), user_id)
+            pipe.incrby(_global_stats_key('total_reads'), count)
+            pipe.hincrby(series_key, now.minute, count)
+            pipe.expire(series_key, settings.STATS_SERIES_MINUTE_TTL)
+            pipe.sadd(active_key, article_id)
+            pipe.expire(active_key, settings.STATS_SERIES_MINUTE_TTL)
+            pipe.zincrby(_leaderboard_key('all'), count, article_id)
+            pipe.zincrby(hour_key, count, article_id)
+            pipe.expire(hour_key, settings.STATS_LEADERBOARD_HOUR_TTL)
+            pipe.zincrby(day_key, count, article_id)
+            pipe.expire(day_key, settings.STATS_LEADERBOARD_DAY_TTL)
+            _get_script(RECORD_HISTORY_SCRIPT)(
+                keys=_user_history_keys(user_id),
+                args=[article_id, history_score(now), settings.STATS_USER_HISTORY_SIZE,
+                      settings.STATS_USER_HISTORY_TTL],
+                client=pipe,
+            )
+        is_new_reader = pipe.results[0]
+        if is_new_reader:
+            with pipeline() as pipe:
+                pipe.incr(_global_stats_key('total_users'))
+                pipe.incr(_global_stats_key('active_users'))
+
+    @staticmethod
+    def get_minute_reads(article_id, start, end):
+        """读取Redis中 [start, end] 覆盖的各小时的分钟计数：{分钟起点: 阅读次数}"""
+        hours = []
+        hour = floor_time(start, 'hour')
+        while hour <= end:
+            hours.append(hour)
+            hour += SERIES_STEP_DELTAS['hour']
+
+        with pipeline() as pipe:
+            for hour in hours:
+                pipe.hgetall(_series_minute_key(article_id, hour))
+        minute_reads = {}
+        for hour, minutes in zip(hours, pipe.results):
+            for minute, reads in minutes.items():
+                minute_reads[hour.replace(minute=int(minute))] = int(reads)
+        return minute_reads
+
+    @staticmethod
+    def get_hour_totals(hour):
+        """汇总某个小时内各文章的阅读次数：{article_id: reads}"""
+        redis_conn = get_redis_connection("default")
+        article_ids = [int(article_id) for article_id in redis_conn.smembers(_series_active_key(hour))]
+        if not article_ids:
+            return {}
+        with pipeline() as pipe:
+            for article_id in article_ids:
+                pipe.hvals(_series_minute_key(article_id, hour))
+        return {
+            article_id: sum(int(reads) for reads in minutes)
+            for article_id, minutes in zip(article_ids, pipe.results)
+            if minutes
+        }
+
+    @staticmethod
+    def get_read_series(article_id, start, end, step='hour'):
+        """获取文章阅读时间序列：[(时间桶起点, 阅读次数)]
+
+        最近 STATS_SERIES_RECENT_HOURS 小时内的时间桶由Redis分钟数据聚合，
+        更早的时间桶读取汇总表（分钟粒度只保留近期数据）。
+        """
+        from .models import ReadRollup
+
+        if step not in SERIES_STEPS:
+            raise ValueError(f"Unknown series step: {step}")
+        delta = SERIES_STEP_DELTAS[step]
+        buckets = []
+        bucket = floor_time(start, step)
+        while bucket <= end:
+            buckets.append(bucket)
+            if len(buckets) > settings.STATS_SERIES_MAX_POINTS:
+                raise ValueError(f"Too many points (max {settings.STATS_SERIES_MAX_POINTS})")
+            bucket += delta
+        series = dict.fromkeys(buckets, 0)
+        if not buckets:
+            return []
+
+        now = timezone.now()
+        recent_from = now - timedelta(hours=settings.STATS_SERIES_RECENT_HOURS)
+        redis_from = floor_time(recent_from, step)
+        if redis_from < recent_from:
+            redis_from += delta
+
+        if buckets[0] < redis_from and step != 'minute':
+            rollups = ReadRollup.objects.filter(
+                article_id=article_id,
+                granularity=step,
+                bucket_start__gte=buckets[0],
+                bucket_start__lt=min(redis_from, buckets[-1] + delta),
+            ).values_list('bucket_start', 'reads')
+            for bucket_start, reads in rollups:
+                series[bucket_start] = reads
+
+        if buckets[-1] >= redis_from:
+            redis_start = max(buckets[0], redis_from)
+            minute_reads = StatsCacheService.get_minute_reads(article_id, redis_start, min(end, now))
+            for minute, reads in minute_reads.items():
+                bucket = floor_time(minute, step)
+                if bucket >= redis_start and bucket in series:
+                    series[bucket] += reads
+
+        return sorted(series.items())
+
+    @staticmethod
+    def get_leaderboard(window='all', k=10):
+        """获取排行榜前k名：[(article_id, reads)]
+
+        window: hour（当前小时）、day（当天）、24h（最近24个小时桶合并）、all（全部）
+        """
+        if window not in LEADERBOARD_WINDOWS:
+            raise ValueError(f"Unknown leaderboard window: {window}")
+        redis_conn = get_redis_connection("default")
+        now = timezone.now()
+        key = _leaderboard_key(window, now)
+        if window == '24h' and not redis_conn.exists(key):
+            # 合并最近24个小时桶，结果短暂缓存
+            hour_keys = [_leaderboard_key('hour', now - timedelta(hours=hours)) for hours in range(24)]
+            with pipeline() as pipe:
+                pipe.zunionstore(key, hour_keys)
+                pipe.expire(key, settings.STATS_LEADERBOARD_UNION_TTL)
+        entries = redis_conn.zrevrange(key, 0, k - 1, withscores=True)
+        return [(int(member), int(score)) for member, score in entries]
+
+    @staticmethod
+    def seed_leaderboard(totals):
+        """以数据库中的总阅读量（加上尚未落库的增量）校正总榜分数，totals: {article_id: total_reads}"""
+        script = _get_script(SEED_LEADERBOARD_SCRIPT)
+        key = _leaderboard_key('all')
+        with pipeline() as pipe:
+            for article_id, total_reads in totals.items():
+                script(keys=[key, _pending_key(article_id)], args=[article_id, total_reads], client=pipe)
+
+    @staticmethod
+    def get_user_read_count(article_id, user_id):
+        """获取特定用户对文章的阅读次数（仅精确模式可用）"""
+        return StatsCacheService.get_user_read_counts([(article_id, user_id)])[(article_id, user_id)]
+
+    @staticmethod
+    def get_user_read_counts(pairs):
+        """一次往返获取多个用户的阅读次数：{(article_id, user_id): read_count}，未缓存的为None（仅精确模式可用）"""
+        pairs = list(pairs)
+        if StatsCacheService.get_user_count_mode() != USER_COUNT_MODE_EXACT:
+            return dict.fromkeys(pairs)
+        hash_layout = _use_hash_layout()
+        with pipeline() as pipe:
+            for article_id, user_id in pairs:
+                _queue_get(pipe, _user_read_location(article_id, user_id))
+                if hash_layout:
+                    pipe.get(_legacy_user_key(article_id, user_id))
+        step = 2 if hash_layout else 1
+        return {pair: _sum_reads(pipe.results[index * step:(index + 1) * step]) for index, pair in enumerate(pairs)}
+
+    @staticmethod
+    def get_user_history(user_id):
+        """获取缓存的用户阅读历史：[(article_id, history_score)]，按阅读时间从新到旧排列
+
+        历史未缓存或尚未与数据库合并（没有 complete 标记）时返回None。
+        """
+        history_key, complete_key = _user_history_keys(user_id)
+        with pipeline() as pipe:
+            pipe.exists(complete_key)
+            pipe.zrevrange(history_key, 0, -1, withscores=True)
+        complete, entries = pipe.results
+        if not complete:
+            return None
+        return [(int(member), int(score)) for member, score in entries]
+
+    @staticmethod
+    def cache_user_history(user_id, entries):
+        """用数据库中的最近阅读记录 [(article_id, history_score)] 回填用户阅读历史，返回合并后的历史"""
+        args = [settings.STATS_USER_HISTORY_SIZE, settings.STATS_USER_HISTORY_TTL]
+        for article_id, score in entries:
+            args += [score, article_id]
+        result = _get_script(BACKFILL_HISTORY_SCRIPT)(keys=_user_history_keys(user_id), args=args)
+        return [(int(result[index]), int(float(result[index + 1]))) for index in range(0, len(result), 2)]
+
+    @staticmethod
+    def get_last_read_times(pairs):
+        """一次往返从用户阅读历史中读取最近阅读时间：{(article_id, user_id): datetime}，历史中没有的为None"""
+        pairs = list(pairs)
+        if not pairs or settings.STATS_USER_HISTORY_SIZE <= 0:
+            return dict.fromkeys(pairs)
+        with pipeline() as pipe:
+            for article_id, user_id in pairs:
+                pipe.zscore(_user_history_keys(user_id)[0], article_id)
+        return {pair: history_time(score) if score is not None else None
+                for pair, score in zip(pairs, pipe.results)}
+
+    @staticmethod
+    def scan_stats_keys(cursor, count):
+        """执行一步 SCAN，返回 (下一游标, 计数键所属的文章ID, 缓存了阅读次数的 (article_id, user_id), 扫描到的键数)
+
+        游标为0表示扫描完成。hash 布局的用户阅读次数哈希用 HSCAN 展开为逐用户的键值对。
+        """
+        redis_conn = get_redis_connection()
+        prefix = cache.make_key('')
+        cursor, keys = redis_conn.scan(cursor, match=f"{prefix}{RECONCILE_SCAN_PATTERN}", count=count)
+        article_ids, pairs = set(), []
+        for key in keys:
+            name = key.decode()[len(prefix):]
+            match = COUNTER_KEY_RE.match(name)
+            if match:
+                article_ids.add(int(match.group(1)))
+                continue
+            match = USER_READ_KEY_RE.match(name)
+            if match:
+                pairs.append((int(match.group(1)), match.group(2)))
+                continue
+            match = USER_READS_HASH_RE.match(name)
+            if match:
+                article_id = int(match.group(1))
+                pairs.extend((article_id, field.decode()) for field, _ in redis_conn.hscan_iter(key, count=count))
+        return cursor, sorted(article_ids), list(dict.fromkeys(pairs)), len(keys)
+
+    @staticmethod
+    def raise_cached_counts(counters=None, user_reads=None):
+        """将缓存中的计数提高到不低于数据库值加上尚未落库的增量（只校正仍在缓存中的计数），
+        返回被校正的文章数与用户数之和
+
+        counters: {article_id: (total_reads, user_count)}；user_reads: {(article_id, user_id): read_count}
+        """
+        script = _get_script(RAISE_COUNTER_SCRIPT)
+        with pipeline() as pipe:
+            for article_id, values in (counters or {}).items():
+                for name, value in zip(COUNTER_FIELDS, values):
+                    key, field = _counter_location(article_id, name)
+                    script(keys=[key, _pending_key(article_id)], args=[field or '', value, name], client=pipe)
+            for (article_id, user_id), value in (user_reads or {}).items():
+                key, field = _user_read_location(article_id, user_id)
+                script(keys=[key, _pending_key(article_id)],
+                       args=[field or '', value, f"{PENDING_USER_PREFIX}{user_id}"], client=pipe)
+        if counters:
+            local_cache.invalidate([f"article:{article_id}:{name}" for article_id in counters for name in COUNTER_FIELDS])
+        results = iter(pipe.results)
+        raised = sum(1 for _ in counters or {} if any([next(results) for _ in COUNTER_FIELDS]))
+        return raised + sum(1 for delta in results if delta)
+
+    @staticmethod
+    def get_reconcile_checkpoint():
+        """读取键空间对账的检查点（游标及累计结果），不存在时返回None"""
+        return cache.get(RECONCILE_CHECKPOINT_KEY)
+
+    @staticmethod
+    def save_reconcile_checkpoint(checkpoint):
+        cache.set(RECONCILE_CHECKPOINT_KEY, checkpoint, timeout=settings.STATS_RECONCILE_CHECKPOINT_TTL)
+
+    @staticmethod
+    def clear_reconcile_checkpoint():
+        cache.delete(RECONCILE_CHECKPOINT_KEY)
+
+    @staticmethod
+    def release_flushed(snapshot):
+        """落库成功后解除固定：为未再次变脏的文章计数设置按访问频率缩放的TTL，返回解除固定的文章数
+
+        snapshot 为 get_flush_snapshot 的结果；keys 布局下同时为已落库用户的阅读次数键设置TTL。
+        """
+        if not _use_retention() or not snapshot:
+            return 0
+        script = _get_script(RELEASE_FLUSHED_SCRIPT)
+        hash_layout = _use_hash_layout()
+        with pipeline() as pipe:
+            for article_id, (_, _, user_reads) in snapshot.items():
+                keys = [cache.make_key(DIRTY_ARTICLES_KEY), _leaderboard_key('day', timezone.now()),
+                        *_article_cache_keys(article_id)]
+                if not hash_layout:
+                    keys += [_legacy_user_key(article_id, user_id) for user_id in user_reads]
+                args = [article_id, settings.STATS_RETENTION_MIN_TTL, settings.STATS_RETENTION_MAX_TTL]
+                script(keys=keys, args=args, client=pipe)
+        return sum(1 for ttl in pipe.results if ttl >= 0)
+
+    @staticmethod
+    def evict_cold_articles(count, offset=0):
+        """按最近访问时间从旧到新淘汰 count 篇文章的缓存键，返回 (淘汰的文章数, 因尚未落库而跳过的文章数)
+
+        跳过的文章仍留在访问索引中，调用方以 offset 越过它们继续淘汰。
+        """
+        index_key = cache.make_key(ACCESS_INDEX_KEY)
+        article_ids = [int(member) for member in get_redis_connection().zrange(index_key, offset, offset + count - 1)]
+        if not article_ids:
+            return 0, 0
+        script = _get_script(EVICT_ARTICLE_SCRIPT)
+        with pipeline() as pipe:
+            for article_id in article_ids:
+                keys = [cache.make_key(DIRTY_ARTICLES_KEY), index_key, *_article_cache_keys(article_id)]
+                script(keys=keys, args=[article_id], client=pipe)
+        evicted = [article_id for article_id, result in zip(article_ids, pipe.results) if result]
+        local_cache.invalidate([f"article:{article_id}:{name}" for article_id in evicted for name in COUNTER_FIELDS])
+        return len(evicted), len(article_ids) - len(evicted)
+
+    @staticmethod
+    def prune_access_index():
+        """从访问索引中移除超过最长TTL未访问的文章（其缓存键已过期），返回移除的数量"""
+        cutoff = time.time() - settings.STATS_RETENTION_MAX_TTL
+        return get_redis_connection().zremrangebyscore(cache.make_key(ACCESS_INDEX_KEY), '-inf', cutoff)
+
+    @staticmethod
+    def get_retention_status():
+        """保留策略状态：Redis内存占用与预算、因尚未落库而固定的文章数、访问索引中的文章数"""
+        with pipeline() as pipe:
+            pipe.scard(cache.make_key(DIRTY_ARTICLES_KEY))
+            pipe.zcard(cache.make_key(ACCESS_INDEX_KEY))
+        return _retention_status(get_redis_connection().info('memory'), *pipe.results)
+
+    @staticmethod
+    def migrate_counters(article_ids):
+        """将一批文章的旧布局计数键迁移到计数哈希，返回实际迁移的文章数"""
+        with pipeline() as pipe:
+            for article_id in article_ids:
+                script, keys, args = _migrate_counters_call(article_id)
+                script(keys=keys, args=args, client=pipe)
+        return sum(1 for migrated in pipe.results if migrated)
+
+    @staticmethod
+    def migrate_user_reads(user_ids_by_article):
+        """将旧布局的用户阅读次数键迁移到各文章的用户阅读次数哈希
+
+        user_ids_by_article: {article_id: [user_id]}，返回迁移的键数
+        """
+        script = _get_script(MIGRATE_USER_READS_SCRIPT)
+        with pipeline() as pipe:
+            for article_id, user_ids in user_ids_by_article.items():
+                keys = [cache.make_key(USER_READS_KEY.format(article_id=article_id)),
+                        *[_legacy_user_key(article_id, user_id) for user_id in user_ids]]
+                script(keys=keys, args=[STATS_CACHE_TIMEOUT, *user_ids], client=pipe)
+        return sum(pipe.results)
+
@@ -0,0 +1,328 @@
+# blog_stats/spool.py
+"""缓存不可用时的本地阅读事件暂存（spool）
+
+Redis不可用时阅读事件追加写入本地文件，而不是在请求路径上同步写数据库。每个进程写自己的分段文件
+（写入中为 .open，写满或封存后重命名为 .log），每条记录带CRC校验，写入后立即 flush 到操作系统，
+fsync 按时间间隔批量执行。目录总大小超过上限时拒绝写入并计为溢出，由调用方改为直接写数据库。
+
+Redis恢复后由后台线程（或 manage.py stats_spool --replay）按分段重放：合并为增量后批量写入，
+每批完成后原子地更新 .offset 文件，进程崩溃后从偏移处继续；重放语义为至少一次，
+崩溃发生在写入与更新偏移之间时该批会重复计数。
+
+分段的归属与重放互斥依赖 fcntl 文件锁；非POSIX平台（没有 fcntl）退化为不加锁：
+不封存其他进程遗留的写入中分段，且同一目录应只有一个进程执行重放。
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_SUFFIX = '.open'
+SEALED_SUFFIX = '.log'
+OFFSET_SUFFIX = '.offset'
+
+
+def encode_record(article_id, user_id, count):
+    """编码一条记录：JSON数组 + 制表符 + CRC32 + 换行"""
+    payload = json.dumps([article_id, user_id, count], separators=(',', ':')).encode()
+    return payload + f"\t{zlib.crc32(payload):08x}\n".encode()
+
+
+def decode_record(line):
+    """解码一条记录，返回 (article_id, user_id, count)；记录被截断或校验失败时返回None"""
+    if not line.endswith(b'\n'):
+        return None
+    payload, _, checksum = line[:-1].rpartition(b'\t')
+    if not payload or checksum != f"{zlib.crc32(payload):08x}".encode():
+        return None
+    try:
+        article_id, user_id, count = json.loads(payload)
+    except ValueError:
+        return None
+    return article_id, user_id, count
+
+
+def _try_lock(file):
+    """尝试获取文件的排他锁，已被其他进程持有时返回False（不支持文件锁时总是返回True）"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+class ReadSpool:
+    """按进程分段追加写入的本地阅读事件文件"""
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, max_bytes=512 * 1024 * 1024,
+                 fsync_interval_ms=100):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.overflowed = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._pid = None
+        self._seq = 0
+        self._written = 0
+        self._other_bytes = 0
+        self._last_fsync = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        metrics.SPOOL_BYTES.set_function(lambda: self.size)
+
+    def append(self, article_id, user_id, count=1):
+        """追加一条阅读事件，超过目录大小上限时不写入并返回False"""
+        record = encode_record(article_id, user_id, count)
+        with self._lock:
+            self._ensure_segment()
+            if self._other_bytes + self._written + len(record) > self.max_bytes:
+                self.overflowed += count
+                metrics.SPOOL_EVENTS.inc(count, result='overflow')
+                return False
+            self._file.write(record)
+            # 写入操作系统缓存，进程崩溃不丢失；fsync 按间隔批量执行
+            self._file.flush()
+            self._written += len(record)
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_fsync = time.monotonic()
+            if self._written >= self.segment_bytes:
+                self._seal()
+        metrics.SPOOL_EVENTS.inc(count, result='spooled')
+        return True
+
+    def seal(self):
+        """封存当前进程正在写入的分段，使其可以被重放"""
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._seal()
+
+    def segments(self):
+        """目录中的分段文件：[(文件名, 大小, 已重放偏移)]，按写入顺序排列"""
+        segments = []
+        for entry in sorted(os.scandir(self.directory), key=lambda entry: entry.name):
+            if entry.name.endswith((ACTIVE_SUFFIX, SEALED_SUFFIX)):
+                segments.append((entry.name, entry.stat().st_size, self._read_offset(entry.path)))
+        return segments
+
+    @property
+    def size(self):
+        """目录中待重放的字节数"""
+        return sum(size - offset for _, size, offset in self.segments())
+
+    def has_pending(self):
+        return self._written > 0 or any(size > offset for _, size, offset in self.segments())
+
+    def replay(self, apply, batch_size=5000):
+        """重放全部可重放的分段，apply(deltas) 写入合并后的增量 {(article_id, user_id): count}
+
+        apply 抛出异常时停止重放并向上抛出，已完成的批次不会重复写入。返回重放的阅读次数。
+        """
+        self.seal()
+        self._seal_abandoned()
+        replayed = 0
+        for name, _, _ in self.segments():
+            if name.endswith(SEALED_SUFFIX):
+                replayed += self._replay_segment(os.path.join(self.directory, name), apply, batch_size)
+        with self._lock:
+            self._other_bytes = self._scan_other_bytes()
+        return replayed
+
+    def close(self):
+        self.seal()
+
+    def _ensure_segment(self):
+        """按进程打开新的分段（fork 出的子进程不沿用父进程的文件）"""
+        if self._file is not None and self._pid == os.getpid():
+            return
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._seq = 0
+        self._seq += 1
+        name = f"reads-{time.time_ns()}-{self._pid}-{self._seq}{ACTIVE_SUFFIX}"
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path, 'ab')
+        # 持有锁表示写入进程仍存活，重放时不会封存该分段
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self._written = 0
+        self._other_bytes = self._scan_other_bytes()
+
+    def _seal(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if fcntl is None:
+            # 没有文件锁需要保持，先关闭（部分平台不能重命名已打开的文件）
+            self._file.close()
+        if self._written:
+            os.rename(self._path, self._path[:-len(ACTIVE_SUFFIX)] + SEALED_SUFFIX)
+        else:
+            os.remove(self._path)
+        self._file.close()
+        self._other_bytes += self._written
+        self._file = self._path = None
+        self._written = 0
+        self._last_fsync = time.monotonic()
+
+    def _seal_abandoned(self):
+        """封存已退出进程遗留的写入中分段（其文件锁已释放）；不支持文件锁时无法判断写入进程是否存活，不封存"""
+        if fcntl is None:
+            return
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(ACTIVE_SUFFIX) or entry.path == self._path:
+                continue
+            try:
+                with open(entry.path, 'rb') as file:
+                    if _try_lock(file):
+                        os.rename(entry.path, entry.path[:-len(ACTIVE_SUFFIX)] + SEALED_SUFFIX)
+            except FileNotFoundError:
+                # 已被其他进程封存
+                continue
+
+    def _replay_segment(self, path, apply, batch_size):
+        replayed = 0
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            # 已被其他进程重放完毕
+            return 0
+        with file:
+            # 其他进程正在重放该分段，或在加锁前已重放完毕
+            if not _try_lock(file) or not os.path.exists(path):
+                return 0
+            offset = self._read_offset(path)
+            file.seek(offset)
+            while True:
+                deltas = {}
+                events = 0
+                while events < batch_size:
+                    line = file.readline()
+                    if not line:
+                        break
+                    offset += len(line)
+                    record = decode_record(line)
+                    if record is None:
+                        metrics.SPOOL_CORRUPT_RECORDS.inc()
+                        continue
+                    article_id, user_id, count = record
+                    deltas[(article_id, user_id)] = deltas.get((article_id, user_id), 0) + count
+                    events += count
+                if deltas:
+                    apply(deltas)
+                    replayed += events
+                    metrics.SPOOL_REPLAYED.inc(events)
+                if events < batch_size:
+                    break
+                self._write_offset(path, offset)
+            os.remove(path)
+            if os.path.exists(path + OFFSET_SUFFIX):
+                os.remove(path + OFFSET_SUFFIX)
+        return replayed
+
+    def _read_offset(self, path):
+        try:
+            with open(path + OFFSET_SUFFIX) as file:
+                return int(file.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_offset(self, path, offset):
+        """写临时文件并 fsync 后原子替换，崩溃时偏移文件不会处于半写状态"""
+        temporary = f"{path}{OFFSET_SUFFIX}.tmp"
+        with open(temporary, 'w') as file:
+            file.write(str(offset))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path + OFFSET_SUFFIX)
+
+    def _scan_other_bytes(self):
+        return sum(size for name, size, _ in self.segments()
+                   if self._path is None or name != os.path.basename(self._path))
+
+
+class SpoolReplayer:
+    """后台线程：有待重放的事件且Redis可用时重放到Redis"""
+
+    def __init__(self, spool, interval=5.0, batch_size=5000):
+        self.spool = spool
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_started(self):
+        """按进程启动后台线程（兼容 fork 后的 worker 进程）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='stats-spool-replayer', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.replay_if_healthy()
+            except Exception as e:
+                logger.warning(f"Spool replay stopped: {str(e)}")
+
+    def replay_if_healthy(self):
+        """Redis可用时重放，返回重放的阅读次数"""
+        from .redis_client import get_redis_connection
+        from .services import StatsCacheService
+
+        if not self.spool.has_pending():
+            return 0
+        get_redis_connection().ping()
+        replayed = self.spool.replay(StatsCacheService.increment_reads_bulk, self.batch_size)
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled reads into Redis")
+        return replayed
+
+
+_read_spool = None
+_replayer = None
+_spool_lock = threading.Lock()
+
+
+def get_read_spool():
+    """获取当前进程的阅读事件暂存，并确保后台重放线程已启动"""
+    global _read_spool, _replayer
+    if _read_spool is None:
+        with _spool_lock:
+            if _read_spool is None:
+                _read_spool = ReadSpool(
+                    settings.STATS_SPOOL_DIR,
+                    segment_bytes=settings.STATS_SPOOL_SEGMENT_BYTES,
+                    max_bytes=settings.STATS_SPOOL_MAX_BYTES,
+                    fsync_interval_ms=settings.STATS_SPOOL_FSYNC_INTERVAL_MS,
+                )
+                _replayer = SpoolReplayer(
+                    _read_spool,
+                    interval=settings.STATS_SPOOL_REPLAY_INTERVAL,
+                    batch_size=settings.STATS_SPOOL_REPLAY_BATCH_SIZE,
+                )
+                # worker 退出时封存正在写入的分段
+                atexit.register(_read_spool.close)
+    _replayer.ensure_started()
+    return _read_spool
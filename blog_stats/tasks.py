@@ -1,51 +1,680 @@
-# blog_stats/tasks.py
-from celery import shared_task
-from .models import ArticleStats, UserRead
-from .services import StatsCacheService
-import logging
-
-logger = logging.getLogger(__name__)
-
-
-@shared_task(bind=True, max_retries=3)
-def async_update_stats(self, article_id, user_id):
-    try:
-        # 从缓存获取最新数据
-        total_reads = StatsCacheService.get_total_reads(article_id)
-        user_count = StatsCacheService.get_user_count(article_id)
-
-        # 更新数据库
-        article_stats, created = ArticleStats.objects.get_or_create(
-            article_id=article_id,
-            defaults={
-                'total_reads': total_reads or 0,
-                'user_count': user_count or 0
-            }
-        )
-
-        if not created:
-            if total_reads is not None:
-                article_stats.total_reads = total_reads
-            if user_count is not None:
-                article_stats.user_count = user_count
-            article_stats.save()
-
-        # 更新用户阅读记录
-        user_read, created = UserRead.objects.get_or_create(
-            article_id=article_id,
-            user_id=user_id,
-            defaults={'read_count': 0}
-        )
-
-        # 获取用户的阅读次数
-        user_read_count = StatsCacheService.get_user_count(article_id)
-        if user_read_count is not None:
-            user_read.read_count = user_read_count
-        else:
-            user_read.read_count += 1
-
-        user_read.save()
-
-    except Exception as exc:
-        logger.error(f"Failed to update stats for article {article_id}: {str(exc)}")
-        raise self.retry(exc=exc, countdown=60)
+# blog_stats/tasks.py
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import metrics
+from .buffer import get_task_batcher
+from .models import ArticleStats, GlobalStats, ReadRollup, UserRead
+from .services import USER_COUNT_MODE_APPROXIMATE, StatsCacheService, floor_time, histogram_bucket
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _upsert_options(update_fields, unique_fields):
+    """bulk_create 冲突更新参数（MySQL 的 ON DUPLICATE KEY UPDATE 不支持指定唯一字段）"""
+    options = {'update_conflicts': True, 'update_fields': update_fields}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = unique_fields
+    return options
+
+
+def write_flush_snapshot(snapshot):
+    """将增量快照以 F() 表达式累加到数据库，返回 (文章行数, 用户行数)
+
+    精确模式按用户累加阅读次数，用户数按数据库中新插入的阅读记录计算；近似模式只累加文章计数。
+    last_read 取用户阅读历史中记录的阅读时间，历史中没有时取当前时间。
+    """
+    exact = StatsCacheService.get_user_count_mode() != USER_COUNT_MODE_APPROXIMATE
+    user_deltas, article_deltas = {}, {}
+    for article_id, (total_reads, user_count, user_reads) in snapshot.items():
+        if exact:
+            user_deltas.update(((article_id, user_id), count) for user_id, count in user_reads.items() if count)
+            # 不属于任何用户的增量直接累加到文章计数
+            total_reads -= sum(user_reads.values())
+            user_count = 0
+        if total_reads or user_count:
+            article_deltas[article_id] = (total_reads, user_count)
+    last_read_times = StatsCacheService.get_last_read_times(user_deltas)
+
+    with transaction.atomic():
+        StatsCacheService.increment_reads_db_bulk(user_deltas, last_read_times)
+        StatsCacheService.increment_articles_db_bulk(article_deltas)
+    return len({article_id for article_id, _ in user_deltas} | set(article_deltas)), len(user_deltas)
+
+
+def sync_flushed_counts(snapshot):
+    """落库后将缓存中的计数及总榜分数提高到数据库值加上尚未落库的增量，返回计数的校正数
+
+    计数键过期或被淘汰后从0重新计数，落库后即恢复为完整的计数。
+    """
+    pairs = {(article_id, user_id) for article_id, (_, _, user_reads) in snapshot.items() for user_id in user_reads}
+    counters = {
+        article_id: (total_reads, user_count)
+        for article_id, total_reads, user_count in ArticleStats.objects.filter(
+            article_id__in=list(snapshot)).values_list('article_id', 'total_reads', 'user_count')
+    }
+    user_reads = {}
+    if pairs:
+        user_reads = {
+            (article_id, user_id): read_count
+            for article_id, user_id, read_count in UserRead.objects.filter(
+                article_id__in={article_id for article_id, _ in pairs},
+                user_id__in={user_id for _, user_id in pairs},
+            ).values_list('article_id', 'user_id', 'read_count')
+            if (article_id, user_id) in pairs
+        }
+    StatsCacheService.seed_leaderboard({article_id: total_reads for article_id, (total_reads, _) in counters.items()})
+    return StatsCacheService.raise_cached_counts(counters=counters, user_reads=user_reads)
+
+
+@shared_task(ignore_result=True)
+def flush_dirty_stats(batch_size=None):
+    """分批将Redis中标记为脏的文章的阅读增量累加到数据库"""
+    batch_size = batch_size or settings.STATS_FLUSH_BATCH_SIZE
+    started = time.monotonic()
+    articles = article_rows = user_rows = 0
+
+    while True:
+        article_ids = StatsCacheService.pop_dirty_articles(batch_size)
+        if not article_ids:
+            break
+        try:
+            snapshot = StatsCacheService.get_flush_snapshot(article_ids)
+            written_articles, written_users = write_flush_snapshot(snapshot)
+        except Exception as exc:
+            logger.error(f"Failed to flush stats for {len(article_ids)} articles: {str(exc)}")
+            StatsCacheService.restore_dirty_articles(article_ids)
+            break
+        articles += len(article_ids)
+        article_rows += written_articles
+        user_rows += written_users
+        try:
+            StatsCacheService.complete_flush(article_ids)
+            sync_flushed_counts(snapshot)
+            StatsCacheService.release_flushed(snapshot)
+        except Exception as exc:
+            # 增量已写入数据库；flushing 哈希未能删除时，这批增量会在文章下次落库时重复累加
+            logger.error(f"Failed to complete flush for {len(article_ids)} articles: {str(exc)}")
+            break
+
+    if articles:
+        persist_global_stats()
+
+    report = {
+        'articles': articles,
+        'article_rows': article_rows,
+        'user_rows': user_rows,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 2),
+    }
+    metrics.TASK_SECONDS.observe(time.monotonic() - started, task='flush_dirty_stats')
+    metrics.TASK_ROWS.inc(article_rows, table='article_stats')
+    metrics.TASK_ROWS.inc(user_rows, table='user_read')
+    logger.info(f"Flushed dirty stats: {report}")
+    return report
+
+
+def persist_global_stats(**extra):
+    """将Redis中的全站计数写入汇总表"""
+    values = {name: value for name, value in StatsCacheService.get_global_stats().items() if value is not None}
+    values.update(extra)
+    values['last_updated'] = timezone.now()
+    GlobalStats.objects.update_or_create(pk=1, defaults=values)
+
+
+@shared_task(ignore_result=True)
+def rebuild_read_histogram(article_id=None):
+    """从数据库重建一篇文章（article_id 为 None 时为全站）的阅读次数直方图"""
+    StatsCacheService.load_read_histogram(article_id)
+
+
+def rebuild_read_histograms():
+    """从数据库重建全站及各文章的阅读次数直方图，返回重建的文章数"""
+    StatsCacheService.load_read_histogram()
+
+    article_id, histogram, articles = None, {}, 0
+    grouped = UserRead.objects.filter(read_count__gt=0).values('article_id', 'read_count').annotate(
+        readers=Count('id')).order_by('article_id')
+    for item in grouped.iterator(chunk_size=settings.STATS_FLUSH_BATCH_SIZE):
+        if item['article_id'] != article_id:
+            if article_id is not None:
+                StatsCacheService.cache_read_histogram(histogram, article_id)
+                articles += 1
+            article_id, histogram = item['article_id'], {}
+        bucket = histogram_bucket(item['read_count'])
+        histogram[bucket] = histogram.get(bucket, 0) + item['readers']
+    if article_id is not None:
+        StatsCacheService.cache_read_histogram(histogram, article_id)
+        articles += 1
+    return articles
+
+
+# 请求路径上入队全站计数对账、直方图重建（scope 为文章ID或 global）的去重标记
+GLOBAL_RECONCILE_ENQUEUED_KEY = "stats:global:reconcile:enqueued"
+HISTOGRAM_REBUILD_ENQUEUED_KEY = "stats:histogram_rebuild:{scope}:enqueued"
+
+
+def _enqueue_once(key, timeout, task, *args):
+    """在请求路径上触发后台任务：timeout 秒内同一 key 只入队一次，返回是否入队
+
+    入队失败只记录日志，timeout 秒后由下一个请求重试，不在消息队列不可用时反复阻塞请求。
+    """
+    try:
+        if not cache.add(key, 1, timeout=timeout):
+            return False
+        task.delay(*args)
+    except Exception as e:
+        logger.error(f"Failed to enqueue {task.name}: {str(e)}")
+        return False
+    return True
+
+
+def enqueue_histogram_rebuild(article_id=None):
+    """入队一次文章（article_id 为 None 时为全站）阅读次数直方图的重建（直方图未缓存时由视图调用）"""
+    key = HISTOGRAM_REBUILD_ENQUEUED_KEY.format(scope='global' if article_id is None else article_id)
+    return _enqueue_once(key, settings.STATS_HISTOGRAM_REBUILD_ENQUEUE_TTL, rebuild_read_histogram, article_id)
+
+
+def enqueue_global_reconcile():
+    """入队一次全站计数对账（缓存与汇总表都为空时由视图调用，对账本身由 worker 执行）"""
+    return _enqueue_once(GLOBAL_RECONCILE_ENQUEUED_KEY, settings.STATS_GLOBAL_RECONCILE_ENQUEUE_TTL,
+                         reconcile_global_stats)
+
+
+@shared_task(ignore_result=True)
+def reconcile_global_stats():
+    """以数据库为准校正全站计数，修正增量维护产生的偏差
+
+    校正前先落库脏计数，以免覆盖尚未写入数据库的增量。近似模式下读者数以全站HyperLogLog为准。
+    """
+    started = time.monotonic()
+    flush_dirty_stats()
+
+    before = StatsCacheService.get_global_stats()
+    total_reads = ArticleStats.objects.aggregate(total=Sum('total_reads'))['total'] or 0
+    if StatsCacheService.get_user_count_mode() == USER_COUNT_MODE_APPROXIMATE:
+        total_users = active_users = StatsCacheService.get_approximate_global_readers()
+    else:
+        total_users = UserRead.objects.values('user_id').distinct().count()
+        active_users = UserRead.objects.filter(read_count__gt=0).values('user_id').distinct().count()
+
+    StatsCacheService.set_global_stats(total_reads, total_users, active_users)
+    persist_global_stats(last_reconciled=timezone.now())
+    if StatsCacheService.get_user_count_mode() != USER_COUNT_MODE_APPROXIMATE:
+        rebuild_read_histograms()
+
+    after = {'total_reads': total_reads, 'total_users': total_users, 'active_users': active_users}
+    report = {
+        'drift': {name: value - (before[name] or 0) for name, value in after.items()},
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 2),
+        **after,
+    }
+    metrics.TASK_SECONDS.observe(time.monotonic() - started, task='reconcile_global_stats')
+    logger.info(f"Reconciled global stats: {report}")
+    return report
+
+
+def reconcile_stats_batch(article_ids, pairs, dry_run=False):
+    """对比一批文章计数及用户阅读次数在Redis与数据库中的值，双方都校正为较大值
+
+    计数只增不减。缓存中的计数与尚未落库的增量在一个事务内读取，减去增量后与数据库比较（增量由落库累加，
+    不在此写入）：缓存较大说明有阅读未能落库，写入数据库；数据库较大说明缓存过期后从0重新计数，将缓存中的计数
+    提高到数据库的值加上增量。正在落库的文章本轮跳过。数据库行在事务内加锁后比较，不会覆盖并发落库写入的更大值。
+    精确模式下用户数以数据库中的阅读记录为准（缓存中的用户键过期后，同一用户再次阅读会被重复计入缓存的用户数），
+    按阅读记录重新计算。返回各项校正数。
+    """
+    cached_stats, cached_reads, pending = StatsCacheService.get_reconcile_snapshot(article_ids, pairs)
+    cached_stats = {
+        article_id: (max(total_reads - pending[article_id][0], 0), max(user_count - pending[article_id][1], 0))
+        for article_id, (total_reads, user_count) in cached_stats.items()
+        if pending[article_id] is not None
+    }
+    cached_reads = {
+        pair: max(read_count - pending[pair[0]][2].get(pair[1], 0), 0)
+        for pair, read_count in cached_reads.items()
+        if read_count is not None and pending[pair[0]] is not None
+    }
+    exact = StatsCacheService.get_user_count_mode() != USER_COUNT_MODE_APPROXIMATE
+    report = {'db_articles': 0, 'db_user_reads': 0, 'cache_articles': 0, 'cache_user_reads': 0}
+    raise_counters, raise_reads = {}, {}
+    now = timezone.now()
+    # 只统计差异时不锁定数据库行
+    articles = ArticleStats.objects if dry_run else ArticleStats.objects.select_for_update()
+    user_reads = UserRead.objects if dry_run else UserRead.objects.select_for_update()
+
+    with transaction.atomic():
+        article_ids = set(cached_stats) | {article_id for article_id, _ in cached_reads}
+        rows = {row.article_id: row for row in articles.filter(article_id__in=article_ids)}
+        missing = [article_id for article_id in article_ids if article_id not in rows]
+        if missing and not dry_run:
+            # 先插入缺失的文章行（阅读记录的外键依赖文章行），再加锁读取，包含并发落库插入的值
+            ArticleStats.objects.bulk_create(
+                [ArticleStats(article_id=article_id, last_updated=now) for article_id in missing], ignore_conflicts=True)
+            rows.update((row.article_id, row) for row in articles.filter(article_id__in=missing))
+
+        stored_reads = {
+            (row.article_id, row.user_id): row for row in user_reads.filter(
+                article_id__in={article_id for article_id, _ in cached_reads},
+                user_id__in={user_id for _, user_id in cached_reads},
+            ) if (row.article_id, row.user_id) in cached_reads
+        }
+        created_reads, updated_reads = [], []
+        for pair, read_count in cached_reads.items():
+            row = stored_reads.get(pair)
+            if row is None:
+                if read_count > 0:
+                    created_reads.append(UserRead(article_id=pair[0], user_id=pair[1], read_count=read_count,
+                                                  last_read=now))
+            elif read_count > row.read_count:
+                row.read_count = read_count
+                updated_reads.append(row)
+            elif row.read_count > read_count:
+                raise_reads[pair] = row.read_count
+        report['db_user_reads'] = len(created_reads) + len(updated_reads)
+        if not dry_run:
+            UserRead.objects.bulk_create(created_reads, ignore_conflicts=True)
+            UserRead.objects.bulk_update(updated_reads, ['read_count'])
+
+        user_counts = {}
+        if exact:
+            user_counts = dict(
+                UserRead.objects.filter(article_id__in=article_ids, read_count__gt=0).values('article_id')
+                .annotate(users=Count('id')).order_by().values_list('article_id', 'users')
+            )
+            if dry_run:
+                for read in created_reads:
+                    user_counts[read.article_id] = user_counts.get(read.article_id, 0) + 1
+
+        # 只校正本批扫描到计数、新插入文章行或新增阅读记录的文章，其余文章在扫描到其计数时校正
+        changed = []
+        for article_id in set(cached_stats) | set(missing) | {read.article_id for read in created_reads}:
+            row = rows.get(article_id)
+            stored = (row.total_reads, row.user_count) if row is not None else (0, 0)
+            cached = cached_stats.get(article_id)
+            total_reads = max(cached[0], stored[0]) if cached is not None else stored[0]
+            if exact:
+                user_count = user_counts.get(article_id, 0)
+            else:
+                user_count = max(cached[1], stored[1]) if cached is not None else stored[1]
+            if article_id in missing or (total_reads, user_count) != stored:
+                row = row or ArticleStats(article_id=article_id)
+                row.total_reads, row.user_count, row.last_updated = total_reads, user_count, now
+                changed.append(row)
+            if cached is not None and (total_reads > cached[0] or user_count > cached[1]):
+                raise_counters[article_id] = (total_reads, user_count)
+        report['db_articles'] = len(changed)
+        if not dry_run:
+            ArticleStats.objects.bulk_update(changed, ['total_reads', 'user_count', 'last_updated'])
+
+    if dry_run:
+        report['cache_articles'], report['cache_user_reads'] = len(raise_counters), len(raise_reads)
+    else:
+        report['cache_articles'] = StatsCacheService.raise_cached_counts(counters=raise_counters)
+        report['cache_user_reads'] = StatsCacheService.raise_cached_counts(user_reads=raise_reads)
+    return report
+
+
+@shared_task(ignore_result=True)
+def reconcile_stats_keyspace(batch_size=None, max_keys_per_second=None, max_seconds=None, restart=False,
+                             dry_run=False):
+    """用 SCAN 分批遍历Redis中的文章计数与用户阅读次数，与数据库逐批对账（见 reconcile_stats_batch）
+
+    每批完成后将游标及累计结果保存为检查点，中断后从检查点继续；扫描速率限制为每秒 max_keys_per_second 个键，
+    单次执行超过 max_seconds 秒时保存检查点后退出，由下一次执行继续（0 表示不限制）。dry_run 只统计差异，
+    不读写检查点。
+    """
+    batch_size = batch_size or settings.STATS_RECONCILE_BATCH_SIZE
+    if max_keys_per_second is None:
+        max_keys_per_second = settings.STATS_RECONCILE_MAX_KEYS_PER_SECOND
+    if max_seconds is None:
+        max_seconds = settings.STATS_RECONCILE_MAX_SECONDS
+    started = time.monotonic()
+
+    checkpoint = None if restart or dry_run else StatsCacheService.get_reconcile_checkpoint()
+    report = checkpoint or {
+        'cursor': 0, 'keys': 0, 'articles': 0, 'user_reads': 0,
+        'db_articles': 0, 'db_user_reads': 0, 'cache_articles': 0, 'cache_user_reads': 0,
+    }
+    report['resumed'] = checkpoint is not None
+    scanned = 0
+    while True:
+        cursor, article_ids, pairs, keys = StatsCacheService.scan_stats_keys(report['cursor'], batch_size)
+        corrections = reconcile_stats_batch(article_ids, pairs, dry_run)
+        for name, value in corrections.items():
+            report[name] += value
+        if not dry_run:
+            metrics.TASK_ROWS.inc(corrections['db_articles'], table='article_stats')
+            metrics.TASK_ROWS.inc(corrections['db_user_reads'], table='user_read')
+        report['cursor'] = cursor
+        report['keys'] += keys
+        report['articles'] += len(article_ids)
+        report['user_reads'] += len(pairs)
+        scanned += keys
+
+        report['complete'] = cursor == 0
+        if report['complete']:
+            if not dry_run:
+                StatsCacheService.clear_reconcile_checkpoint()
+            break
+        if not dry_run:
+            StatsCacheService.save_reconcile_checkpoint(report)
+        elapsed = time.monotonic() - started
+        if max_seconds and elapsed >= max_seconds:
+            break
+        # 限速：按已扫描的键数计算应耗费的时间，超前时等待
+        if max_keys_per_second:
+            time.sleep(max(0.0, scanned / max_keys_per_second - elapsed))
+
+    report['elapsed_ms'] = round((time.monotonic() - started) * 1000, 2)
+    metrics.TASK_SECONDS.observe(time.monotonic() - started, task='reconcile_stats_keyspace')
+    logger.info(f"Reconciled stats keyspace: {report}")
+    return report
+
+
+@shared_task(ignore_result=True)
+def enforce_stats_memory_budget(batch_size=None):
+    """Redis已用内存超过 STATS_MEMORY_BUDGET_BYTES 时，从最久未访问的文章开始淘汰其缓存键，直到回到预算内
+
+    有尚未落库计数的文章不会被淘汰。仅在启用保留策略（STATS_RETENTION_ENABLED）并设置了预算时执行。
+    """
+    budget = settings.STATS_MEMORY_BUDGET_BYTES
+    if not settings.STATS_RETENTION_ENABLED or not budget:
+        return None
+    batch_size = batch_size or settings.STATS_RETENTION_EVICT_BATCH_SIZE
+    started = time.monotonic()
+
+    pruned = StatsCacheService.prune_access_index()
+    used_memory, _ = StatsCacheService.get_memory_usage()
+    report = {'budget_bytes': budget, 'used_memory_before': used_memory, 'pruned': pruned,
+              'evicted': 0, 'skipped_dirty': 0}
+    offset = 0
+    while used_memory > budget:
+        evicted, skipped = StatsCacheService.evict_cold_articles(batch_size, offset)
+        if not evicted and not skipped:
+            break
+        offset += skipped
+        report['evicted'] += evicted
+        report['skipped_dirty'] += skipped
+        used_memory, _ = StatsCacheService.get_memory_usage()
+
+    report.update(
+        used_memory_after=used_memory,
+        over_budget=used_memory > budget,
+        elapsed_ms=round((time.monotonic() - started) * 1000, 2),
+    )
+    metrics.TASK_SECONDS.observe(time.monotonic() - started, task='enforce_stats_memory_budget')
+    metrics.RETENTION_EVICTIONS.inc(report['evicted'], result='evicted')
+    metrics.RETENTION_EVICTIONS.inc(report['skipped_dirty'], result='skipped_dirty')
+    if report['evicted'] or report['over_budget']:
+        logger.info(f"Enforced stats memory budget: {report}")
+    return report
+
+
+@shared_task(ignore_result=True)
+def compact_read_series(lookback_hours=None):
+    """将Redis中已结束小时的分钟计数汇总为小时/天粒度并写入汇总表（可重复执行）"""
+    lookback_hours = lookback_hours or settings.STATS_SERIES_COMPACT_LOOKBACK_HOURS
+    started = time.monotonic()
+    current_hour = floor_time(timezone.now(), 'hour')
+    hour_rows = day_rows = 0
+    days = set()
+
+    for offset in range(lookback_hours, 0, -1):
+        hour = current_hour - timedelta(hours=offset)
+        totals = StatsCacheService.get_hour_totals(hour)
+        if not totals:
+            continue
+        ReadRollup.objects.bulk_create(
+            [ReadRollup(article_id=article_id, granularity='hour', bucket_start=hour, reads=reads)
+             for article_id, reads in totals.items()],
+            **_upsert_options(['reads'], ['article_id', 'granularity', 'bucket_start'])
+        )
+        hour_rows += len(totals)
+        days.add(floor_time(hour, 'day'))
+
+    for day in days:
+        daily_totals = ReadRollup.objects.filter(
+            granularity='hour',
+            bucket_start__gte=day,
+            bucket_start__lt=day + timedelta(days=1),
+        ).values('article_id').annotate(total=Sum('reads'))
+        rows = [ReadRollup(article_id=item['article_id'], granularity='day', bucket_start=day, reads=item['total'])
+                for item in daily_totals]
+        ReadRollup.objects.bulk_create(
+            rows,
+            **_upsert_options(['reads'], ['article_id', 'granularity', 'bucket_start'])
+        )
+        day_rows += len(rows)
+
+    report = {
+        'hour_rows': hour_rows,
+        'day_rows': day_rows,
+        'elapsed_ms': round((time.monotonic() - started) * 1000, 2),
+    }
+    metrics.TASK_SECONDS.observe(time.monotonic() - started, task='compact_read_series')
+    metrics.TASK_ROWS.inc(hour_rows + day_rows, table='read_rollup')
+    logger.info(f"Compacted read series: {report}")
+    return report
+
+
+@shared_task(bind=True, max_retries=3, ignore_result=True)
+def async_update_stats(self, article_id, user_id):
+    """单次阅读的落库任务，保留以处理已入队的消息；与 async_update_stats_batch 相同按增量累加"""
+    try:
+        write_stats_chunk({int(article_id): {user_id: 1}})
+    except Exception as exc:
+        logger.error(f"Failed to update stats for article {article_id}: {str(exc)}")
+        raise self.retry(exc=exc, countdown=60)
+
+
+def write_stats_chunk(user_reads_by_article):
+    """在一个事务内将一组文章的阅读增量以 F() 表达式累加到数据库
+
+    user_reads_by_article: {article_id: {user_id: 阅读次数增量}}，没有增量的文章只确保计数行存在。
+    事件对应的阅读已计入Redis的待落库增量，提交前先从增量中扣除，避免 flush_dirty_stats 重复累加；
+    扣除失败时事务回滚，提交失败时把扣除的增量加回，重试本批不会重复计数。
+    返回 (文章行数, 用户行数)。
+    """
+    deltas = {(article_id, user_id): count
+              for article_id, users in user_reads_by_article.items() for user_id, count in users.items() if count}
+    last_read_times = StatsCacheService.get_last_read_times(deltas)
+    pending_reads = {article_id: users for article_id, users in user_reads_by_article.items() if users}
+
+    new_users_by_article = None
+    try:
+        with transaction.atomic():
+            ArticleStats.objects.bulk_create(
+                [ArticleStats(article_id=article_id) for article_id in user_reads_by_article],
+                ignore_conflicts=True
+            )
+            new_pairs = StatsCacheService.increment_reads_db_bulk(deltas, last_read_times)
+
+            new_users = {}
+            for article_id, _ in new_pairs:
+                new_users[article_id] = new_users.get(article_id, 0) + 1
+            StatsCacheService.offset_pending(pending_reads, new_users)
+            new_users_by_article = new_users
+    except Exception:
+        if new_users_by_article is not None:
+            try:
+                StatsCacheService.offset_pending(
+                    {article_id: {user_id: -count for user_id, count in users.items()}
+                     for article_id, users in pending_reads.items()},
+                    {article_id: -count for article_id, count in new_users_by_article.items()}
+                )
+            except Exception as e:
+                # 数据库与待落库增量都缺少本批阅读，缓存计数仍包含它们，由对账按缓存计数补齐
+                logger.error(f"Failed to restore pending stats for {len(user_reads_by_article)} articles: {str(e)}")
+        raise
+    return len(user_reads_by_article), len(deltas)
+
+
+def enqueue_stats_update(article_id, user_id, count=1):
+    """将一次阅读的落库加入合并窗口，窗口结束时批量入队 async_update_stats_batch（替代逐条 async_update_stats.delay）
+
+    未启用 STATS_TASK_BATCH_ENABLED 时不入队，阅读由 flush_dirty_stats 定时落库。
+    """
+    if settings.STATS_TASK_BATCH_ENABLED:
+        get_task_batcher().add(article_id, user_id, count)
+
+
+@shared_task(bind=True, max_retries=3, ignore_result=True)
+def async_update_stats_batch(self, events=None, article_ids=None):
+    """async_update_stats 的批量版本：一条消息处理多篇文章
+
+    events: [[article_id, user_id, count], ...]（count 可省略，缺省为1）；article_ids: 只确保文章计数行存在。
+    按文章分组后每 STATS_TASK_CHUNK_ARTICLES 篇文章一个事务；失败时只重试尚未写入的文章。
+    """
+    user_reads_by_article = {}
+    for article_id, user_id, *count in events or []:
+        users = user_reads_by_article.setdefault(int(article_id), {})
+        users[user_id] = users.get(user_id, 0) + (count[0] if count else 1)
+    for article_id in article_ids or []:
+        user_reads_by_article.setdefault(int(article_id), {})
+
+    started = time.monotonic()
+    ordered = sorted(user_reads_by_article)
+    chunk_size = settings.STATS_TASK_CHUNK_ARTICLES
+    article_rows = user_rows = 0
+    for start in range(0, len(ordered), chunk_size):
+        chunk = {article_id: user_reads_by_article[article_id] for article_id in ordered[start:start + chunk_size]}
+        try:
+            written_articles, written_users = write_stats_chunk(chunk)
+        except Exception as exc:
+            logger.error(f"Failed to update stats for {len(chunk)} articles: {str(exc)}")
+            remaining = ordered[start:]
+            raise self.retry(exc=exc, countdown=60, kwargs={
+                'events': [[article_id, user_id, count] for article_id in remaining
+                           for user_id, count in user_reads_by_article[article_id].items()],
+                'article_ids': remaining,
+            })
+        article_rows += written_articles
+        user_rows += written_users
+
+    metrics.TASK_SECONDS.observe(time.monotonic() - started, task='async_update_stats_batch')
+    metrics.TASK_ROWS.inc(article_rows, table='article_stats')
+    metrics.TASK_ROWS.inc(user_rows, table='user_read')
+
+
+# 预热的文章排序：reads 按总阅读量，recent 按最近更新时间
+WARM_ORDERINGS = {
+    'reads': ('-total_reads', 'article_id'),
+    'recent': ('-last_updated', 'article_id'),
+}
+WARM_LOCK_KEY = "stats:warm:lock"
+
+
+def iter_warm_rows(order, limit, batch_size):
+    """按预热排序分页读取文章计数：(article_id, total_reads, user_count)
+
+    以 (排序字段, article_id) 为游标的键集分页，每次查询至多 batch_size 行，不依赖数据库驱动的流式游标
+    （pymysql 的 iterator() 仍会一次读入整个结果集）。limit 为0时读取全部文章。
+    """
+    ordering = WARM_ORDERINGS[order]
+    field = ordering[0].lstrip('-')
+    rows = ArticleStats.objects.order_by(*ordering).values_list(field, 'article_id', 'total_reads', 'user_count')
+    remaining, cursor = limit, None
+    while not limit or remaining > 0:
+        page = rows
+        if cursor is not None:
+            page = page.filter(Q(**{f'{field}__lt': cursor[0]}) | Q(**{field: cursor[0], 'article_id__gt': cursor[1]}))
+        size = min(batch_size, remaining) if limit else batch_size
+        page = list(page[:size])
+        for _, article_id, total_reads, user_count in page:
+            yield article_id, total_reads, user_count
+        if len(page) < size:
+            return
+        cursor = page[-1][:2]
+        remaining -= len(page)
+
+
+@shared_task(ignore_result=True)
+def warm_stats_cache(limit=None, order='reads', batch_size=None, concurrency=None, max_memory_ratio=None,
+                     sample_size=None, exclusive=False):
+    """将数据库中排在前 limit 篇的文章计数预热到Redis（只写入缓存中不存在的计数）
+
+    以键集分页每次读取 batch_size 篇文章的计数，每 batch_size 篇文章一个管道，由 concurrency 个线程并发写入，同时在途的批次数
+    不超过线程数的两倍；Redis已用内存达到 maxmemory 的 max_memory_ratio 时停止（0 表示不检查）。
+    结束后抽样 sample_size 篇文章检查缓存命中率。exclusive 为True时多个进程同时触发只执行一次。
+    """
+    limit = settings.STATS_WARM_LIMIT if limit is None else limit
+    batch_size = batch_size or settings.STATS_WARM_BATCH_SIZE
+    concurrency = concurrency or settings.STATS_WARM_CONCURRENCY
+    max_memory_ratio = settings.STATS_WARM_MAX_MEMORY_RATIO if max_memory_ratio is None else max_memory_ratio
+    sample_size = settings.STATS_WARM_SAMPLE_SIZE if sample_size is None else sample_size
+    if exclusive and not cache.add(WARM_LOCK_KEY, 1, timeout=settings.STATS_WARM_LOCK_TTL):
+        logger.info("Stats cache warm-up is already running, skipped")
+        return None
+
+    started = time.monotonic()
+    report = {'order': order, 'articles': 0, 'loaded_articles': 0, 'keys': 0, 'stopped': None}
+    sample = []
+    in_flight = threading.BoundedSemaphore(concurrency * 2)
+
+    def load(batch):
+        try:
+            return StatsCacheService.warm_stats_many(batch)
+        finally:
+            in_flight.release()
+
+    def memory_exceeded():
+        if not max_memory_ratio:
+            return False
+        used_memory, maxmemory = StatsCacheService.get_memory_usage()
+        return bool(maxmemory) and used_memory >= maxmemory * max_memory_ratio
+
+    futures = []
+
+    def submit(executor, batch):
+        for article_id in batch:
+            report['articles'] += 1
+            # 蓄水池抽样（只抽取实际写入的批次），用于预热后检查命中率
+            if len(sample) < sample_size:
+                sample.append(article_id)
+            elif random.randrange(report['articles']) < sample_size:
+                sample[random.randrange(sample_size)] = article_id
+        in_flight.acquire()
+        futures.append(executor.submit(load, batch))
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='stats-warm') as executor:
+        batch = {}
+        for article_id, total_reads, user_count in iter_warm_rows(order, limit, batch_size):
+            batch[article_id] = (total_reads, user_count)
+            if len(batch) >= batch_size:
+                if memory_exceeded():
+                    report['stopped'] = 'memory'
+                    batch = {}
+                    break
+                submit(executor, batch)
+                batch = {}
+        if batch and not memory_exceeded():
+            submit(executor, batch)
+        elif batch:
+            report['stopped'] = 'memory'
+    for future in futures:
+        loaded_articles, keys = future.result()
+        report['loaded_articles'] += loaded_articles
+        report['keys'] += keys
+
+    elapsed = time.monotonic() - started
+    cached = StatsCacheService.get_stats_many(sample) if sample else {}
+    report.update(
+        elapsed_ms=round(elapsed * 1000, 2),
+        keys_per_second=round(report['keys'] / elapsed, 1) if elapsed else 0.0,
+        sampled=len(sample),
+        hit_rate=round(len(cached) / len(sample) * 100, 2) if sample else 0.0,
+    )
+    metrics.TASK_SECONDS.observe(elapsed, task='warm_stats_cache')
+    logger.info(f"Warmed stats cache: {report}")
+    return report
+
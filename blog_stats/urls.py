@@ -1,12 +1,31 @@
-# blog_stats/urls.py
-from django.urls import path
-from . import views
-
-urlpatterns = [
-    path('', views.HomeView.as_view(), name='home'),
-    path('track/<int:article_id>/', views.TrackArticleReadView.as_view(), name='track-read'),
-    path('stats/<int:article_id>/', views.ArticleStatsView.as_view(), name='article-stats'),
-    path('stats/cache-stats/', views.CacheStatsView.as_view(), name='cache-stats'),
-    path('stats/total-reads/', views.TotalReadsView.as_view(), name='total-reads'),  # 新增路由
-
-]
+# blog_stats/urls.py
+from django.conf import settings
+from django.urls import path
+from . import views
+
+if settings.STATS_ASYNC_VIEWS:
+    from . import async_views
+    track_read_view = async_views.AsyncTrackArticleReadView
+    article_stats_view = async_views.AsyncArticleStatsView
+    cache_stats_view = async_views.AsyncCacheStatsView
+    total_reads_view = async_views.AsyncTotalReadsView
+else:
+    track_read_view = views.TrackArticleReadView
+    article_stats_view = views.ArticleStatsView
+    cache_stats_view = views.CacheStatsView
+    total_reads_view = views.TotalReadsView
+
+urlpatterns = [
+    path('', views.HomeView.as_view(), name='home'),
+    path('track/batch/', views.TrackBatchView.as_view(), name='track-batch'),
+    path('track/<int:article_id>/', track_read_view.as_view(), name='track-read'),
+    path('stats/', views.BulkArticleStatsView.as_view(), name='bulk-stats'),
+    path('stats/<int:article_id>/', article_stats_view.as_view(), name='article-stats'),
+    path('stats/<int:article_id>/series/', views.ArticleReadSeriesView.as_view(), name='article-series'),
+    path('stats/users/<str:user_id>/history/', views.UserReadHistoryView.as_view(), name='user-history'),
+    path('stats/top/', views.TopArticlesView.as_view(), name='top-articles'),
+    path('stats/cache-stats/', cache_stats_view.as_view(), name='cache-stats'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
+    path('stats/total-reads/', total_reads_view.as_view(), name='total-reads'),  # 新增路由
+
+]
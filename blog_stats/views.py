@@ -1,175 +1,654 @@
-from django.db.models import Sum
-from django.views import View
-from django.http import JsonResponse
-from django.views.generic import TemplateView
-
-from .redis_client import get_redis_connection
-from .services import StatsCacheService
-from .models import ArticleStats, UserRead
-
-
-import logging
-
-logger = logging.getLogger(__name__)
-
-
-class HomeView(TemplateView):
-    template_name = 'stats_monitor.html'
-
-class TrackArticleReadView(View):
-    """跟踪文章阅读"""
-
-    def post(self, request, article_id):
-        user_id = self.get_user_id(request)
-
-        try:
-            StatsCacheService.increment_read(article_id, user_id)
-            return JsonResponse({'status': 'success'})
-        except Exception as e:
-            logger.error(f"Tracking error: {str(e)}")
-            # 降级处理：直接更新数据库
-            self.update_directly(article_id, user_id)
-            return JsonResponse({'status': 'degraded', 'message': str(e)}, status=500)
-
-    def get_user_id(self, request):
-        """获取用户标识"""
-        if request.user.is_authenticated:
-            return str(request.user.id)
-        return request.session.session_key or request.META.get('REMOTE_ADDR', 'anonymous')
-
-    def update_directly(self, article_id, user_id):
-        """直接更新数据库（降级方案）"""
-        try:
-            # 简化版直接更新
-            article_stats, _ = ArticleStats.objects.get_or_create(
-                article_id=article_id,
-                defaults={'total_reads': 0, 'user_count': 0}
-            )
-            article_stats.total_reads += 1
-            article_stats.save()
-
-            # 更新用户阅读记录
-            UserRead.objects.update_or_create(
-                article_id=article_id,
-                user_id=user_id,
-                defaults={'read_count': 1}
-            )
-        except Exception as e:
-            logger.critical(f"Direct update failed: {str(e)}")
-
-
-class ArticleStatsView(View):
-    """获取文章统计数据"""
-
-    def get(self, request, article_id):
-        try:
-            total_reads = StatsCacheService.get_total_reads(article_id)
-            user_count = StatsCacheService.get_user_count(article_id)
-
-            # 新增：获取每个用户的阅读次数分布
-            user_read_distribution = self.get_user_read_distribution(article_id)
-
-            # 缓存命中率统计
-            redis_conn = get_redis_connection()
-            if total_reads is not None and user_count is not None:
-                redis_conn.incr("cache:hits")
-                return JsonResponse({
-                    'article_id': article_id,
-                    'total_reads': total_reads,
-                    'user_count': user_count,
-                    'user_read_distribution': user_read_distribution,
-                    'source': 'cache'
-                })
-            else:
-                redis_conn.incr("cache:misses")
-                # 缓存未命中，查询数据库
-                try:
-                    stats = ArticleStats.objects.get(article_id=article_id)
-                    # 回填缓存
-                    StatsCacheService.cache_stats(article_id, stats.total_reads, stats.user_count)
-                    return JsonResponse({
-                        'article_id': article_id,
-                        'total_reads': stats.total_reads,
-                        'user_count': stats.user_count,
-                        'user_read_distribution': user_read_distribution,
-                        'source': 'database'
-                    })
-                except ArticleStats.DoesNotExist:
-                    return JsonResponse({
-                        'article_id': article_id,
-                        'total_reads': 0,
-                        'user_count': 0,
-                        'user_read_distribution': {},
-                        'source': 'default'
-                    })
-        except Exception as e:
-            logger.error(f"Stats retrieval error: {str(e)}")
-            return JsonResponse({
-                'error': 'Internal server error',
-                'article_id': article_id
-            }, status=500)
-
-    def get_user_read_distribution(self, article_id):
-        """获取每个用户的阅读次数分布"""
-        user_reads = UserRead.objects.filter(article_id=article_id).values('user_id', 'read_count')
-        return {item['user_id']: item['read_count'] for item in user_reads}
-
-
-class CacheStatsView(View):
-    """获取缓存统计信息"""
-
-    def get(self, request):
-        try:
-            hit_rate = StatsCacheService.get_cache_hit_rate()
-            redis_conn = get_redis_connection()
-            keys = redis_conn.info('keyspace')
-
-            # 获取热门文章数量
-            top_articles = StatsCacheService.get_top_articles()
-            top_articles_count = len(top_articles) if top_articles else 0
-
-            return JsonResponse({
-                'hit_rate': f"{hit_rate:.2f}%",
-                'redis_stats': keys,
-                'total_keys': redis_conn.dbsize(),
-                'top_articles_count': top_articles_count
-            })
-        except Exception as e:
-            return JsonResponse({'error': str(e)}, status=500)
-
-
-class TotalReadsView(View):
-    """获取所有文章的总阅读量"""
-
-    def get(self, request):
-        try:
-            # 从缓存中获取总阅读量
-            total_reads = StatsCacheService.get_total_reads_all_articles()
-
-            if total_reads is None:
-                # 如果缓存未命中，从数据库中计算总阅读量
-                total_reads = ArticleStats.objects.aggregate(total=Sum('total_reads'))['total'] or 0
-                # 将结果回填到缓存
-                StatsCacheService.cache_total_reads_all_articles(total_reads)
-
-            # 统计所有文章的用户人次
-            total_users = UserRead.objects.values('user_id').distinct().count()
-
-            # 获取用户阅读分布数量
-            user_read_distribution = self.get_user_read_distribution()
-            user_read_distribution_count = len(user_read_distribution)
-
-            return JsonResponse({
-                'total_reads': total_reads,
-                'total_users': total_users,
-                'user_read_distribution_count': user_read_distribution_count,  # 新增字段
-                'source': 'cache' if total_reads is not None else 'database'
-            })
-        except Exception as e:
-            logger.error(f"Total reads retrieval error: {str(e)}")
-            return JsonResponse({'error': 'Internal server error'}, status=500)
-
-    def get_user_read_distribution(self):
-        """获取每个用户的阅读次数分布"""
-        user_reads = UserRead.objects.filter(read_count__gt=0).values('user_id', 'read_count')
-        return {item['user_id']: item['read_count'] for item in user_reads}
\ No newline at end of file
+import hmac
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views import View
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.generic import TemplateView
+
+from . import metrics, redis_client
+from .redis_client import get_redis_connection
+from .services import (
+    LEADERBOARD_WINDOWS, SERIES_STEPS, USER_COUNT_MODE_EXACT, StatsCacheService, history_score, history_time,
+)
+from .models import ArticleStats, GlobalStats, UserRead
+from .tasks import enqueue_global_reconcile, enqueue_histogram_rebuild, enqueue_stats_update
+
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TimedViewMixin:
+    """记录视图处理耗时"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.dispatch_async(request, *args, **kwargs)
+        with metrics.VIEW_SECONDS.time(view=type(self).__name__):
+            return super().dispatch(request, *args, **kwargs)
+
+    async def dispatch_async(self, request, *args, **kwargs):
+        with metrics.VIEW_SECONDS.time(view=type(self).__name__):
+            return await super().dispatch(request, *args, **kwargs)
+
+
+class HomeView(TemplateView):
+    template_name = 'stats_monitor.html'
+
+class UserIdentityMixin:
+    """当前请求的用户标识"""
+
+    def get_user_id(self, request):
+        """获取用户标识"""
+        if request.user.is_authenticated:
+            return str(request.user.id)
+        return request.session.session_key or request.META.get('REMOTE_ADDR', 'anonymous')
+
+
+class TrackArticleReadView(UserIdentityMixin, TimedViewMixin, View):
+    """跟踪文章阅读"""
+
+    def post(self, request, article_id):
+        user_id = self.get_user_id(request)
+
+        try:
+            StatsCacheService.increment_read(article_id, user_id)
+            enqueue_stats_update(article_id, user_id)
+            return JsonResponse({'status': 'success'})
+        except Exception as e:
+            logger.error(f"Tracking error: {str(e)}")
+            # 降级处理：直接更新数据库
+            metrics.DB_FALLBACKS.inc(operation='track')
+            self.update_directly(article_id, user_id)
+            return JsonResponse({'status': 'degraded', 'message': str(e)}, status=500)
+
+    def update_directly(self, article_id, user_id):
+        """直接更新数据库（降级方案）"""
+        try:
+            StatsCacheService.record_read_db(article_id, user_id)
+        except Exception as e:
+            logger.critical(f"Direct update failed: {str(e)}")
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class TrackBatchView(TrackArticleReadView):
+    """批量跟踪文章阅读
+
+    请求体为JSON数组：[{"article_id": 1, "count": 2}, ...]，count 缺省为1。与单篇跟踪相同，
+    浏览器上报的用户标识取自当前登录用户或会话，并要求CSRF校验，事件中带 user_id 时拒绝整个请求。
+    生产者（持有 STATS_TRACK_PRODUCER_TOKEN 的服务端上报，免CSRF校验；或staff用户）须在每条事件中
+    给出 user_id。返回逐条处理结果。
+    """
+
+    def post(self, request):
+        token_producer = self.has_producer_token(request)
+        if not token_producer:
+            rejected = CsrfViewMiddleware(lambda req: None).process_view(request, None, (), {})
+            if rejected is not None:
+                return rejected
+        producer = token_producer or (request.user.is_authenticated and request.user.is_staff)
+
+        try:
+            events = json.loads(request.body)
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+        if not isinstance(events, list):
+            return JsonResponse({'status': 'error', 'message': 'Expected a JSON array'}, status=400)
+        if len(events) > settings.STATS_TRACK_BATCH_MAX_EVENTS:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Too many events (max {settings.STATS_TRACK_BATCH_MAX_EVENTS})'
+            }, status=400)
+        if not producer and any(isinstance(event, dict) and 'user_id' in event for event in events):
+            return JsonResponse({
+                'status': 'error',
+                'message': 'user_id is only accepted from authenticated producers'
+            }, status=400)
+
+        request_user_id = None if producer else self.get_user_id(request)
+        results = []
+        deltas = {}
+        for index, event in enumerate(events):
+            try:
+                article_id, user_id, count = self.validate_event(event, producer)
+            except ValueError as e:
+                results.append({'index': index, 'status': 'invalid', 'message': str(e)})
+                continue
+            user_id = user_id or request_user_id
+            deltas[(article_id, user_id)] = deltas.get((article_id, user_id), 0) + count
+            results.append({'index': index, 'status': 'pending', 'article_id': article_id})
+
+        if not deltas:
+            return JsonResponse({'status': 'error', 'results': results}, status=400)
+
+        status = 'success'
+        try:
+            StatsCacheService.increment_reads_bulk(deltas)
+            for (article_id, event_user_id), count in deltas.items():
+                enqueue_stats_update(article_id, event_user_id, count)
+        except Exception as e:
+            logger.error(f"Batch tracking error: {str(e)}")
+            # 降级处理：写入本地暂存或一次批量写入数据库
+            status = 'degraded'
+            metrics.DB_FALLBACKS.inc(operation='track_batch')
+            try:
+                StatsCacheService.record_reads_db_bulk(deltas)
+            except Exception as db_error:
+                logger.critical(f"Batch direct update failed: {str(db_error)}")
+                status = 'failed'
+
+        for result in results:
+            if result['status'] == 'pending':
+                result['status'] = status
+        accepted = sum(1 for result in results if result['status'] in ('success', 'degraded'))
+        return JsonResponse({
+            'status': status,
+            'accepted': accepted,
+            'rejected': len(results) - accepted,
+            'results': results,
+        }, status=500 if status == 'failed' else 200)
+
+    @staticmethod
+    def has_producer_token(request):
+        """请求是否携带有效的生产者令牌"""
+        token = settings.STATS_TRACK_PRODUCER_TOKEN
+        if not token:
+            return False
+        scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), token.encode())
+
+    @staticmethod
+    def validate_event(event, producer=False):
+        """校验单条事件，返回 (article_id, user_id, count)，非生产者请求的 user_id 为None"""
+        if not isinstance(event, dict):
+            raise ValueError('Event must be an object')
+        article_id = event.get('article_id')
+        if isinstance(article_id, bool) or not isinstance(article_id, int) or article_id <= 0:
+            raise ValueError('article_id must be a positive integer')
+        count = event.get('count', 1)
+        if isinstance(count, bool) or not isinstance(count, int) or count <= 0:
+            raise ValueError('count must be a positive integer')
+        if count > settings.STATS_TRACK_BATCH_MAX_COUNT:
+            raise ValueError(f'count must not exceed {settings.STATS_TRACK_BATCH_MAX_COUNT}')
+        user_id = None
+        if producer:
+            user_id = event.get('user_id')
+            if not isinstance(user_id, str) or not user_id:
+                raise ValueError('user_id must be a non-empty string')
+        return article_id, user_id, count
+
+
+class ArticleStatsView(TimedViewMixin, View):
+    """获取文章统计数据
+
+    查询参数 distribution 控制用户阅读分布的返回方式：
+    none 不返回；page 按 user_id 游标分页（cursor、limit）；stream 流式返回全部分布。
+    缺省值由 STATS_DISTRIBUTION_DEFAULT 配置。
+    """
+
+    DISTRIBUTION_MODES = ('none', 'page', 'stream')
+
+    def get(self, request, article_id):
+        distribution_mode, limit, error = self.parse_distribution_params(request, article_id)
+        if error is not None:
+            return error
+
+        try:
+            payload = self.get_stats(article_id)
+            if distribution_mode == 'stream':
+                return StreamingHttpResponse(
+                    self.stream_user_read_distribution(payload, article_id),
+                    content_type='application/json'
+                )
+            if distribution_mode == 'page':
+                distribution, next_cursor = self.get_user_read_distribution(
+                    article_id, request.GET.get('cursor'), limit)
+                payload['user_read_distribution'] = distribution
+                payload['distribution_next_cursor'] = next_cursor
+            return JsonResponse(payload)
+        except Exception as e:
+            logger.error(f"Stats retrieval error: {str(e)}")
+            return JsonResponse({
+                'error': 'Internal server error',
+                'article_id': article_id
+            }, status=500)
+
+    def parse_distribution_params(self, request, article_id):
+        """解析分布参数，返回 (distribution_mode, limit, 错误响应或None)"""
+        distribution_mode = request.GET.get('distribution', settings.STATS_DISTRIBUTION_DEFAULT)
+        if distribution_mode not in self.DISTRIBUTION_MODES:
+            return None, None, JsonResponse({
+                'error': f"distribution must be one of {', '.join(self.DISTRIBUTION_MODES)}",
+                'article_id': article_id
+            }, status=400)
+        try:
+            limit = int(request.GET.get('limit', settings.STATS_DISTRIBUTION_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= settings.STATS_DISTRIBUTION_MAX_PAGE_SIZE:
+            return None, None, JsonResponse({
+                'error': f"limit must be between 1 and {settings.STATS_DISTRIBUTION_MAX_PAGE_SIZE}",
+                'article_id': article_id
+            }, status=400)
+        return distribution_mode, limit, None
+
+    def get_stats(self, article_id):
+        """获取文章计数（优先读缓存，未命中时单飞重建，其余请求返回旧值）"""
+        total_reads, user_count, meta = StatsCacheService.get_stats_snapshot(article_id)
+        user_count_mode = StatsCacheService.get_user_count_mode()
+
+        # 缓存命中率统计（进程内计数器）
+        if total_reads is not None and user_count is not None:
+            metrics.CACHE_REQUESTS.inc(view='article_stats', result='hit')
+            source = 'cache'
+            if StatsCacheService.should_refresh_early(meta):
+                self.refresh_early(article_id, meta)
+        else:
+            metrics.CACHE_REQUESTS.inc(view='article_stats', result='miss')
+            total_reads, user_count, source = self.rebuild_stats(article_id, meta)
+
+        return {
+            'article_id': article_id,
+            'total_reads': total_reads,
+            'user_count': user_count,
+            'user_count_mode': user_count_mode,
+            'read_histogram': self.get_read_histogram(article_id, user_count_mode, source),
+            'source': source
+        }
+
+    def refresh_early(self, article_id, meta):
+        """在计数过期前由单个请求续期，避免热点键同时过期"""
+        token = StatsCacheService.acquire_rebuild_lock(f"article:{article_id}:stats", count_waiter=False)
+        if token is None:
+            return
+        try:
+            if StatsCacheService.extend_stats_ttl(article_id, meta):
+                metrics.STAMPEDE_REBUILDS.inc(kind='article_stats', outcome='early_refresh')
+        finally:
+            StatsCacheService.release_rebuild_lock(f"article:{article_id}:stats", token)
+
+    def rebuild_stats(self, article_id, meta):
+        """缓存未命中：单飞查询数据库并回填，返回 (total_reads, user_count, source)"""
+        def rebuild():
+            started = time.perf_counter()
+            try:
+                stats = ArticleStats.objects.get(article_id=article_id)
+            except ArticleStats.DoesNotExist:
+                return 0, 0, 'default'
+            # 回填缓存
+            StatsCacheService.cache_stats(article_id, stats.total_reads, stats.user_count,
+                                          delta=time.perf_counter() - started)
+            return stats.total_reads, stats.user_count, 'database'
+
+        def peek():
+            total_reads, user_count, _ = StatsCacheService.get_stats_snapshot(article_id)
+            if total_reads is None or user_count is None:
+                return None
+            return total_reads, user_count, 'cache'
+
+        stale = (meta['total_reads'], meta['user_count'], 'stale') if meta else None
+        result, outcome = StatsCacheService.single_flight(
+            'article_stats', f"article:{article_id}:stats", rebuild, peek, stale=stale)
+        if outcome == 'timeout':
+            # 等待超时：直接读取数据库，不回填
+            stats = ArticleStats.objects.filter(article_id=article_id).first()
+            if stats is None:
+                return 0, 0, 'default'
+            return stats.total_reads, stats.user_count, 'database'
+        return result
+
+    def get_read_histogram(self, article_id, user_count_mode, source):
+        """获取文章阅读次数直方图（仅精确模式维护），未缓存时返回None并入队重建"""
+        if user_count_mode != USER_COUNT_MODE_EXACT or source == 'default':
+            return None
+        histogram = StatsCacheService.get_read_histogram(article_id)
+        if histogram is None:
+            enqueue_histogram_rebuild(article_id)
+        return histogram
+
+    def get_user_read_distribution(self, article_id, cursor=None, limit=1000):
+        """按 user_id 游标分页获取用户阅读次数分布，返回 (分布, 下一页游标)"""
+        user_reads = UserRead.objects.filter(article_id=article_id).order_by('user_id')
+        if cursor:
+            user_reads = user_reads.filter(user_id__gt=cursor)
+        page = list(user_reads.values_list('user_id', 'read_count')[:limit + 1])
+        next_cursor = page[limit - 1][0] if len(page) > limit else None
+        return dict(page[:limit]), next_cursor
+
+    def stream_user_read_distribution(self, payload, article_id):
+        """以JSON形式流式输出统计数据及完整的用户阅读次数分布"""
+        chunk_size = settings.STATS_DISTRIBUTION_CHUNK_SIZE
+        user_reads = UserRead.objects.filter(article_id=article_id).order_by('user_id').values_list(
+            'user_id', 'read_count')
+
+        yield json.dumps(payload)[:-1] + ', "user_read_distribution": {'
+        separator = ''
+        buffer = []
+        for user_id, read_count in user_reads.iterator(chunk_size=chunk_size):
+            buffer.append(f"{separator}{json.dumps(user_id)}: {read_count}")
+            separator = ', '
+            if len(buffer) >= chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+        yield ''.join(buffer) + '}}'
+
+
+class BulkArticleStatsView(TimedViewMixin, View):
+    """批量获取文章统计数据：GET /stats/?ids=1,2,3"""
+
+    def get(self, request):
+        try:
+            article_ids = list(dict.fromkeys(int(value) for value in request.GET.get('ids', '').split(',') if value))
+        except ValueError:
+            return JsonResponse({'error': 'ids must be a comma-separated list of integers'}, status=400)
+        if not article_ids:
+            return JsonResponse({'error': 'ids is required'}, status=400)
+        if len(article_ids) > settings.STATS_BULK_MAX_IDS:
+            return JsonResponse({'error': f"Too many ids (max {settings.STATS_BULK_MAX_IDS})"}, status=400)
+
+        try:
+            cached = StatsCacheService.get_stats_many(article_ids)
+            missing = [article_id for article_id in article_ids if article_id not in cached]
+            metrics.CACHE_REQUESTS.inc(len(cached), view='bulk_stats', result='hit')
+            metrics.CACHE_REQUESTS.inc(len(missing), view='bulk_stats', result='miss')
+
+            # 缓存未命中的文章一次查询数据库并一次回填
+            loaded = {}
+            if missing:
+                loaded = {
+                    article_id: (total_reads, user_count)
+                    for article_id, total_reads, user_count in ArticleStats.objects.filter(
+                        article_id__in=missing
+                    ).values_list('article_id', 'total_reads', 'user_count')
+                }
+                StatsCacheService.cache_stats_many(loaded)
+
+            articles = []
+            for article_id in article_ids:
+                if article_id in cached:
+                    (total_reads, user_count), source = cached[article_id], 'cache'
+                elif article_id in loaded:
+                    (total_reads, user_count), source = loaded[article_id], 'database'
+                else:
+                    (total_reads, user_count), source = (0, 0), 'default'
+                articles.append({
+                    'article_id': article_id,
+                    'total_reads': total_reads,
+                    'user_count': user_count,
+                    'source': source
+                })
+            return JsonResponse({
+                'articles': articles,
+                'hits': len(cached),
+                'misses': len(missing),
+                'user_count_mode': StatsCacheService.get_user_count_mode(),
+            })
+        except Exception as e:
+            logger.error(f"Bulk stats retrieval error: {str(e)}")
+            return JsonResponse({'error': 'Internal server error'}, status=500)
+
+
+class ArticleReadSeriesView(TimedViewMixin, View):
+    """获取文章阅读时间序列
+
+    查询参数：from、to 为ISO格式时间（缺省为最近1小时），step 为 minute/hour/day。
+    """
+
+    def get(self, request, article_id):
+        step = request.GET.get('step', 'minute')
+        if step not in SERIES_STEPS:
+            return JsonResponse({'error': f"step must be one of {', '.join(SERIES_STEPS)}"}, status=400)
+        try:
+            end = self.parse_time(request.GET.get('to')) or timezone.now()
+            start = self.parse_time(request.GET.get('from')) or end - timedelta(hours=1)
+        except ValueError:
+            return JsonResponse({'error': 'from/to must be ISO 8601 datetimes'}, status=400)
+        if start > end:
+            return JsonResponse({'error': 'from must not be later than to'}, status=400)
+
+        try:
+            series = StatsCacheService.get_read_series(article_id, start, end, step)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"Series retrieval error: {str(e)}")
+            return JsonResponse({'error': 'Internal server error', 'article_id': article_id}, status=500)
+
+        return JsonResponse({
+            'article_id': article_id,
+            'step': step,
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'points': [{'ts': bucket.isoformat(), 'reads': reads} for bucket, reads in series],
+        })
+
+    @staticmethod
+    def parse_time(value):
+        if not value:
+            return None
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(value)
+        if timezone.is_aware(moment) and not settings.USE_TZ:
+            moment = timezone.make_naive(moment)
+        return moment
+
+
+class UserReadHistoryView(UserIdentityMixin, TimedViewMixin, View):
+    """获取用户阅读历史（按最近阅读时间从新到旧）
+
+    只能查询当前请求用户（与跟踪阅读相同的用户标识）的历史，staff用户可查询任意用户。
+    查询参数：limit 为每页条数，cursor 为上一页返回的 next_cursor。最近 STATS_USER_HISTORY_SIZE 篇读取
+    Redis中缓存的历史（未缓存时先从数据库回填），更早的记录按 (last_read, article_id) 游标查询数据库，
+    不使用 OFFSET，翻页代价与页码无关。
+    """
+
+    def get(self, request, user_id):
+        if not request.user.is_staff and user_id != self.get_user_id(request):
+            return JsonResponse({'error': 'Forbidden', 'user_id': user_id}, status=403)
+        try:
+            limit = int(request.GET.get('limit', settings.STATS_USER_HISTORY_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= settings.STATS_USER_HISTORY_MAX_PAGE_SIZE:
+            return JsonResponse({
+                'error': f"limit must be between 1 and {settings.STATS_USER_HISTORY_MAX_PAGE_SIZE}",
+                'user_id': user_id
+            }, status=400)
+        try:
+            cursor = self.parse_cursor(request.GET.get('cursor'))
+        except ValueError:
+            return JsonResponse({'error': 'invalid cursor', 'user_id': user_id}, status=400)
+
+        try:
+            entries, source = self.get_history(user_id, cursor, limit + 1)
+        except Exception as e:
+            logger.error(f"History retrieval error: {str(e)}")
+            return JsonResponse({'error': 'Internal server error', 'user_id': user_id}, status=500)
+
+        page = entries[:limit]
+        next_cursor = None
+        if len(entries) > limit:
+            article_id, score = page[-1]
+            next_cursor = f"{score}:{article_id}"
+        return JsonResponse({
+            'user_id': user_id,
+            'history': [
+                {'article_id': article_id, 'last_read': history_time(score).isoformat()}
+                for article_id, score in page
+            ],
+            'next_cursor': next_cursor,
+            'source': source,
+        })
+
+    def get_history(self, user_id, cursor, limit):
+        """返回 (游标之后的至多 limit 条记录 [(article_id, history_score)], 来源)"""
+        size = settings.STATS_USER_HISTORY_SIZE
+        if size <= 0:
+            return self.query_history(user_id, cursor, limit), 'database'
+        try:
+            history = StatsCacheService.get_user_history(user_id)
+            source = 'cache'
+            if history is None:
+                metrics.CACHE_REQUESTS.inc(view='user_history', result='miss')
+                history = StatsCacheService.cache_user_history(user_id, self.query_history(user_id, None, size))
+                source = 'database'
+            else:
+                metrics.CACHE_REQUESTS.inc(view='user_history', result='hit')
+        except Exception as e:
+            logger.error(f"History cache unavailable, using DB fallback: {str(e)}")
+            return self.query_history(user_id, cursor, limit), 'database'
+
+        # 与数据库查询的排序一致：阅读时间相同时按文章ID倒序
+        history.sort(key=lambda entry: (entry[1], entry[0]), reverse=True)
+        entries = [(article_id, score) for article_id, score in history
+                   if cursor is None or (score, article_id) < cursor][:limit]
+        if len(entries) < limit and len(history) >= size:
+            # 缓存只保留最近 size 篇，更早的记录继续查询数据库（跳过缓存中已有的文章，其数据库记录可能尚未落库）
+            oldest = (history[-1][1], history[-1][0])
+            boundary = oldest if cursor is None else min(cursor, oldest)
+            entries += self.query_history(user_id, boundary, limit - len(entries),
+                                          exclude=[article_id for article_id, _ in history])
+            source = 'database'
+        return entries, source
+
+    @staticmethod
+    def query_history(user_id, cursor, limit, exclude=()):
+        """按 (last_read, article_id) 倒序查询数据库中游标之后的阅读记录：[(article_id, history_score)]"""
+        user_reads = UserRead.objects.filter(user_id=user_id)
+        if cursor is not None:
+            last_read, article_id = history_time(cursor[0]), cursor[1]
+            user_reads = user_reads.filter(
+                Q(last_read__lt=last_read) | Q(last_read=last_read, article_id__lt=article_id))
+        if exclude:
+            user_reads = user_reads.exclude(article_id__in=exclude)
+        rows = user_reads.order_by('-last_read', '-article_id').values_list('article_id', 'last_read')[:limit]
+        return [(article_id, history_score(last_read)) for article_id, last_read in rows]
+
+    @staticmethod
+    def parse_cursor(value):
+        """解析游标 "<history_score>:<article_id>"，返回 (history_score, article_id)"""
+        if not value:
+            return None
+        score, separator, article_id = value.partition(':')
+        if not separator:
+            raise ValueError(value)
+        return int(score), int(article_id)
+
+
+class CacheStatsView(TimedViewMixin, View):
+    """获取缓存统计信息"""
+
+    def get(self, request):
+        try:
+            hit_rate = StatsCacheService.get_cache_hit_rate()
+            redis_conn = get_redis_connection()
+            keys = redis_conn.info('keyspace')
+
+            # 获取热门文章数量
+            top_articles = StatsCacheService.get_top_articles()
+            top_articles_count = len(top_articles) if top_articles else 0
+
+            return JsonResponse({
+                'hit_rate': f"{hit_rate:.2f}%",
+                'redis_stats': keys,
+                'total_keys': redis_conn.dbsize(),
+                'top_articles_count': top_articles_count,
+                'redis_client': redis_client.get_status(),
+                'retention': StatsCacheService.get_retention_status(),
+            })
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+class TopArticlesView(TimedViewMixin, View):
+    """获取热门文章排行榜（仅读取Redis排行榜）"""
+
+    def get(self, request):
+        window = request.GET.get('window', 'all')
+        try:
+            k = int(request.GET.get('k', 10))
+        except ValueError:
+            return JsonResponse({'error': 'k must be an integer'}, status=400)
+        if window not in LEADERBOARD_WINDOWS:
+            return JsonResponse({'error': f"window must be one of {', '.join(LEADERBOARD_WINDOWS)}"}, status=400)
+        if not 1 <= k <= settings.STATS_LEADERBOARD_MAX_K:
+            return JsonResponse({'error': f"k must be between 1 and {settings.STATS_LEADERBOARD_MAX_K}"}, status=400)
+
+        try:
+            top_articles = StatsCacheService.get_leaderboard(window, k)
+            return JsonResponse({
+                'window': window,
+                'k': k,
+                'articles': [{'article_id': article_id, 'reads': reads} for article_id, reads in top_articles],
+                'source': 'cache'
+            })
+        except Exception as e:
+            logger.error(f"Leaderboard retrieval error: {str(e)}")
+            return JsonResponse({'error': 'Internal server error'}, status=500)
+
+
+class TotalReadsView(TimedViewMixin, View):
+    """获取所有文章的总阅读量（读取增量维护的全站计数）"""
+
+    def get(self, request):
+        try:
+            # 从缓存中获取全站计数
+            stats = StatsCacheService.get_global_stats()
+            source = 'cache'
+
+            if None not in stats.values():
+                metrics.CACHE_REQUESTS.inc(view='total_reads', result='hit')
+            else:
+                metrics.CACHE_REQUESTS.inc(view='total_reads', result='miss')
+                # 缓存未命中，读取汇总表；汇总表为空时按缓存中已有的计数返回，并入队对账任务
+                source = 'database'
+                global_stats = GlobalStats.objects.filter(pk=1).first()
+                if global_stats is None:
+                    stats = {name: value or 0 for name, value in stats.items()}
+                    source = 'stale'
+                    enqueue_global_reconcile()
+                else:
+                    stats = {
+                        'total_reads': global_stats.total_reads,
+                        'total_users': global_stats.total_users,
+                        'active_users': global_stats.active_users,
+                    }
+                    # 将结果回填到缓存（不覆盖已存在的计数）
+                    StatsCacheService.set_global_stats(overwrite=False, **stats)
+
+            user_count_mode = StatsCacheService.get_user_count_mode()
+            read_histogram = None
+            if user_count_mode == USER_COUNT_MODE_EXACT:
+                read_histogram = StatsCacheService.get_read_histogram()
+                if read_histogram is None:
+                    enqueue_histogram_rebuild()
+
+            return JsonResponse({
+                'total_reads': stats['total_reads'],
+                'total_users': stats['total_users'],
+                'user_read_distribution_count': stats['active_users'],  # 新增字段
+                'user_count_mode': user_count_mode,
+                'read_histogram': read_histogram,
+                'source': source
+            })
+        except Exception as e:
+            logger.error(f"Total reads retrieval error: {str(e)}")
+            return JsonResponse({'error': 'Internal server error'}, status=500)
+
+
+class MetricsView(View):
+    """以Prometheus文本格式导出当前进程的统计指标"""
+
+    def get(self, request):
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
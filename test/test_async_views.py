@@ -0,0 +1,104 @@
+# blog_stats/test_async_views.py
+import json
+from unittest.mock import AsyncMock, patch
+
+import fakeredis
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import RequestFactory
+
+from blog_stats.async_views import (
+    AsyncArticleStatsView, AsyncCacheStatsView, AsyncTotalReadsView, AsyncTrackArticleReadView,
+)
+from blog_stats.models import ArticleStats, UserRead
+from blog_stats.redis_client import AsyncGuardedRedis, CircuitBreaker
+
+
+@pytest.fixture(autouse=True)
+def async_redis(monkeypatch, settings):
+    # 每次调用创建新的受熔断器保护的客户端（绑定当前事件循环），共享同一个fakeredis服务端
+    server = fakeredis.FakeServer()
+
+    def get_async_redis():
+        return AsyncGuardedRedis(connection_pool=fakeredis.aioredis.FakeRedis(server=server).connection_pool)
+
+    for target in ('blog_stats.async_services.get_async_redis', 'blog_stats.async_views.get_async_redis'):
+        monkeypatch.setattr(target, get_async_redis)
+    monkeypatch.setattr('blog_stats.async_services._scripts', {})
+    settings.STATS_ATOMIC_INCREMENT = True
+    cache.clear()
+
+
+def call(view_class, method='get', path='/', **kwargs):
+    request = getattr(RequestFactory(), method)(path)
+    request.session = type('Session', (), {'session_key': 'session1'})()
+    request.user = type('User', (), {'is_authenticated': False})()
+    response = async_to_sync(view_class.as_view())(request, **kwargs)
+    return response.status_code, json.loads(response.content)
+
+
+# 降级写库在线程池中执行（不在测试所在线程的事务内），每个测试结束后清空数据表
+@pytest.mark.django_db(transaction=True)
+class TestAsyncViews:
+    def test_views_are_async(self):
+        for view_class in (AsyncTrackArticleReadView, AsyncArticleStatsView, AsyncCacheStatsView, AsyncTotalReadsView):
+            assert view_class.view_is_async
+
+    def test_track_then_stats(self):
+        assert call(AsyncTrackArticleReadView, 'post', article_id=1) == (200, {'status': 'success'})
+        call(AsyncTrackArticleReadView, 'post', article_id=1)
+
+        status, data = call(AsyncArticleStatsView, path='/?distribution=none', article_id=1)
+
+        assert status == 200
+        assert (data['total_reads'], data['user_count'], data['source']) == (2, 1, 'cache')
+        assert data['read_histogram'] == {'2-3': 1}
+
+    def test_stats_cache_miss(self):
+        ArticleStats.objects.create(article_id=1, total_reads=200, user_count=2)
+        UserRead.objects.create(article_id=1, user_id='user1', read_count=150)
+        UserRead.objects.create(article_id=1, user_id='user2', read_count=50)
+
+        status, data = call(AsyncArticleStatsView, path='/?distribution=page&limit=1', article_id=1)
+
+        assert status == 200
+        assert (data['total_reads'], data['source']) == (200, 'database')
+        assert data['user_read_distribution'] == {'user1': 150}
+        assert data['distribution_next_cursor'] == 'user1'
+        assert call(AsyncArticleStatsView, article_id=1)[1]['source'] == 'cache'
+
+    def test_track_cache_failure(self):
+        with patch('blog_stats.async_services._get_async_script', side_effect=Exception("Redis error")):
+            status, data = call(AsyncTrackArticleReadView, 'post', article_id=1)
+
+        assert status == 200
+        assert ArticleStats.objects.get(article_id=1).total_reads == 1
+        assert UserRead.objects.get(article_id=1, user_id='session1').read_count == 1
+
+    def test_track_with_open_breaker(self, monkeypatch):
+        from blog_stats import redis_client
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        breaker.record_failure()
+        monkeypatch.setattr(redis_client, '_breaker', breaker)
+
+        # 熔断器打开时异步路径不访问Redis，直接降级写数据库
+        status, data = call(AsyncTrackArticleReadView, 'post', article_id=1)
+
+        assert status == 200
+        assert ArticleStats.objects.get(article_id=1).total_reads == 1
+
+    def test_total_reads_and_cache_stats(self):
+        call(AsyncTrackArticleReadView, 'post', article_id=1)
+        call(AsyncTrackArticleReadView, 'post', article_id=2)
+
+        status, data = call(AsyncTotalReadsView)
+        assert status == 200
+        assert (data['total_reads'], data['total_users'], data['source']) == (2, 1, 'cache')
+
+        # fakeredis 不支持 INFO 命令
+        with patch.object(AsyncGuardedRedis, 'info', AsyncMock(return_value={'db0': {'keys': 9}})):
+            status, data = call(AsyncCacheStatsView)
+        assert status == 200
+        assert data['redis_stats'] == {'db0': {'keys': 9}}
+        assert data['top_articles_count'] == 2
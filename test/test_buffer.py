@@ -0,0 +1,60 @@
+# blog_stats/test_buffer.py
+from unittest.mock import patch
+
+from blog_stats.buffer import DbFallbackBuffer, ReadBuffer, StatsTaskBatcher
+from blog_stats.services import StatsCacheService
+
+
+class TestReadBuffer:
+    def test_coalesces_until_max_events(self):
+        buffer = ReadBuffer(max_events=3, flush_interval_ms=60000)
+
+        with patch('blog_stats.buffer.StatsCacheService.increment_reads_bulk') as mock_bulk:
+            buffer.add(1, 'user1')
+            buffer.add(1, 'user1')
+            mock_bulk.assert_not_called()
+
+            buffer.add(2, 'user2')
+            mock_bulk.assert_called_once_with({(1, 'user1'): 2, (2, 'user2'): 1})
+            assert buffer.pending == 0
+
+    def test_flush_falls_back_to_db(self):
+        buffer = ReadBuffer(max_events=10, flush_interval_ms=60000)
+
+        with patch('blog_stats.buffer.StatsCacheService.increment_reads_bulk',
+                   side_effect=Exception("Redis error")), \
+                patch('blog_stats.buffer.StatsCacheService.increment_reads_db_bulk') as mock_db:
+            buffer.add(1, 'user1')
+            buffer.add(1, 'user1')
+            buffer.add(2, 'user1')
+
+            assert buffer.flush() == 3
+            mock_db.assert_called_once_with({(1, 'user1'): 2, (2, 'user1'): 1})
+
+
+class TestDbFallbackBuffer:
+    def test_batches_db_writes(self, settings):
+        settings.STATS_DB_FALLBACK_BATCH_ENABLED = True
+        buffer = DbFallbackBuffer(max_events=3, flush_interval_ms=60000)
+
+        with patch('blog_stats.buffer.get_db_fallback_buffer', return_value=buffer), \
+                patch('blog_stats.buffer.StatsCacheService.increment_reads_db_bulk') as mock_db:
+            assert StatsCacheService.record_read_db(1, 'user1') is None
+            StatsCacheService.record_read_db(1, 'user1')
+            mock_db.assert_not_called()
+
+            StatsCacheService.record_read_db(1, 'user2')
+            mock_db.assert_called_once_with({(1, 'user1'): 2, (1, 'user2'): 1})
+
+
+class TestStatsTaskBatcher:
+    def test_coalesces_events_into_task_messages(self):
+        batcher = StatsTaskBatcher(max_events=3, flush_interval_ms=60000)
+
+        with patch('blog_stats.tasks.async_update_stats_batch.delay') as mock_delay:
+            batcher.add(1, 'user1')
+            batcher.add(1, 'user1')
+            mock_delay.assert_not_called()
+
+            batcher.add(2, 'user1')
+            mock_delay.assert_called_once_with(events=[[1, 'user1', 2], [2, 'user1', 1]])
@@ -0,0 +1,81 @@
+# blog_stats/test_commands.py
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+
+from blog_stats.redis_client import get_redis_connection
+from blog_stats.services import StatsCacheService
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+class TestMigrateStatsLayout:
+    def test_requires_hash_layout(self):
+        with pytest.raises(CommandError):
+            call_command('migrate_stats_layout')
+
+    def test_migrates_legacy_keys(self, settings):
+        for article_id in range(1, 4):
+            for user in range(article_id):
+                StatsCacheService.increment_read(article_id, f"user{user}")
+        StatsCacheService.increment_read(3, "user0")
+        settings.STATS_KEY_LAYOUT = 'hash'
+
+        out = StringIO()
+        call_command('migrate_stats_layout', '--dry-run', stdout=out)
+        assert "6 per-user read keys" in out.getvalue()
+        assert cache.get("article:3:total_reads") == 4
+
+        call_command('migrate_stats_layout', '--batch-size', '2', stdout=out)
+        assert "Migrated counters of 3 articles and 6 per-user read counters" in out.getvalue()
+        redis_conn = get_redis_connection()
+        assert redis_conn.keys(cache.make_key("article:*:user:*")) == []
+        assert redis_conn.keys(cache.make_key("article:*:total_reads")) == []
+        assert StatsCacheService.get_stats_snapshot(3)[:2] == (4, 3)
+        assert StatsCacheService.get_user_read_count(3, "user0") == 2
+
+        # 可重复执行
+        call_command('migrate_stats_layout', stdout=out)
+        assert "Migrated counters of 0 articles and 0 per-user read counters" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestReconcileStats:
+    def test_dry_run_reports_without_writing(self):
+        from blog_stats.models import ArticleStats
+
+        cache.set("article:1:total_reads", 5)
+        cache.set("article:1:user_count", 2)
+        ArticleStats.objects.create(article_id=1, total_reads=3, user_count=2)
+
+        out = StringIO()
+        call_command('reconcile_stats', '--dry-run', '--rate', '0', stdout=out)
+        assert "Would correct 1 article rows" in out.getvalue()
+        assert ArticleStats.objects.get(article_id=1).total_reads == 3
+
+        call_command('reconcile_stats', '--rate', '0', stdout=out)
+        assert "Corrected 1 article rows" in out.getvalue()
+        assert ArticleStats.objects.get(article_id=1).total_reads == 5
+
+
+@pytest.mark.django_db
+class TestWarmStatsCache:
+    def test_reports_throughput_and_hit_rate(self):
+        from blog_stats.models import ArticleStats
+
+        ArticleStats.objects.bulk_create([ArticleStats(article_id=article_id, total_reads=article_id, user_count=1)
+                                          for article_id in range(1, 21)])
+
+        out = StringIO()
+        call_command('warm_stats_cache', '--limit', '10', '--batch-size', '3', '--max-memory-ratio', '0', stdout=out)
+
+        assert "Warmed 10 of 10 articles (30 keys)" in out.getvalue()
+        assert "keys/s" in out.getvalue()
+        assert "Hit rate after warm-up: 100.00% of 10 sampled articles" in out.getvalue()
+        assert StatsCacheService.get_stats_many([20, 11, 10]) == {20: (20, 1), 11: (11, 1)}
+
@@ -0,0 +1,45 @@
+# blog_stats/test_dispatcher.py
+import threading
+
+from blog_stats import metrics
+from blog_stats.dispatcher import BackgroundDispatcher
+
+
+class TestBackgroundDispatcher:
+    def test_submit_and_drain(self):
+        metrics.registry.reset()
+        dispatcher = BackgroundDispatcher(max_size=10, workers=2)
+        calls = []
+
+        for article_id in range(5):
+            assert dispatcher.submit(calls.append, article_id)
+
+        assert dispatcher.drain()
+        assert sorted(calls) == [0, 1, 2, 3, 4]
+        assert metrics.TRACK_DRAIN_SECONDS.count(executor='thread') == 5
+
+    def test_drop_when_full(self):
+        metrics.registry.reset()
+        dispatcher = BackgroundDispatcher(max_size=1, workers=1)
+        release = threading.Event()
+
+        # 第一个事件阻塞工作线程，第二个占满队列，第三个被丢弃
+        assert dispatcher.submit(release.wait)
+        while dispatcher.depth:
+            pass
+        assert dispatcher.submit(lambda: None)
+        assert not dispatcher.submit(lambda: None)
+        assert metrics.TRACK_EVENTS_DROPPED.value(executor='thread') == 1
+
+        release.set()
+        assert dispatcher.drain()
+
+    def test_failing_event_does_not_stop_worker(self):
+        dispatcher = BackgroundDispatcher(max_size=10, workers=1)
+        calls = []
+
+        dispatcher.submit(lambda: 1 / 0)
+        dispatcher.submit(calls.append, 1)
+
+        assert dispatcher.drain()
+        assert calls == [1]
@@ -0,0 +1,41 @@
+# blog_stats/test_local_cache.py
+from unittest.mock import patch
+
+from blog_stats import metrics
+from blog_stats.local_cache import MISSING, LocalTTLCache
+
+
+class TestLocalTTLCache:
+    def test_get_set_and_expiry(self):
+        l1 = LocalTTLCache(max_size=10, ttl=5)
+
+        with patch('blog_stats.local_cache.time.monotonic', return_value=100):
+            assert l1.get('a') is MISSING
+            l1.set('a', 1)
+            assert l1.get('a') == 1
+
+        with patch('blog_stats.local_cache.time.monotonic', return_value=106):
+            assert l1.get('a') is MISSING
+
+    def test_lru_eviction(self):
+        l1 = LocalTTLCache(max_size=2, ttl=60)
+        l1.set('a', 1)
+        l1.set('b', 2)
+        l1.get('a')
+        l1.set('c', 3)
+
+        assert l1.get('b') is MISSING
+        assert l1.get('a') == 1
+        assert len(l1) == 2
+
+    def test_delete_many_and_counters(self):
+        metrics.registry.reset()
+        l1 = LocalTTLCache(max_size=10, ttl=60)
+        l1.set('a', 1)
+        l1.get('a')
+        l1.delete_many(['a'])
+        l1.get('a')
+
+        assert metrics.L1_CACHE_REQUESTS.value(result='hit') == 1
+        assert metrics.L1_CACHE_REQUESTS.value(result='miss') == 1
+        assert metrics.L1_CACHE_EVICTIONS.value(reason='invalidation') == 1
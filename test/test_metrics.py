@@ -0,0 +1,11 @@
+# blog_stats/test_metrics.py
+from blog_stats.metrics import Counter, Registry
+
+
+class TestRegistry:
+    def test_render_escapes_label_values(self):
+        registry = Registry()
+        counter = registry.register(Counter('test_total', 'Test counter.'))
+        counter.inc(view='a\\b"c\nd')
+
+        assert 'test_total{view="a\\\\b\\"c\\nd"} 1' in registry.render()
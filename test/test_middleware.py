@@ -70,3 +70,72 @@ class TestTrackArticleReadMiddleware:
         middleware(request)
 
         assert not hasattr(request, '_read_tracked')
+
+    def test_middleware_buffered(self, middleware, settings):
+        settings.STATS_READ_BUFFER_ENABLED = True
+        factory = RequestFactory()
+        request = factory.get('/blog/article/123/')
+
+        class MockResolverMatch:
+            kwargs = {'article_id': 123}
+
+        request.resolver_match = MockResolverMatch()
+        request.session = MagicMock(session_key='session1')
+
+        with patch('blog_stats.middleware.get_read_buffer') as mock_buffer, \
+                patch('blog_stats.middleware.StatsCacheService.increment_read') as mock_increment:
+            middleware(request)
+
+            mock_buffer.return_value.add.assert_called_once_with(123, 'session1')
+            mock_increment.assert_not_called()
+            assert request._read_tracked == True
+
+    def test_middleware_background(self, middleware, settings):
+        from blog_stats import metrics
+        from blog_stats.dispatcher import get_background_dispatcher
+
+        settings.STATS_TRACK_DISPATCH = 'background'
+        factory = RequestFactory()
+        request = factory.get('/blog/article/123/')
+
+        class MockResolverMatch:
+            kwargs = {'article_id': 123}
+
+        request.resolver_match = MockResolverMatch()
+        request.session = MagicMock(session_key='session1')
+
+        with patch('blog_stats.middleware.StatsCacheService.increment_read') as mock_increment:
+            middleware(request)
+            assert get_background_dispatcher().drain()
+
+            mock_increment.assert_called_once_with(123, 'session1')
+            assert request._read_tracked == True
+            assert metrics.TRACK_QUEUE_DEPTH.value(executor='thread') == 0
+
+    def test_middleware_async(self, settings):
+        from asgiref.sync import async_to_sync
+        from blog_stats.dispatcher import get_async_dispatcher
+
+        settings.STATS_TRACK_DISPATCH = 'background'
+
+        async def get_response(request):
+            return MagicMock(status_code=200)
+
+        middleware = TrackArticleReadMiddleware(get_response)
+        request = RequestFactory().get('/blog/article/123/')
+
+        class MockResolverMatch:
+            kwargs = {'article_id': 123}
+
+        request.resolver_match = MockResolverMatch()
+        request.session = MagicMock(session_key='session1')
+
+        async def handle():
+            await middleware(request)
+            await get_async_dispatcher().drain()
+
+        with patch('blog_stats.middleware.AsyncStatsCacheService.increment_read') as mock_increment:
+            async_to_sync(handle)()
+
+            mock_increment.assert_awaited_once_with(123, 'session1')
+            assert request._read_tracked == True
@@ -0,0 +1,124 @@
+# blog_stats/test_redis_client.py
+from unittest.mock import patch
+
+import pytest
+from redis.exceptions import ConnectionError, NoScriptError
+
+from blog_stats import metrics, redis_client
+from blog_stats.redis_client import CircuitBreaker, CircuitOpenError, get_redis_connection, pipeline
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    monkeypatch.setattr(redis_client, '_breaker', breaker)
+    metrics.registry.reset()
+    return breaker
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.record_failure()
+
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        # 只放行一个探测请求
+        assert breaker.allow_request()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow_request()
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow_request()
+
+
+class TestRedisClient:
+    def test_pipeline_helper(self):
+        with pipeline() as pipe:
+            pipe.set('test:pipeline', 1)
+            pipe.incr('test:pipeline')
+
+        assert pipe.results == [True, 2]
+        assert get_redis_connection().get('test:pipeline') == b'2'
+
+    def test_breaker_fails_fast(self, breaker):
+        breaker.reset_timeout = 60
+        with patch('redis.Redis.execute_command', side_effect=ConnectionError('down')):
+            for _ in range(2):
+                with pytest.raises(ConnectionError):
+                    get_redis_connection().get('test:key')
+
+        with pytest.raises(CircuitOpenError):
+            get_redis_connection().get('test:key')
+        assert metrics.REDIS_BREAKER_REJECTIONS.value() == 1
+        assert metrics.REDIS_BREAKER_STATE.value() == 2
+        assert redis_client.get_status()['circuit_breaker'] == 'open'
+
+    def test_breaker_recovers(self, breaker):
+        with patch('redis.Redis.execute_command', side_effect=ConnectionError('down')):
+            for _ in range(2):
+                with pytest.raises(ConnectionError):
+                    get_redis_connection().get('test:key')
+
+        assert get_redis_connection().set('test:key', 1)
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert metrics.REDIS_BREAKER_TRANSITIONS.value(state='closed') == 1
+
+    def test_probe_error_response_closes_breaker(self, breaker):
+        with patch('redis.Redis.execute_command', side_effect=ConnectionError('down')):
+            for _ in range(2):
+                with pytest.raises(ConnectionError):
+                    get_redis_connection().get('test:key')
+
+        # 半开探测收到错误响应时不应一直占用探测名额
+        with patch('redis.Redis.execute_command', side_effect=NoScriptError('no script')):
+            with pytest.raises(NoScriptError):
+                get_redis_connection().evalsha('0' * 40, 0)
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert get_redis_connection().set('test:key', 1)
+
+    def test_async_client_shares_breaker(self, breaker):
+        import asyncio
+        from unittest.mock import AsyncMock
+
+        import fakeredis
+        from redis import asyncio as redis_asyncio
+        from blog_stats.redis_client import AsyncGuardedRedis
+
+        async def scenario():
+            client = AsyncGuardedRedis(connection_pool=fakeredis.aioredis.FakeRedis().connection_pool)
+            assert await client.set('test:key', 1)
+            with patch.object(redis_asyncio.Redis, 'execute_command', AsyncMock(side_effect=ConnectionError('down'))):
+                for _ in range(2):
+                    with pytest.raises(ConnectionError):
+                        await client.get('test:key')
+            breaker.reset_timeout = 60
+            with pytest.raises(CircuitOpenError):
+                await client.get('test:key')
+            # 同步客户端同样被拒绝
+            with pytest.raises(CircuitOpenError):
+                get_redis_connection().get('test:key')
+            pipe = client.pipeline(transaction=False)
+            pipe.get('test:key')
+            with pytest.raises(CircuitOpenError):
+                await pipe.execute()
+
+        asyncio.run(scenario())
+        assert breaker.state == CircuitBreaker.OPEN
+
+    def test_status(self):
+        status = redis_client.get_status()
+
+        assert status['pool']['max'] > 0
+        assert status['circuit_breaker'] in ('closed', 'half_open', 'open')
+        assert metrics.REDIS_POOL_CONNECTIONS.value(state='in_use') >= 0
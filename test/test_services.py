@@ -70,8 +70,9 @@ class TestStatsCacheService:
 
     @patch('blog_stats.services.logger')
     @pytest.mark.django_db
-    def test_increment_read_cache_failure(self, mock_logger):
-        # 模拟cache方法异常
+    def test_increment_read_cache_failure(self, mock_logger, settings):
+        # 模拟cache方法异常（旧计数方式）
+        settings.STATS_ATOMIC_INCREMENT = False
         with patch('django.core.cache.cache.get', side_effect=Exception("Cache error")):
             article_id = 1
             user_id = "user1"
@@ -83,10 +84,269 @@ class TestStatsCacheService:
             mock_logger.error.assert_called()
             assert mock_logger.error.call_count >= 1
 
+    @pytest.mark.django_db
+    def test_increment_read_db(self):
+        from blog_stats.models import ArticleStats, UserRead
+
+        assert StatsCacheService.increment_read_db(1, "user1") is True
+        assert StatsCacheService.increment_read_db(1, "user1", 2) is False
+        assert StatsCacheService.increment_read_db(1, "user2") is True
+        assert StatsCacheService.increment_reads_db_bulk({(1, "user2"): 1, (1, "user3"): 4}) == {(1, "user3")}
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (9, 3)
+        assert UserRead.objects.get(article_id=1, user_id="user1").read_count == 3
+        assert UserRead.objects.get(article_id=1, user_id="user2").read_count == 2
+
     def test_cache_hit_rate_calculation(self):
-        # 设置初始命中率
-        cache.set("cache:hits", 80)
-        cache.set("cache:misses", 20)
+        from blog_stats import metrics
+
+        # 设置初始命中率（进程内计数器）
+        metrics.registry.reset()
+        metrics.CACHE_REQUESTS.inc(80, view='article_stats', result='hit')
+        metrics.CACHE_REQUESTS.inc(20, view='article_stats', result='miss')
 
         hit_rate = StatsCacheService.get_cache_hit_rate()
         assert hit_rate == 80.0  # 80/(80+20)=80%
+
+    def test_increment_read_atomic(self, settings):
+        settings.STATS_ATOMIC_INCREMENT = True
+        article_id = 1
+
+        assert StatsCacheService.increment_read(article_id, "user1") is True
+        assert StatsCacheService.increment_read(article_id, "user1") is False
+        assert StatsCacheService.increment_read(article_id, "user2") is True
+
+        assert StatsCacheService.get_total_reads(article_id) == 3
+        assert StatsCacheService.get_user_count(article_id) == 2
+        assert StatsCacheService.get_user_read_count(article_id, "user1") == 2
+
+    def test_increment_read_approximate(self, settings):
+        settings.STATS_USER_COUNT_MODE = 'approximate'
+        article_id = 1
+
+        assert StatsCacheService.increment_read(article_id, "user1") is True
+        assert StatsCacheService.increment_read(article_id, "user1") is False
+        assert StatsCacheService.increment_read(article_id, "user2") is True
+
+        assert StatsCacheService.get_total_reads(article_id) == 3
+        assert StatsCacheService.get_user_count(article_id) == 2
+        assert StatsCacheService.get_approximate_user_count(article_id) == 2
+        # 近似模式下不保存逐用户阅读次数
+        assert cache.get(f"article:{article_id}:user:user1") is None
+        assert StatsCacheService.get_user_read_count(article_id, "user1") is None
+
+    def test_increment_reads_bulk(self):
+        result = StatsCacheService.increment_reads_bulk({(1, "user1"): 3, (1, "user2"): 1, (2, "user1"): 2})
+
+        assert result == {(1, "user1"): True, (1, "user2"): True, (2, "user1"): True}
+        assert StatsCacheService.get_total_reads(1) == 4
+        assert StatsCacheService.get_user_count(1) == 2
+        assert StatsCacheService.get_user_read_count(1, "user1") == 3
+        assert StatsCacheService.get_total_reads(2) == 2
+
+    def test_leaderboard(self, settings):
+        settings.STATS_ATOMIC_INCREMENT = True
+        for _ in range(3):
+            StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.increment_read(2, "user1")
+        StatsCacheService.increment_reads_bulk({(3, "user1"): 5})
+
+        for window in ('hour', 'day', '24h', 'all'):
+            assert StatsCacheService.get_leaderboard(window, 2) == [(3, 5), (1, 3)]
+        assert StatsCacheService.get_top_articles() == [(3, 5), (1, 3), (2, 1)]
+
+        with pytest.raises(ValueError):
+            StatsCacheService.get_leaderboard('week')
+
+    @pytest.mark.django_db
+    def test_read_series(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from blog_stats.models import ReadRollup
+        from blog_stats.services import floor_time
+
+        StatsCacheService.increment_reads_bulk({(1, "user1"): 2, (1, "user2"): 1})
+        now = timezone.now()
+        old_hour = floor_time(now, 'hour') - timedelta(hours=30)
+        ReadRollup.objects.create(article_id=1, granularity='hour', bucket_start=old_hour, reads=7)
+
+        minute_series = StatsCacheService.get_read_series(1, now - timedelta(minutes=5), now, 'minute')
+        assert minute_series[-1] == (floor_time(now, 'minute'), 3)
+        assert sum(reads for _, reads in minute_series) == 3
+
+        hour_series = dict(StatsCacheService.get_read_series(1, old_hour, now, 'hour'))
+        assert hour_series[old_hour] == 7
+        assert hour_series[floor_time(now, 'hour')] == 3
+        assert sum(hour_series.values()) == 10
+
+    @pytest.mark.django_db
+    def test_read_histogram(self, settings):
+        from blog_stats.models import ArticleStats, UserRead
+
+        settings.STATS_ATOMIC_INCREMENT = True
+        for _ in range(3):
+            StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.increment_read(1, "user2")
+        StatsCacheService.increment_reads_bulk({(1, "user3"): 4})
+
+        assert StatsCacheService.get_read_histogram(1) == {'1': 1, '2-3': 1, '4-7': 1}
+        assert StatsCacheService.get_read_histogram() == {'1': 1, '2-3': 1, '4-7': 1}
+
+        ArticleStats.objects.create(article_id=2, total_reads=9, user_count=2)
+        UserRead.objects.create(article_id=2, user_id="user1", read_count=1)
+        UserRead.objects.create(article_id=2, user_id="user2", read_count=8)
+        assert StatsCacheService.load_read_histogram(2) == {'1': 1, '8-15': 1}
+        assert StatsCacheService.get_read_histogram(2) == {'1': 1, '8-15': 1}
+
+    def test_local_cache_in_front_of_redis(self, settings):
+        from blog_stats import local_cache
+
+        settings.STATS_L1_CACHE_ENABLED = True
+        cache.set("article:1:total_reads", 100)
+        assert StatsCacheService.get_total_reads(1) == 100
+
+        # L1命中期间不读取Redis
+        cache.set("article:1:total_reads", 200)
+        assert StatsCacheService.get_total_reads(1) == 100
+
+        # 回填时失效L1
+        StatsCacheService.cache_stats(1, 300, 10)
+        assert StatsCacheService.get_total_reads(1) == 300
+        local_cache.get_local_cache().clear()
+
+    def test_single_flight(self, settings):
+        settings.STATS_STAMPEDE_LOCK_WAIT_MS = 50
+        settings.STATS_STAMPEDE_POLL_MS = 10
+        rebuild = MagicMock(return_value=42)
+
+        assert StatsCacheService.single_flight('test', 'test', rebuild, lambda: None) == (42, 'rebuilt')
+
+        token = StatsCacheService.acquire_rebuild_lock('test')
+        assert StatsCacheService.single_flight('test', 'test', rebuild, lambda: None, stale=41) == (41, 'stale')
+        assert StatsCacheService.single_flight('test', 'test', rebuild, lambda: 43) == (43, 'waited')
+        assert StatsCacheService.single_flight('test', 'test', rebuild, lambda: None) == (None, 'timeout')
+        assert rebuild.call_count == 1
+        assert StatsCacheService.release_rebuild_lock('test', token) == 3
+
+    def test_hash_layout(self, settings):
+        settings.STATS_KEY_LAYOUT = 'hash'
+
+        assert StatsCacheService.increment_read(1, "user1") is True
+        assert StatsCacheService.increment_read(1, "user1") is False
+        assert StatsCacheService.increment_read(1, "user2") is True
+
+        assert StatsCacheService.get_stats_snapshot(1)[:2] == (3, 2)
+        assert StatsCacheService.get_user_read_count(1, "user1") == 2
+        # 计数和用户阅读次数各只占用一个键
+        redis_conn = get_redis_connection("default")
+        assert redis_conn.hgetall(cache.make_key("article:1:counters")) == {b'total_reads': b'3', b'user_count': b'2'}
+        assert redis_conn.hlen(cache.make_key("article:1:user_reads")) == 2
+        assert cache.get("article:1:total_reads") is None
+
+        StatsCacheService.cache_stats_many({2: (10, 4)})
+        assert StatsCacheService.get_stats_many([1, 2, 3]) == {1: (3, 2), 2: (10, 4)}
+        snapshot = StatsCacheService.get_flush_snapshot([1])
+        assert snapshot == {1: (3, 2, {"user1": 2, "user2": 1})}
+
+    def test_hash_layout_merges_legacy_keys(self, settings):
+        # keys 布局写入的计数在切换到 hash 布局后被就地合并，不丢失也不重复计数
+        StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.increment_read(2, "user1")
+        settings.STATS_KEY_LAYOUT = 'hash'
+
+        assert StatsCacheService.increment_read(1, "user1") is False
+        assert StatsCacheService.increment_read(1, "user2") is True
+        assert StatsCacheService.get_total_reads(1) == 4
+        assert StatsCacheService.get_user_count(1) == 2
+        assert StatsCacheService.get_user_read_count(1, "user1") == 3
+        assert cache.get("article:1:user:user1") is None
+
+        # 未再被写入的文章在读取时迁移
+        assert StatsCacheService.get_stats_snapshot(2)[:2] == (1, 1)
+        assert cache.get("article:2:total_reads") is None
+        assert StatsCacheService.get_user_read_count(2, "user1") == 1
+
+
+@pytest.mark.django_db
+class TestRetention:
+    @pytest.fixture(autouse=True)
+    def retention(self, settings):
+        settings.STATS_RETENTION_ENABLED = True
+        settings.STATS_RETENTION_MIN_TTL = 600
+
+    def test_dirty_counters_pinned_until_flushed(self):
+        from blog_stats.tasks import flush_dirty_stats
+
+        for _ in range(3):
+            StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.increment_read(2, "user1")
+        assert cache.ttl("article:1:total_reads") is None
+        assert cache.ttl("article:1:user:user1") is None
+
+        flush_dirty_stats()
+
+        # 当天阅读3次：600 * 3；阅读1次：600 * 2
+        assert 1790 < cache.ttl("article:1:total_reads") <= 1800
+        assert 1790 < cache.ttl("article:1:user:user1") <= 1800
+        assert 1190 < cache.ttl("article:2:user_count") <= 1200
+
+    def test_redirtied_article_stays_pinned(self):
+        StatsCacheService.increment_read(1, "user1")
+        snapshot = StatsCacheService.get_flush_snapshot(StatsCacheService.pop_dirty_articles(10))
+        # 落库期间又有新的阅读
+        StatsCacheService.increment_read(1, "user1")
+
+        assert StatsCacheService.release_flushed(snapshot) == 0
+        assert cache.ttl("article:1:total_reads") is None
+
+    def test_early_refresh_does_not_unpin(self):
+        StatsCacheService.increment_read(1, "user1")
+        meta = {'total_reads': 1, 'user_count': 1, 'expires_at': 0, 'delta': 0}
+
+        assert StatsCacheService.extend_stats_ttl(1, meta)
+        assert cache.ttl("article:1:total_reads") is None
+
+    def test_evicts_coldest_clean_articles(self):
+        for article_id in (1, 2, 3):
+            StatsCacheService.increment_read(article_id, "user1")
+        StatsCacheService.release_flushed(StatsCacheService.get_flush_snapshot(
+            StatsCacheService.pop_dirty_articles(10)))
+        StatsCacheService.mark_dirty(1, "user1")
+
+        assert StatsCacheService.evict_cold_articles(2) == (1, 1)
+        assert StatsCacheService.evict_cold_articles(2, offset=1) == (1, 0)
+        assert StatsCacheService.get_stats_many([1, 2, 3]) == {1: (1, 1)}
+        assert StatsCacheService.get_user_read_count(2, "user1") == 1
+
+
+
+class TestUserHistory:
+    def test_records_capped_history(self, settings):
+        from datetime import datetime
+        from blog_stats.services import history_score
+
+        settings.STATS_USER_HISTORY_SIZE = 2
+        for article_id, minute in ((1, 1), (2, 2), (3, 3)):
+            with patch('blog_stats.services.timezone.now', return_value=datetime(2024, 1, 1, 12, minute)):
+                StatsCacheService.increment_read(article_id, "user1")
+
+        # 尚未与数据库合并，不能作为完整历史返回
+        assert StatsCacheService.get_user_history("user1") is None
+        assert StatsCacheService.cache_user_history("user1", [(1, history_score(datetime(2024, 1, 1, 13)))]) == [
+            (1, history_score(datetime(2024, 1, 1, 13))), (3, history_score(datetime(2024, 1, 1, 12, 3)))]
+        assert StatsCacheService.get_last_read_times([(3, "user1"), (2, "user1")]) == {
+            (3, "user1"): datetime(2024, 1, 1, 12, 3), (2, "user1"): None}
+
+    @pytest.mark.parametrize('atomic', [True, False])
+    def test_recreated_history_needs_backfill(self, settings, atomic):
+        settings.STATS_ATOMIC_INCREMENT = atomic
+        StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.cache_user_history("user1", [])
+        assert [article_id for article_id, _ in StatsCacheService.get_user_history("user1")] == [1]
+
+        # 历史过期后由新的阅读重新创建，需要重新回填
+        cache.delete("user:user1:history")
+        StatsCacheService.increment_read(2, "user1")
+        assert StatsCacheService.get_user_history("user1") is None
@@ -4,6 +4,7 @@ from unittest.mock import patch
 import pytest
 
 from blog_stats.models import ArticleStats, UserRead
+from blog_stats.services import StatsCacheService
 from blog_stats.tasks import async_update_stats
 
 
@@ -30,14 +31,14 @@ class TestAsyncUpdateStats:
         # 执行异步任务
         async_update_stats(article_id, user_id)
 
-        # 验证数据库更新
+        # 按增量累加一次阅读，不以缓存中的计数覆盖数据库
         stats = ArticleStats.objects.get(article_id=article_id)
-        assert stats.total_reads == 5
-        assert stats.user_count == 3
+        assert stats.total_reads == 1
+        assert stats.user_count == 1
 
         # 验证用户阅读记录
         user_read = UserRead.objects.get(article_id=article_id, user_id=user_id)
-        assert user_read.read_count >= 1
+        assert user_read.read_count == 1
 
     def test_existing_article_update(self, cache):
         article_id = 1
@@ -57,8 +58,8 @@ class TestAsyncUpdateStats:
 
         # 验证数据库更新
         stats = ArticleStats.objects.get(article_id=article_id)
-        assert stats.total_reads == 15
-        assert stats.user_count == 3
+        assert stats.total_reads == 11
+        assert stats.user_count == 2
 
         # 验证用户阅读记录更新
         user_read = UserRead.objects.get(article_id=article_id, user_id=user_id)
@@ -67,7 +68,7 @@ class TestAsyncUpdateStats:
     @patch('blog_stats.tasks.logger')
     def test_task_retry_on_failure(self, mock_logger):
         # 模拟数据库错误
-        with patch('blog_stats.models.ArticleStats.objects.get_or_create',
+        with patch('blog_stats.services.StatsCacheService.increment_reads_db_bulk',
                    side_effect=Exception("DB error")):
             article_id = 1
             user_id = "user1"
@@ -81,3 +82,422 @@ class TestAsyncUpdateStats:
             # 重试
             mock_logger.error.assert_called()
             assert mock_logger.error.call_count >= 1
+
+
+@pytest.mark.django_db
+class TestAsyncUpdateStatsBatch:
+    def test_batch_writes_multiple_articles(self, cache, settings):
+        from blog_stats.tasks import async_update_stats_batch, flush_dirty_stats
+        settings.STATS_TASK_CHUNK_ARTICLES = 1
+
+        ArticleStats.objects.create(article_id=1, total_reads=1, user_count=1)
+        UserRead.objects.create(article_id=1, user_id="user2", read_count=2)
+        StatsCacheService.increment_read(1, "user1")
+        for _ in range(3):
+            StatsCacheService.increment_read(1, "user2")
+        StatsCacheService.increment_read(2, "user3")
+
+        # 按增量累加，不以缓存中的计数覆盖数据库
+        async_update_stats_batch(events=[[1, "user1"], [1, "user2", 3], [2, "user3", 1]], article_ids=[3])
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (5, 2)
+        assert UserRead.objects.get(article_id=1, user_id="user1").read_count == 1
+        assert UserRead.objects.get(article_id=1, user_id="user2").read_count == 5
+        assert UserRead.objects.get(article_id=2, user_id="user3").read_count == 1
+        assert ArticleStats.objects.filter(article_id__in=[2, 3]).count() == 2
+
+        # 已由批量任务写入的阅读不会被 flush_dirty_stats 重复累加
+        flush_dirty_stats()
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (5, 2)
+        assert UserRead.objects.get(article_id=1, user_id="user2").read_count == 5
+        assert ArticleStats.objects.get(article_id=2).total_reads == 1
+
+    def test_chunk_rolls_back_when_offset_fails(self, cache):
+        from blog_stats.tasks import flush_dirty_stats, write_stats_chunk
+
+        StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.increment_read(1, "user1")
+        with patch('blog_stats.services.StatsCacheService.offset_pending', side_effect=Exception("Redis error")):
+            with pytest.raises(Exception):
+                write_stats_chunk({1: {"user1": 2}})
+        assert not UserRead.objects.filter(article_id=1).exists()
+
+        # 增量未扣除，由定时落库写入一次
+        flush_dirty_stats()
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (2, 1)
+
+    def test_chunk_restores_pending_when_commit_fails(self, cache):
+        from contextlib import contextmanager
+        from types import SimpleNamespace
+        from django.db import DatabaseError, transaction
+        from blog_stats.tasks import flush_dirty_stats, write_stats_chunk
+
+        @contextmanager
+        def failing_atomic():
+            with transaction.atomic():
+                yield
+                raise DatabaseError("commit failed")
+
+        StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.increment_read(1, "user2")
+        with patch('blog_stats.tasks.transaction', SimpleNamespace(atomic=failing_atomic)):
+            with pytest.raises(DatabaseError):
+                write_stats_chunk({1: {"user1": 1, "user2": 1}})
+        assert not UserRead.objects.filter(article_id=1).exists()
+
+        # 已扣除的增量被加回，由定时落库写入一次
+        flush_dirty_stats()
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (2, 2)
+        assert UserRead.objects.get(article_id=1, user_id="user2").read_count == 1
+
+    def test_batch_retries_remaining_articles(self, cache, settings):
+        from blog_stats.tasks import async_update_stats_batch, write_stats_chunk
+        settings.STATS_TASK_CHUNK_ARTICLES = 1
+
+        with patch('blog_stats.tasks.write_stats_chunk',
+                   side_effect=[write_stats_chunk({1: {}}), Exception("DB error")]), \
+                patch.object(async_update_stats_batch, 'retry', side_effect=RuntimeError) as mock_retry:
+            with pytest.raises(RuntimeError):
+                async_update_stats_batch(events=[[1, "user1"], [2, "user1"], [3, "user2", 2]])
+
+        assert mock_retry.call_args.kwargs['kwargs'] == {
+            'events': [[2, "user1", 1], [3, "user2", 2]],
+            'article_ids': [2, 3],
+        }
+
+
+@pytest.mark.django_db
+class TestFlushDirtyStats:
+    def test_flush_writes_dirty_articles(self, cache):
+        from blog_stats.tasks import flush_dirty_stats
+
+        StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.increment_read(1, "user1")
+        StatsCacheService.increment_read(1, "user2")
+        StatsCacheService.increment_read(2, "user1")
+
+        report = flush_dirty_stats(batch_size=1)
+
+        assert report['articles'] == 2
+        assert report['article_rows'] == 2
+        assert report['user_rows'] == 3
+        assert 'elapsed_ms' in report
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert stats.total_reads == 3
+        assert stats.user_count == 2
+        assert UserRead.objects.get(article_id=1, user_id="user1").read_count == 2
+
+        # 已落库的文章不会重复写入
+        assert flush_dirty_stats()['articles'] == 0
+
+    @pytest.mark.parametrize('atomic', [True, False])
+    def test_flush_after_cold_counter_keeps_db_totals(self, cache, settings, atomic):
+        from blog_stats.tasks import flush_dirty_stats
+        settings.STATS_ATOMIC_INCREMENT = atomic
+
+        # 缓存计数已过期，从0重新计数
+        ArticleStats.objects.create(article_id=1, total_reads=1000, user_count=50)
+        UserRead.objects.create(article_id=1, user_id="user1", read_count=20)
+        StatsCacheService.seed_leaderboard({1: 1000})
+        StatsCacheService.increment_read(1, "user1")
+        # 总榜按增量累加，计数从0重新开始不会拉低排名
+        assert StatsCacheService.get_leaderboard('all', 1) == [(1, 1001)]
+        flush_dirty_stats()
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (1001, 50)
+        assert UserRead.objects.get(article_id=1, user_id="user1").read_count == 21
+        # 落库后缓存中的计数恢复为数据库的值
+        assert StatsCacheService.get_stats_many([1]) == {1: (1001, 50)}
+        assert StatsCacheService.get_user_read_count(1, "user1") == 21
+        assert StatsCacheService.get_leaderboard('all', 1) == [(1, 1001)]
+
+    def test_flush_writes_last_read_from_history(self, cache):
+        from datetime import datetime
+        from blog_stats.tasks import flush_dirty_stats
+
+        with patch('blog_stats.services.timezone.now', return_value=datetime(2024, 1, 1, 12, 30)):
+            StatsCacheService.increment_read(1, "user1")
+        flush_dirty_stats()
+
+        assert UserRead.objects.get(article_id=1, user_id="user1").last_read == datetime(2024, 1, 1, 12, 30)
+
+    def test_flush_restores_dirty_set_on_failure(self, cache):
+        from blog_stats.tasks import flush_dirty_stats
+
+        StatsCacheService.increment_read(1, "user1")
+
+        with patch('blog_stats.tasks.write_flush_snapshot', side_effect=Exception("DB error")):
+            assert flush_dirty_stats()['articles'] == 0
+
+        assert flush_dirty_stats()['user_rows'] == 1
+
+
+@pytest.mark.django_db
+class TestCompactReadSeries:
+    def test_compact_rolls_up_hours_and_days(self, cache):
+        from datetime import timedelta
+        from django.utils import timezone
+        from blog_stats.models import ReadRollup
+        from blog_stats.services import floor_time
+        from blog_stats.tasks import compact_read_series
+
+        last_hour = floor_time(timezone.now(), 'hour') - timedelta(hours=1)
+        with patch('blog_stats.services.timezone.now', return_value=last_hour + timedelta(minutes=5)):
+            StatsCacheService.increment_reads_bulk({(1, "user1"): 2, (2, "user1"): 1})
+        with patch('blog_stats.services.timezone.now', return_value=last_hour + timedelta(minutes=50)):
+            StatsCacheService.increment_reads_bulk({(1, "user2"): 3})
+
+        report = compact_read_series(lookback_hours=2)
+        # 重复执行结果不变
+        compact_read_series(lookback_hours=2)
+
+        assert report['hour_rows'] == 2
+        assert ReadRollup.objects.get(article_id=1, granularity='hour', bucket_start=last_hour).reads == 5
+        assert ReadRollup.objects.get(
+            article_id=1, granularity='day', bucket_start=floor_time(last_hour, 'day')).reads == 5
+        assert ReadRollup.objects.filter(granularity='hour').count() == 2
+
+
+@pytest.mark.django_db
+class TestReconcileGlobalStats:
+    def test_reconcile_corrects_drift(self, cache):
+        from blog_stats.models import GlobalStats
+        from blog_stats.tasks import reconcile_global_stats
+
+        ArticleStats.objects.create(article_id=1, total_reads=10, user_count=1)
+        UserRead.objects.create(article_id=1, user_id="user1", read_count=10)
+        StatsCacheService.set_global_stats(7, 3, 3)
+
+        report = reconcile_global_stats()
+
+        assert report['drift'] == {'total_reads': 3, 'total_users': -2, 'active_users': -2}
+        assert StatsCacheService.get_global_stats() == {'total_reads': 10, 'total_users': 1, 'active_users': 1}
+        global_stats = GlobalStats.objects.get(pk=1)
+        assert global_stats.total_reads == 10
+        assert global_stats.last_reconciled is not None
+
+
+@pytest.mark.django_db
+class TestReconcileStatsKeyspace:
+    def test_corrects_both_sides(self, cache):
+        from blog_stats.tasks import reconcile_stats_keyspace
+
+        # 文章1：Redis 有未落库的阅读；文章2：缓存过期后从0重新计数，数据库较大
+        cache.set("article:1:total_reads", 5)
+        cache.set("article:1:user_count", 2)
+        cache.set("article:1:user:user1", 3)
+        cache.set("article:1:user:user2", 2)
+        cache.set("article:2:total_reads", 1)
+        cache.set("article:2:user_count", 1)
+        cache.set("article:2:user:user3", 1)
+        ArticleStats.objects.create(article_id=1, total_reads=3, user_count=1)
+        UserRead.objects.create(article_id=1, user_id="user1", read_count=1)
+        ArticleStats.objects.create(article_id=2, total_reads=10, user_count=1)
+        UserRead.objects.create(article_id=2, user_id="user3", read_count=4)
+
+        report = reconcile_stats_keyspace(max_keys_per_second=0)
+
+        assert report['complete'] and report['articles'] == 2 and report['user_reads'] == 3
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (5, 2)
+        assert UserRead.objects.get(article_id=1, user_id="user1").read_count == 3
+        assert UserRead.objects.get(article_id=1, user_id="user2").read_count == 2
+        assert StatsCacheService.get_stats_many([2]) == {2: (10, 1)}
+        assert StatsCacheService.get_user_read_count(2, "user3") == 4
+        assert (report['db_articles'], report['db_user_reads'], report['cache_articles'], report['cache_user_reads']) \
+            == (1, 2, 1, 1)
+
+        # 再次执行没有差异
+        report = reconcile_stats_keyspace(max_keys_per_second=0)
+        assert (report['db_articles'], report['db_user_reads'], report['cache_articles'], report['cache_user_reads']) \
+            == (0, 0, 0, 0)
+
+    def test_read_after_snapshot_is_not_written_twice(self, cache):
+        from blog_stats.tasks import flush_dirty_stats, reconcile_stats_keyspace
+
+        StatsCacheService.increment_read(1, "user1")
+        flush_dirty_stats()
+        StatsCacheService.increment_read(1, "user1")
+        snapshot = StatsCacheService.get_reconcile_snapshot
+
+        def read_then_track(*args):
+            # 对账读取之后又有一次阅读（计数与增量同时增加）
+            result = snapshot(*args)
+            StatsCacheService.increment_read(1, "user1")
+            return result
+
+        with patch.object(StatsCacheService, 'get_reconcile_snapshot', side_effect=read_then_track):
+            reconcile_stats_keyspace(max_keys_per_second=0)
+        flush_dirty_stats()
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (3, 1)
+        assert UserRead.objects.get(article_id=1, user_id="user1").read_count == 3
+
+    def test_user_count_follows_user_reads(self, cache):
+        from blog_stats.tasks import flush_dirty_stats, reconcile_stats_keyspace
+
+        StatsCacheService.increment_read(1, "user1")
+        flush_dirty_stats()
+        # 用户键过期后同一用户再次阅读，缓存中的用户数被重复计入
+        cache.delete("article:1:user:user1")
+        StatsCacheService.increment_read(1, "user1")
+        flush_dirty_stats()
+        assert int(cache.get("article:1:user_count")) == 2
+
+        report = reconcile_stats_keyspace(max_keys_per_second=0)
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (2, 1)
+        assert report['db_articles'] == 0
+
+    def test_resumes_from_checkpoint(self, cache):
+        from blog_stats.tasks import reconcile_stats_keyspace
+
+        for article_id in range(1, 11):
+            cache.set(f"article:{article_id}:total_reads", article_id)
+            cache.set(f"article:{article_id}:user_count", 1)
+
+        report = reconcile_stats_keyspace(batch_size=2, max_keys_per_second=0, max_seconds=1e-9)
+        assert not report['complete']
+        assert StatsCacheService.get_reconcile_checkpoint()['cursor'] == report['cursor']
+
+        report = reconcile_stats_keyspace(batch_size=2, max_keys_per_second=0, max_seconds=0)
+        assert report['resumed'] and report['complete']
+        assert report['articles'] >= 10
+        assert StatsCacheService.get_reconcile_checkpoint() is None
+        assert ArticleStats.objects.get(article_id=7).total_reads == 7
+
+    def test_hash_layout(self, cache, settings):
+        from blog_stats.tasks import flush_dirty_stats, reconcile_stats_keyspace
+        settings.STATS_KEY_LAYOUT = 'hash'
+
+        for _ in range(3):
+            StatsCacheService.increment_read(1, "user1")
+        ArticleStats.objects.create(article_id=1, total_reads=1, user_count=1)
+        UserRead.objects.create(article_id=1, user_id="user0", read_count=1)
+
+        report = reconcile_stats_keyspace(max_keys_per_second=0)
+
+        # 尚未落库的3次阅读留给落库累加，数据库中已有的1次阅读计入缓存
+        assert report['user_reads'] == 1
+        assert ArticleStats.objects.get(article_id=1).total_reads == 1
+        assert StatsCacheService.get_stats_many([1]) == {1: (4, 2)}
+
+        flush_dirty_stats()
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (4, 2)
+        assert UserRead.objects.get(article_id=1, user_id="user1").read_count == 3
+
+
+@pytest.mark.django_db
+class TestWarmStatsCache:
+    def test_warms_top_articles_without_overwriting(self, cache):
+        from blog_stats.tasks import warm_stats_cache
+
+        for article_id in range(1, 6):
+            ArticleStats.objects.create(article_id=article_id, total_reads=article_id * 10, user_count=article_id)
+        # 文章5在缓存中已有重启后新累加的计数
+        cache.set("article:5:total_reads", 7)
+        cache.set("article:5:user_count", 1)
+
+        report = warm_stats_cache(limit=3, batch_size=2, concurrency=2, max_memory_ratio=0)
+
+        assert (report['articles'], report['loaded_articles']) == (3, 2)
+        assert report['hit_rate'] == 100.0 and report['sampled'] == 3
+        assert StatsCacheService.get_stats_many([3, 4, 5]) == {3: (30, 3), 4: (40, 4), 5: (7, 1)}
+        assert StatsCacheService.get_stats_many([1, 2]) == {}
+        # 总榜分数以数据库为准
+        assert StatsCacheService.get_leaderboard('all', 5) == [(5, 50), (4, 40), (3, 30)]
+
+    def test_pages_by_keyset_across_ties(self):
+        from blog_stats.tasks import iter_warm_rows
+
+        for article_id, total_reads in [(1, 5), (2, 9), (3, 5), (4, 5), (5, 1)]:
+            ArticleStats.objects.create(article_id=article_id, total_reads=total_reads, user_count=1)
+
+        # 阅读量相同的文章按 article_id 翻页，不重复也不遗漏
+        assert [row[0] for row in iter_warm_rows('reads', 0, 2)] == [2, 1, 3, 4, 5]
+        assert [row[0] for row in iter_warm_rows('reads', 3, 2)] == [2, 1, 3]
+
+    def test_orders_by_recency(self, cache):
+        from datetime import timedelta
+        from django.utils import timezone
+        from blog_stats.tasks import warm_stats_cache
+
+        now = timezone.now()
+        ArticleStats.objects.create(article_id=1, total_reads=100, user_count=1, last_updated=now - timedelta(days=1))
+        ArticleStats.objects.create(article_id=2, total_reads=1, user_count=1, last_updated=now)
+
+        warm_stats_cache(limit=1, order='recent', max_memory_ratio=0)
+
+        assert StatsCacheService.get_stats_many([1, 2]) == {2: (1, 1)}
+
+    def test_stops_at_memory_limit(self, cache):
+        from blog_stats.tasks import warm_stats_cache
+
+        ArticleStats.objects.create(article_id=1, total_reads=10, user_count=1)
+        with patch('blog_stats.tasks.StatsCacheService.get_memory_usage', return_value=(90, 100)):
+            report = warm_stats_cache(max_memory_ratio=0.8)
+
+        assert report['stopped'] == 'memory' and report['loaded_articles'] == 0
+        assert report['hit_rate'] == 0.0
+
+    def test_samples_only_written_batches(self, cache):
+        from blog_stats.tasks import warm_stats_cache
+
+        ArticleStats.objects.create(article_id=1, total_reads=10, user_count=1)
+        ArticleStats.objects.create(article_id=2, total_reads=5, user_count=1)
+        # 第一批写入后内存达到上限，第二批被丢弃，不计入命中率抽样
+        with patch('blog_stats.tasks.StatsCacheService.get_memory_usage', side_effect=[(0, 100), (90, 100)]):
+            report = warm_stats_cache(batch_size=1, max_memory_ratio=0.8)
+
+        assert report['stopped'] == 'memory'
+        assert (report['articles'], report['loaded_articles'], report['sampled']) == (1, 1, 1)
+        assert report['hit_rate'] == 100.0
+
+    def test_hash_layout_counts_on_top_of_warmed_values(self, cache, settings):
+        from blog_stats.tasks import warm_stats_cache
+        settings.STATS_KEY_LAYOUT = 'hash'
+
+        ArticleStats.objects.create(article_id=1, total_reads=10, user_count=2)
+        warm_stats_cache(max_memory_ratio=0)
+        StatsCacheService.increment_read(1, "user3")
+
+        assert StatsCacheService.get_stats_many([1]) == {1: (11, 3)}
+
+
+@pytest.mark.django_db
+class TestEnforceStatsMemoryBudget:
+    def test_evicts_until_under_budget(self, cache, settings):
+        from blog_stats.tasks import enforce_stats_memory_budget
+        settings.STATS_RETENTION_ENABLED = True
+        settings.STATS_MEMORY_BUDGET_BYTES = 1000
+
+        for article_id in (1, 2, 3):
+            StatsCacheService.increment_read(article_id, "user1")
+        StatsCacheService.release_flushed(StatsCacheService.get_flush_snapshot(
+            StatsCacheService.pop_dirty_articles(10)))
+        # 文章1有尚未落库的计数
+        StatsCacheService.mark_dirty(1, "user1")
+
+        with patch('blog_stats.tasks.StatsCacheService.get_memory_usage',
+                   side_effect=[(5000, 0), (5000, 0), (500, 0)]):
+            report = enforce_stats_memory_budget(batch_size=2)
+
+        assert (report['evicted'], report['skipped_dirty'], report['over_budget']) == (2, 1, False)
+        assert StatsCacheService.get_stats_many([1, 2, 3]) == {1: (1, 1)}
+
+    def test_disabled_without_budget(self, settings):
+        from blog_stats.tasks import enforce_stats_memory_budget
+        settings.STATS_RETENTION_ENABLED = True
+        settings.STATS_MEMORY_BUDGET_BYTES = 0
+
+        assert enforce_stats_memory_budget() is None
+
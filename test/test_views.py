@@ -48,6 +48,52 @@ class TestArticleStatsViews:
             stats = ArticleStats.objects.get(article_id=1)
             assert stats.total_reads >= 0
 
+    def test_track_article_read_fallback_accumulates(self, client):
+        with patch('blog_stats.services.StatsCacheService.increment_read',
+                   side_effect=Exception("Redis error")):
+            url = reverse('track-read', kwargs={'article_id': 1})
+            client.post(url)
+            client.post(url)
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (2, 1)
+        assert UserRead.objects.get(article_id=1).read_count == 2
+
+    def test_track_article_read_fallback_survives_flush(self, client):
+        from blog_stats.tasks import flush_dirty_stats
+
+        url = reverse('track-read', kwargs={'article_id': 1})
+        with patch('blog_stats.services.StatsCacheService.increment_read',
+                   side_effect=Exception("Redis error")):
+            client.post(url)
+            client.post(url)
+
+        # Redis恢复后的阅读按增量落库，不会覆盖降级期间写入数据库的计数
+        client.post(url)
+        flush_dirty_stats()
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (3, 1)
+        assert UserRead.objects.get(article_id=1).read_count == 3
+
+    def test_track_article_read_enqueues_stats_update(self, client, settings):
+        from blog_stats.buffer import StatsTaskBatcher
+        from blog_stats.tasks import flush_dirty_stats
+        settings.STATS_TASK_BATCH_ENABLED = True
+
+        url = reverse('track-read', kwargs={'article_id': 1})
+        with patch('blog_stats.tasks.get_task_batcher', return_value=StatsTaskBatcher(max_events=1)):
+            client.post(url)
+            client.post(url)
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (2, 1)
+
+        # 已由落库任务写入的阅读不会被定时落库重复累加
+        flush_dirty_stats()
+        stats = ArticleStats.objects.get(article_id=1)
+        assert (stats.total_reads, stats.user_count) == (2, 1)
+
     def test_get_stats_cache_hit(self, client):
         # 设置缓存值
         cache.set(f"article:1:total_reads", 100)
@@ -61,6 +107,7 @@ class TestArticleStatsViews:
         assert data['total_reads'] == 100
         assert data['user_count'] == 50
         assert data['source'] in ['cache', 'database', 'default']
+        assert data['user_count_mode'] == 'exact'
 
     def test_get_stats_cache_miss(self, client):
         # 创建数据库记录
@@ -80,10 +127,49 @@ class TestArticleStatsViews:
         if cached_total is not None:
             assert int(cached_total) == 200
 
+    def test_get_stats_serves_stale_while_rebuilding(self, client, settings):
+        from blog_stats import metrics
+        from blog_stats.services import StatsCacheService
+
+        metrics.registry.reset()
+        settings.STATS_EARLY_REFRESH_BETA = 0
+        ArticleStats.objects.create(article_id=1, total_reads=300, user_count=120)
+        StatsCacheService.cache_stats(1, 200, 100)
+        cache.delete_many(["article:1:total_reads", "article:1:user_count"])
+
+        # 其他worker持有重建锁时返回旧值
+        token = StatsCacheService.acquire_rebuild_lock("article:1:stats")
+        data = client.get(reverse('article-stats', kwargs={'article_id': 1})).json()
+        assert (data['total_reads'], data['user_count'], data['source']) == (200, 100, 'stale')
+        assert StatsCacheService.release_rebuild_lock("article:1:stats", token) == 1
+
+        # 锁释放后由本请求重建
+        data = client.get(reverse('article-stats', kwargs={'article_id': 1})).json()
+        assert (data['total_reads'], data['source']) == (300, 'database')
+        assert metrics.STAMPEDE_REBUILDS.value(kind='article_stats', outcome='stale') == 1
+        assert metrics.STAMPEDE_REBUILDS.value(kind='article_stats', outcome='rebuilt') == 1
+
+    def test_get_stats_early_refresh(self, client):
+        from blog_stats import metrics
+        from blog_stats.services import StatsCacheService
+
+        metrics.registry.reset()
+        # 重建耗时远大于剩余TTL时必然提前刷新
+        StatsCacheService.cache_stats(1, 200, 100, delta=10 ** 6)
+        cache.expire("article:1:total_reads", 5)
+
+        data = client.get(reverse('article-stats', kwargs={'article_id': 1})).json()
+
+        assert (data['total_reads'], data['source']) == (200, 'cache')
+        assert cache.ttl("article:1:total_reads") > 5
+        assert metrics.STAMPEDE_REBUILDS.value(kind='article_stats', outcome='early_refresh') == 1
+
     def test_get_cache_stats(self, client):
-        # 使用cache而不是直接操作redis_conn
-        cache.set("cache:hits", 90)
-        cache.set("cache:misses", 10)
+        from blog_stats import metrics
+
+        metrics.registry.reset()
+        metrics.CACHE_REQUESTS.inc(90, view='article_stats', result='hit')
+        metrics.CACHE_REQUESTS.inc(10, view='article_stats', result='miss')
 
         url = reverse('cache-stats')
         response = client.get(url)
@@ -92,3 +178,309 @@ class TestArticleStatsViews:
         if response.status_code == 200:
             data = response.json()
             assert 'hit_rate' in data or 'error' in data
+
+    def test_cache_stats_reports_memory_budget(self, client, settings):
+        from blog_stats.redis_client import GuardedRedis
+        from blog_stats.services import StatsCacheService
+        settings.STATS_MEMORY_BUDGET_BYTES = 1000
+        StatsCacheService.increment_read(1, "user1")
+
+        # fakeredis 不支持 INFO 命令
+        with patch.object(GuardedRedis, 'info', return_value={'used_memory': 500, 'maxmemory': 0}):
+            response = client.get(reverse('cache-stats'))
+
+        assert response.status_code == 200
+        retention = response.json()['retention']
+        assert (retention['budget_usage'], retention['pinned_articles']) == ('50.00%', 1)
+
+    def test_track_batch(self, client):
+        from blog_stats.services import StatsCacheService
+        url = reverse('track-batch')
+        events = [
+            {'article_id': 1},
+            {'article_id': 1, 'count': 2},
+            {'article_id': 2},
+            {'article_id': 'bad'},
+        ]
+        response = client.post(url, events, format='json')
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['status'] == 'success'
+        assert data['accepted'] == 3
+        assert [item['status'] for item in data['results']] == ['success', 'success', 'success', 'invalid']
+        assert int(cache.get("article:1:total_reads")) == 3
+        assert int(cache.get("article:1:user_count")) == 1
+        # 用户标识取自请求
+        assert StatsCacheService.get_user_read_count(1, '127.0.0.1') == 3
+
+    def test_track_batch_rejects_user_id_from_browser(self, client):
+        response = client.post(reverse('track-batch'), [{'article_id': 1, 'user_id': 'user1'}], format='json')
+
+        assert response.status_code == 400
+        assert cache.get("article:1:total_reads") is None
+
+    def test_track_batch_rejects_large_count(self, client, settings):
+        settings.STATS_TRACK_BATCH_MAX_COUNT = 10
+        response = client.post(reverse('track-batch'), [{'article_id': 1, 'count': 11}, {'article_id': 2, 'count': 10}],
+                               format='json')
+
+        assert response.status_code == 200
+        assert [item['status'] for item in response.json()['results']] == ['invalid', 'success']
+        assert cache.get("article:1:total_reads") is None
+
+    def test_track_batch_producer_token(self, settings):
+        from blog_stats.services import StatsCacheService
+        settings.STATS_TRACK_PRODUCER_TOKEN = 'secret'
+        url = reverse('track-batch')
+        events = [
+            {'article_id': 1, 'user_id': 'user1', 'count': 2},
+            {'article_id': 1, 'user_id': 'user2'},
+            {'article_id': 1},
+        ]
+
+        # 生产者请求免CSRF校验，按事件中的 user_id 计数
+        client = APIClient(enforce_csrf_checks=True)
+        response = client.post(url, events, format='json', HTTP_AUTHORIZATION='Bearer secret')
+
+        assert response.status_code == 200
+        assert [item['status'] for item in response.json()['results']] == ['success', 'success', 'invalid']
+        assert int(cache.get("article:1:user_count")) == 2
+        assert StatsCacheService.get_user_read_count(1, 'user1') == 2
+
+        # 令牌错误时按浏览器请求处理
+        response = client.post(url, events, format='json', HTTP_AUTHORIZATION='Bearer wrong')
+        assert response.status_code == 403
+
+    def test_track_batch_staff_producer(self, client):
+        from django.contrib.auth.models import User
+        from blog_stats.services import StatsCacheService
+        client.force_login(User.objects.create_user('admin', is_staff=True))
+
+        response = client.post(reverse('track-batch'), [{'article_id': 1, 'user_id': 'user1'}], format='json')
+
+        assert response.status_code == 200
+        assert StatsCacheService.get_user_read_count(1, 'user1') == 1
+
+    def test_track_batch_requires_csrf(self):
+        response = APIClient(enforce_csrf_checks=True).post(
+            reverse('track-batch'), [{'article_id': 1}], format='json')
+
+        assert response.status_code == 403
+
+    def test_track_batch_cache_failure(self, client):
+        ArticleStats.objects.create(article_id=1, total_reads=5, user_count=1)
+        UserRead.objects.create(article_id=1, user_id='127.0.0.1', read_count=5)
+
+        with patch('blog_stats.services.StatsCacheService.increment_reads_bulk',
+                   side_effect=Exception("Redis error")):
+            url = reverse('track-batch')
+            events = [
+                {'article_id': 1, 'count': 2},
+                {'article_id': 1},
+                {'article_id': 2},
+            ]
+            response = client.post(url, events, format='json')
+
+        assert response.status_code == 200
+        assert response.json()['status'] == 'degraded'
+
+        stats = ArticleStats.objects.get(article_id=1)
+        assert stats.total_reads == 8
+        assert stats.user_count == 1
+        assert UserRead.objects.get(article_id=1, user_id='127.0.0.1').read_count == 8
+        assert ArticleStats.objects.get(article_id=2).total_reads == 1
+
+    def test_top_articles(self, client):
+        for _ in range(2):
+            client.post(reverse('track-read', kwargs={'article_id': 1}))
+        client.post(reverse('track-read', kwargs={'article_id': 2}))
+
+        response = client.get(reverse('top-articles'), {'window': '24h', 'k': 5})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['window'] == '24h'
+        assert data['articles'] == [{'article_id': 1, 'reads': 2}, {'article_id': 2, 'reads': 1}]
+
+    def test_top_articles_invalid_window(self, client):
+        response = client.get(reverse('top-articles'), {'window': 'week'})
+        assert response.status_code == 400
+
+    def test_article_read_series(self, client):
+        client.post(reverse('track-read', kwargs={'article_id': 1}))
+
+        response = client.get(reverse('article-series', kwargs={'article_id': 1}), {'step': 'hour'})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['step'] == 'hour'
+        assert sum(point['reads'] for point in data['points']) == 1
+
+    def test_article_read_series_invalid_step(self, client):
+        response = client.get(reverse('article-series', kwargs={'article_id': 1}), {'step': 'week'})
+        assert response.status_code == 400
+
+    def test_get_stats_distribution_pages(self, client):
+        ArticleStats.objects.create(article_id=1, total_reads=6, user_count=3)
+        for index, user_id in enumerate(['user1', 'user2', 'user3'], start=1):
+            UserRead.objects.create(article_id=1, user_id=user_id, read_count=index)
+
+        url = reverse('article-stats', kwargs={'article_id': 1})
+        with patch('blog_stats.tasks.rebuild_read_histogram.delay') as mock_delay:
+            first = client.get(url, {'distribution': 'page', 'limit': 2}).json()
+        assert first['user_read_distribution'] == {'user1': 1, 'user2': 2}
+        assert first['distribution_next_cursor'] == 'user2'
+
+        # 直方图未缓存时不在请求中查询数据库，只入队重建
+        assert first['read_histogram'] is None
+        mock_delay.assert_called_once_with(1)
+        from blog_stats.tasks import rebuild_read_histogram
+        rebuild_read_histogram(1)
+        assert client.get(url).json()['read_histogram'] == {'1': 1, '2-3': 2}
+
+        second = client.get(url, {'distribution': 'page', 'limit': 2, 'cursor': 'user2'}).json()
+        assert second['user_read_distribution'] == {'user3': 3}
+        assert second['distribution_next_cursor'] is None
+
+        # 缺省不返回用户阅读分布
+        assert 'user_read_distribution' not in client.get(url).json()
+
+    def test_get_stats_distribution_stream(self, client):
+        import json
+        ArticleStats.objects.create(article_id=1, total_reads=3, user_count=2)
+        UserRead.objects.create(article_id=1, user_id='user1', read_count=1)
+        UserRead.objects.create(article_id=1, user_id='user2', read_count=2)
+
+        url = reverse('article-stats', kwargs={'article_id': 1})
+        response = client.get(url, {'distribution': 'stream'})
+
+        assert response.status_code == 200
+        data = json.loads(b''.join(response.streaming_content))
+        assert data['total_reads'] == 3
+        assert data['user_read_distribution'] == {'user1': 1, 'user2': 2}
+
+    def test_total_reads_incremental(self, client):
+        client.post(reverse('track-read', kwargs={'article_id': 1}))
+        client.post(reverse('track-read', kwargs={'article_id': 2}))
+
+        response = client.get(reverse('total-reads'))
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['total_reads'] == 2
+        assert data['total_users'] == 1
+        assert data['user_read_distribution_count'] == 1
+        assert data['source'] == 'cache'
+
+    def test_total_reads_cache_miss(self, client):
+        ArticleStats.objects.create(article_id=1, total_reads=10, user_count=2)
+        UserRead.objects.create(article_id=1, user_id='user1', read_count=6)
+        UserRead.objects.create(article_id=1, user_id='user2', read_count=4)
+
+        # 汇总表为空时不在请求中对账，只入队一次对账任务
+        with patch('blog_stats.tasks.reconcile_global_stats.delay') as mock_delay:
+            data = client.get(reverse('total-reads')).json()
+            assert client.get(reverse('total-reads')).json()['source'] == 'stale'
+
+        assert (data['total_reads'], data['total_users'], data['source']) == (0, 0, 'stale')
+        mock_delay.assert_called_once_with()
+
+        from blog_stats.tasks import reconcile_global_stats
+        reconcile_global_stats()
+        data = client.get(reverse('total-reads')).json()
+        assert (data['total_reads'], data['total_users'], data['source']) == (10, 2, 'cache')
+
+        # 缓存过期后读取汇总表
+        cache.delete_pattern("stats:global*")
+        assert client.get(reverse('total-reads')).json()['source'] == 'database'
+
+    def test_metrics_endpoint(self, client):
+        from blog_stats import metrics
+
+        metrics.registry.reset()
+        cache.set("article:1:total_reads", 100)
+        cache.set("article:1:user_count", 50)
+        client.get(reverse('article-stats', kwargs={'article_id': 1}))
+        client.post(reverse('track-read', kwargs={'article_id': 1}))
+
+        response = client.get(reverse('metrics'))
+
+        assert response.status_code == 200
+        body = response.content.decode()
+        assert 'blog_stats_cache_requests_total{result="hit",view="article_stats"} 1' in body
+        assert 'blog_stats_view_seconds_count{view="ArticleStatsView"} 1' in body
+        assert 'blog_stats_increment_read_seconds_count{mode="atomic"} 1' in body
+
+    def test_bulk_stats(self, client):
+        cache.set("article:1:total_reads", 100)
+        cache.set("article:1:user_count", 50)
+        ArticleStats.objects.create(article_id=2, total_reads=20, user_count=10)
+
+        response = client.get(reverse('bulk-stats'), {'ids': '1,2,3'})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['hits'] == 1
+        assert data['misses'] == 2
+        assert [(item['article_id'], item['total_reads'], item['source']) for item in data['articles']] == [
+            (1, 100, 'cache'), (2, 20, 'database'), (3, 0, 'default')]
+        # 回填后再次请求命中缓存
+        assert client.get(reverse('bulk-stats'), {'ids': '2'}).json()['articles'][0]['source'] == 'cache'
+
+    def test_bulk_stats_invalid_ids(self, client):
+        assert client.get(reverse('bulk-stats'), {'ids': '1,a'}).status_code == 400
+        assert client.get(reverse('bulk-stats')).status_code == 400
+
+    def test_user_history_keyset_pages(self, client, settings):
+        from datetime import datetime
+        from django.contrib.auth.models import User
+        user = User.objects.create_user('reader')
+        user_id = str(user.id)
+        client.force_login(user)
+        settings.STATS_USER_HISTORY_SIZE = 3
+        for article_id in range(1, 6):
+            ArticleStats.objects.create(article_id=article_id, total_reads=1, user_count=1)
+            UserRead.objects.create(article_id=article_id, user_id=user_id,
+                                    last_read=datetime(2024, 1, 1, 12, article_id % 3))
+        url = reverse('user-history', kwargs={'user_id': user_id})
+
+        first = client.get(url, {'limit': 2}).json()
+        assert first['source'] == 'database'
+        assert [item['article_id'] for item in first['history']] == [5, 2]
+        assert first['history'][0]['last_read'] == '2024-01-01T12:02:00'
+
+        # 第二页跨过缓存的最近3篇，剩余记录按游标查询数据库
+        second = client.get(url, {'limit': 2, 'cursor': first['next_cursor']}).json()
+        assert [item['article_id'] for item in second['history']] == [4, 1]
+        third = client.get(url, {'limit': 2, 'cursor': second['next_cursor']}).json()
+        assert [item['article_id'] for item in third['history']] == [3]
+        assert third['next_cursor'] is None
+
+        # 新的阅读进入缓存的历史
+        from blog_stats.services import StatsCacheService
+        StatsCacheService.increment_read(3, user_id)
+        latest = client.get(url, {'limit': 1}).json()
+        assert latest['source'] == 'cache'
+        assert latest['history'][0]['article_id'] == 3
+
+    def test_user_history_requires_owner_or_staff(self, client):
+        from django.contrib.auth.models import User
+        url = reverse('user-history', kwargs={'user_id': 'user1'})
+
+        # 匿名请求只能查询自己的会话（此处为 REMOTE_ADDR）
+        assert client.get(url).status_code == 403
+        assert client.get(reverse('user-history', kwargs={'user_id': '127.0.0.1'})).status_code == 200
+
+        client.force_login(User.objects.create_user('reader'))
+        assert client.get(url).status_code == 403
+
+        client.force_login(User.objects.create_user('admin', is_staff=True))
+        assert client.get(url).status_code == 200
+
+    def test_user_history_invalid_params(self, client):
+        from django.contrib.auth.models import User
+        client.force_login(User.objects.create_user('admin', is_staff=True))
+        url = reverse('user-history', kwargs={'user_id': 'user1'})
+        assert client.get(url, {'limit': 0}).status_code == 400
+        assert client.get(url, {'cursor': 'abc'}).status_code == 400